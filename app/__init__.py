@@ -2,9 +2,11 @@ import os
 from pathlib import Path
 
 from dotenv import load_dotenv
-from flask import Flask, session
+from flask import Flask
 
 from . import database
+from .services import cache_maintenance, cache_policy
+from .services.user_context import current_user
 
 
 def create_app():
@@ -19,6 +21,7 @@ def create_app():
 
     base_dir = Path(__file__).resolve().parent.parent
     app.config["DATABASE"] = str(base_dir / "user_db.db")
+    app.config["CACHE_POLICIES"] = cache_policy.load_policies()
     app.secret_key = os.getenv("APP_SECRET", "dev-secret")
 
     database.init_app(app)
@@ -35,33 +38,14 @@ def create_app():
 
     @app.context_processor
     def inject_user():
-        user_data = None
-        if "user_id" in session:
-            db = database.get_db()
-            row = db.execute(
-                "SELECT * FROM users WHERE id = ?", (session["user_id"],)
-            ).fetchone()
-
-            if row:
-                user_data = dict(row)
-                if user_data.get("preferences"):
-                    try:
-                        import json
-
-                        user_data["preferences_dict"] = json.loads(
-                            user_data["preferences"]
-                        )
-                    except Exception:
-                        user_data["preferences_dict"] = {}
-                else:
-                    user_data["preferences_dict"] = {}
-
-        return dict(user=user_data)
+        return dict(user=current_user().template_user())
 
     with app.app_context():
-        db_path = Path(app.config["DATABASE"])
-        if not db_path.exists():
-            database.init_db()
+        # schema.sql only uses CREATE ... IF NOT EXISTS, so re-running it on an
+        # existing database just adds tables introduced since it was created.
+        database.init_db()
+
+    cache_maintenance.start_background_maintenance(app)
 
     return app
 
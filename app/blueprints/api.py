@@ -1,24 +1,35 @@
 import json
-import os
 import re
-from datetime import datetime, timedelta
+import secrets
+import time
 
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, current_app, jsonify, request, session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 from PIL import Image
-from google import genai
 
 from .. import database
-from ..services.search_service import HotelSearchAPI
-from ..utils import clean_json_text, generate_ai_suggestion, get_user_recent_city, calculate_match_score
+from ..services import (
+    cache_store,
+    hotel_cache,
+    intent_parser,
+    llm,
+    llm_cache,
+    prompt_context,
+    result_filter,
+    reviews,
+    score_cache,
+    search_index,
+    streaming,
+)
+from ..services.location import canonicalize, is_known
+from ..services.normalize import slim_hotel
+from ..services.search_service import upstream_calls
+from ..services.user_context import current_preferences, save_preferences
+from ..utils import clean_json_text, generate_ai_suggestion, generate_search_hash, get_user_recent_city, calculate_match_score
 
 api_bp = Blueprint("api", __name__)
 
 
-def _get_gemini_client():
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    return genai.Client(api_key=gemini_api_key)
-
-
 @api_bp.post("/api/summarize_reviews")
 def summarize_reviews():
     try:
@@ -28,22 +39,6 @@ def summarize_reviews():
             return jsonify({"error": "Missing token"}), 400
 
         db = database.get_db()
-        cached = db.execute(
-            "SELECT summary_content, updated_at FROM review_summaries WHERE property_token = ?",
-            (property_token,),
-        ).fetchone()
-
-        if cached and cached["summary_content"]:
-            try:
-                last_update = datetime.strptime(
-                    cached["updated_at"], "%Y-%m-%d %H:%M:%S"
-                )
-                if datetime.utcnow() - last_update < timedelta(hours=24):
-                    print(f"Using cached summary for {property_token}")
-                    return jsonify({"summary": cached["summary_content"]})
-            except Exception as exc: 
-                print(f"Date parse error: {exc}")
-
         reviews = db.execute(
             "SELECT rating, comment FROM user_reviews WHERE property_token = ? AND comment IS NOT NULL ORDER BY created_at DESC LIMIT 20",
             (property_token,),
@@ -66,94 +61,80 @@ def summarize_reviews():
             "về ưu điểm và nhược điểm chính của khách sạn này dựa trên các đánh giá trên."
         )
 
-        client = _get_gemini_client()
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt,
-        )
-        new_summary = response.text
-        db.execute(
-            "INSERT OR REPLACE INTO review_summaries (property_token, summary_content, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
-            (property_token, new_summary),
-        )
-        db.commit()
-
-        return jsonify({"summary": new_summary})
+        # Keyed by the reviews themselves: a new review means a new summary.
+        return jsonify({"summary": llm_cache.generate("review_summary", prompt, legacy=(property_token,))})
 
     except Exception as exc:  
         print(f"Summary Error: {exc}")
         return jsonify({"error": str(exc)}), 500
 
 
+def _hotel_chat_prompt(payload, user_message):
+    """The hotel_chat prompt and whether it carries the user's preferences."""
+    property_token = payload.get("property_token")
+    dynamic_context = payload.get("dynamic_context") or {}
+    hotel_fallback = payload.get("hotel_fallback")
+    if not isinstance(hotel_fallback, dict):
+        hotel_fallback = {}
+
+    hotel_data = {}
+    if property_token:
+        cached = cache_store.get("hotel", property_token)
+        if cached:
+            hotel_data = cached.value["data"]
+        else:
+            hotel_data = hotel_fallback
+    else:
+        hotel_data = hotel_fallback
+
+    user_prefs_context = ""
+    prefs = current_preferences()
+    if prefs:
+        vibe_map = {
+            "healing": "🌿 Chữa lành (yên tĩnh, spa)",
+            "adventure": "🎒 Khám phá (hoạt động ngoài trời)",
+            "luxury": "💎 Sang chảnh (5 sao)",
+            "business": "💼 Công tác",
+        }
+        user_prefs_context = f"""
+        THÔNG TIN SỞ THÍCH CỦA USER:
+        - Phong cách: {vibe_map.get(prefs.get('vibe'), prefs.get('vibe', 'N/A'))}
+        - Đi cùng: {prefs.get('companion', 'N/A')}
+        - Ngân sách: {prefs.get('budget', 'N/A')}
+        
+        LƯU Ý: Khi tư vấn, hãy nhấn mạnh các điểm phù hợp với sở thích của user.
+        Ví dụ: Nếu user thích "healing" và khách sạn có Spa -> nhấn mạnh Spa.
+        """
+
+    current_price = dynamic_context.get("price", "N/A")
+    check_in = dynamic_context.get("check_in", "N/A")
+    check_out = dynamic_context.get("check_out", "N/A")
+    # Only the fields the question needs, within the hotel_chat token budget.
+    hotel_data_str = prompt_context.hotel_context(hotel_data, user_message)
+
+    system_instruction = (
+        "You are a helpful AI assistant for hotel booking. Answer user questions based on this hotel data:\n"
+        f"Price: {current_price} (Dates: {check_in}-{check_out}).\n"
+        f"{hotel_data_str}\n"
+        f"{user_prefs_context}"
+        "Reply in Vietnamese, friendly and personalized based on user preferences if available."
+    )
+    prompt = f"{system_instruction}\n\nUser: {user_message}"
+    return prompt, bool(prefs)
+
+
 @api_bp.post("/api/hotel_chat")
 def hotel_chat():
     try:
         payload = request.get_json(force=True) or {}
         user_message = (payload.get("message") or "").strip()
-        property_token = payload.get("property_token")
-        dynamic_context = payload.get("dynamic_context") or {}
-        hotel_fallback = payload.get("hotel_fallback") or {}
-
         if not user_message:
             return jsonify({"error": "message is required"}), 400
 
-        client = _get_gemini_client()
-
-        hotel_data = {}
-        if property_token:
-            db = database.get_db()
-            row = db.execute(
-                "SELECT data FROM hotel_cache WHERE token = ?", (property_token,)
-            ).fetchone()
-            if row:
-                hotel_data = json.loads(row["data"])
-            else:
-                hotel_data = hotel_fallback
-        else:
-            hotel_data = hotel_fallback
-
-        user_prefs_context = ""
-        if "user_id" in session:
-            db = database.get_db()
-            user = db.execute(
-                "SELECT preferences FROM users WHERE id=?", (session["user_id"],)
-            ).fetchone()
-            if user and user["preferences"]:
-                prefs = json.loads(user["preferences"])
-                vibe_map = {
-                    "healing": "🌿 Chữa lành (yên tĩnh, spa)",
-                    "adventure": "🎒 Khám phá (hoạt động ngoài trời)",
-                    "luxury": "💎 Sang chảnh (5 sao)",
-                    "business": "💼 Công tác",
-                }
-                user_prefs_context = f"""
-                THÔNG TIN SỞ THÍCH CỦA USER:
-                - Phong cách: {vibe_map.get(prefs.get('vibe'), prefs.get('vibe', 'N/A'))}
-                - Đi cùng: {prefs.get('companion', 'N/A')}
-                - Ngân sách: {prefs.get('budget', 'N/A')}
-                
-                LƯU Ý: Khi tư vấn, hãy nhấn mạnh các điểm phù hợp với sở thích của user.
-                Ví dụ: Nếu user thích "healing" và khách sạn có Spa -> nhấn mạnh Spa.
-                """
-
-        current_price = dynamic_context.get("price", "N/A")
-        check_in = dynamic_context.get("check_in", "N/A")
-        check_out = dynamic_context.get("check_out", "N/A")
-        hotel_data_str = json.dumps(hotel_data, indent=2, ensure_ascii=False)
-
-        system_instruction = (
-            "You are a helpful AI assistant for hotel booking. Answer user questions based on this hotel data:\n"
-            f"Price: {current_price} (Dates: {check_in}-{check_out}).\n"
-            f"{hotel_data_str}\n"
-            f"{user_prefs_context}"
-            "Reply in Vietnamese, friendly and personalized based on user preferences if available."
-        )
-        prompt = f"{system_instruction}\n\nUser: {user_message}"
-
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite", contents=prompt
-        )
-        reply_text = response.text if response.text else "Xin lỗi, AI đang bận."
+        prompt, personalized = _hotel_chat_prompt(payload, user_message)
+        # Same question about the same hotel data: one Gemini call, unless the
+        # prompt carries the user's preferences.
+        reply_text = llm_cache.generate("hotel_chat", prompt, personalized=personalized) or "Xin lỗi, AI đang bận."
 
         return jsonify({"reply": reply_text})
 
@@ -161,6 +142,31 @@ def hotel_chat():
         return jsonify({"error": str(exc)}), 500
 
 
+@api_bp.post("/api/hotel_chat/stream")
+def hotel_chat_stream():
+    """hotel_chat as Server-Sent Events: "delta" events carry the reply as it
+    is written, then one "result" event the body hotel_chat would return."""
+    payload = request.get_json(force=True) or {}
+    user_message = (payload.get("message") or "").strip()
+    if not user_message:
+        return jsonify({"error": "message is required"}), 400
+
+    def events():
+        reply_text = ""
+        try:
+            prompt, personalized = _hotel_chat_prompt(payload, user_message)
+            for chunk in llm_cache.generate_stream("hotel_chat", prompt, personalized=personalized):
+                reply_text += chunk
+                yield streaming.sse_event("delta", {"text": chunk})
+        except Exception as exc:
+            print(f"Hotel chat stream error: {exc}")
+            yield streaming.sse_event("result", {"error": str(exc)})
+            return
+        yield streaming.sse_event("result", {"reply": reply_text or "Xin lỗi, AI đang bận."})
+
+    return streaming.sse_response(events())
+
+
 @api_bp.post("/api/compare_ai")
 def compare_ai_analysis():
     try:
@@ -172,16 +178,18 @@ def compare_ai_analysis():
         prompt_content = "So sánh ngắn gọn các khách sạn sau:\n"
         for hotel in hotels:
             prompt_content += (
-                f"- {hotel['name']}: Giá {hotel.get('rate_per_night', {}).get('lowest', 'N/A')}, "
-                f"Rating {hotel.get('overall_rating', 'N/A')}.\n"
+                f"- {hotel['name']}: Giá {hotel.get('price_text') or 'N/A'}, "
+                f"Rating {hotel.get('rating') or 'N/A'}.\n"
             )
 
-        client = _get_gemini_client()
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt_content + "\nTrả lời bằng tiếng Việt, ngắn gọn.",
+        # The same hotels in any order share a reply.
+        # Sorted as JSON: entries may mix None with values.
+        key = sorted(
+            json.dumps([hotel["name"], hotel.get("price_text"), hotel.get("rating")], ensure_ascii=False)
+            for hotel in hotels
         )
-        return jsonify({"reply": response.text})
+        reply = llm_cache.generate("compare", prompt_content + "\nTrả lời bằng tiếng Việt, ngắn gọn.", key=key)
+        return jsonify({"reply": reply})
 
     except Exception as exc: 
         return jsonify({"error": str(exc)}), 500
@@ -197,23 +205,17 @@ def get_chat_history():
 @api_bp.route("/api/clear_chat", methods=["POST"])
 def clear_chat():
     session.pop("chat_history", None)
+    # Turns streamed before clearing are not saved into the new history.
+    session.pop("chat_turn_nonce", None)
     return jsonify({"status": "cleared"})
 
 
-@api_bp.route("/api/chat_search", methods=["POST"])
-def api_chat_search():
-    data = request.get_json()
-    user_msg = data.get("message", "").strip()
-    page_context = data.get("page_context", {})
-
-    if not user_msg:
-        return jsonify({"error": "Empty message"}), 400
-
-    if "chat_history" not in session:
-        session["chat_history"] = []
+CHAT_BUSY = {"type": "chat", "reply_text": "Xin lỗi, server đang bận xíu. Bạn thử lại sau nhé!"}
+# Seconds a turn streamed by /api/chat_search/stream may take to be saved.
+CHAT_TURN_MAX_AGE = 600
 
-    history = session["chat_history"]
 
+def _chat_search_prompt(user_msg, page_context, history, user_prefs):
     recent_history = history[-6:]
     history_text = ""
     for msg in recent_history:
@@ -223,23 +225,9 @@ def api_chat_search():
             content = "[Đã hiển thị danh sách khách sạn]"
         history_text += f"{role}: {content}\n"
 
-    user_prefs = None
-    if "user_id" in session:
-        db = database.get_db()
-        user = db.execute(
-            "SELECT preferences FROM users WHERE id=?", (session["user_id"],)
-        ).fetchone()
-        if user and user["preferences"]:
-            user_prefs = json.loads(user["preferences"])
-
     current_view_context = ""
     if page_context and page_context.get("hotels"):
-        hotel_list_str = "\n".join(
-            [
-                f"- {hotel['name']}:\n   + Giá: {hotel['price']}\n   + Đánh giá: {hotel['rating']}/5\n   + Tiện nghi: {hotel.get('amenities', 'Không rõ')}"
-                for hotel in page_context["hotels"]
-            ]
-        )
+        hotel_list_str = prompt_context.hotel_list_context(page_context["hotels"], user_msg)
         current_view_context = f"""
         THÔNG TIN TRANG HIỆN TẠI NGƯỜI DÙNG ĐANG XEM:
         Người dùng đang đứng ở trang kết quả tìm kiếm. Dưới đây là danh sách các khách sạn đang hiển thị trên màn hình:
@@ -286,8 +274,6 @@ def api_chat_search():
     - Budget "low" -> price_range: "0-500000"
     """
 
-    client = _get_gemini_client()
-
     prompt = f"""
     Bạn là LigmaStay AI - Trợ lý đặt phòng khách sạn thông minh tại Việt Nam.
 
@@ -299,7 +285,7 @@ def api_chat_search():
     {{
       "type": "chat" | "search",
       "city": "Tên thành phố (String) hoặc null",
-      "price_range": "0-500000" | "500000-1000000" | "1000000-2000000" | "2000000+" | null,
+      "price_range": "0-500000" | "500000-1000000" | "1000000-2000000" | "2000000+" | "0-1000000" | "0-2000000" | "500000+" | "1000000+" | null,
       "rating": "4-5" | "3-5" | null,
       "amenities": ["Pool", "Free Wi-Fi", ...] (Mảng String, các từ khóa tiếng Anh: 'Pool', 'Fitness centre', 'Pet-friendly', 'Child-friendly', 'Free Wi-Fi', 'Air-conditioned') hoặc null,
       "reply_text": "Câu trả lời tiếng Việt"
@@ -324,7 +310,7 @@ def api_chat_search():
     2. XÁC ĐỊNH ĐỊA ĐIỂM (CITY):
        - Ưu tiên 1: Lấy trong User Input hiện tại.
        - Ưu tiên 2: Nếu Input không có, tìm ngược lại trong LỊCH SỬ.
-       - Lưu ý: Chuẩn hóa tên: "SG"/"HCM" -> "Ho Chi Minh City", "Đà Lạt" -> "Da Lat".
+       - Lưu ý: Dùng tên tiếng Việt có dấu: "SG"/"HCM" -> "TP. Hồ Chí Minh", "Da Lat" -> "Đà Lạt".
 
     3. PHÂN LOẠI HÀNH ĐỘNG (TYPE):
        - Gán "type": "search" KHI VÀ CHỈ KHI:
@@ -345,138 +331,236 @@ def api_chat_search():
        - Nếu Search: "OK, mình tìm thấy vài nơi ở [City] theo ý bạn..."
        - Nếu Chat: Trả lời tự nhiên, thân thiện.
     """
+    return prompt
+
+
+def _parse_model_reply(model_reply):
+    json_str = model_reply.strip()
+    json_str = re.sub(r"^```json|^```|```$", "", json_str, flags=re.MULTILINE).strip()
+    return json.loads(json_str)
+
+
+def _chat_search_answer(parsed, user_msg, history, user_prefs):
+    """Act on the model's (or intent_parser's) JSON reply: the chat_search
+    response body and the entries it adds to the chat history."""
+    entries = [{"role": "user", "content": user_msg}]
+
+    if parsed.get("type") == "search":
+        city = canonicalize(parsed.get("city"))
+
+        if not city:
+            for old_msg in reversed(history):
+                if old_msg.get("search_params", {}).get("city"):
+                    city = old_msg["search_params"]["city"]
+                    break
+
+        if not city:
+            reply = "Bạn muốn tìm khách sạn ở thành phố nào nhỉ?"
+            entries.append({"role": "ai", "content": reply, "type": "chat"})
+            return {"type": "chat", "reply_text": reply}, entries
+
+        price_range = parsed.get("price_range")
+        rating = parsed.get("rating")
+        amenities = parsed.get("amenities") or []
+
+        if user_prefs:
+            if not price_range:
+                budget = user_prefs.get("budget")
+                if budget == "low":
+                    price_range = "0-500000"
+                elif budget == "mid":
+                    price_range = "1000000-2000000"
+                elif budget == "high":
+                    price_range = "2000000+"
+
+            if not rating:
+                vibe = user_prefs.get("vibe")
+                if vibe == "luxury":
+                    rating = "4-5"
+
+            if len(amenities) == 0:
+                vibe = user_prefs.get("vibe")
+                companion = user_prefs.get("companion")
+
+                if vibe == "healing":
+                    amenities.extend(["Pool"])
+                elif vibe == "adventure":
+                    amenities.extend(["Fitness centre", "Pool"])
+                elif vibe == "luxury":
+                    amenities.extend(["Pool", "Fitness centre"])
+
+                if companion == "family":
+                    if "Child-friendly" not in amenities:
+                        amenities.append("Child-friendly")
+                    if "Pool" not in amenities:
+                        amenities.append("Pool")
+                elif companion == "couple":
+                    if "Pool" not in amenities:
+                        amenities.append("Pool")
+
+        search_amenities = amenities if len(amenities) > 0 else None
+        # Hotels already cached for this city answer without a SerpAPI call.
+        hotels = None
+        if search_index.CHAT_MIN_RESULTS:
+            local = search_index.find_cached(
+                database.get_db(), city, price_range, rating, search_amenities, text=user_msg
+            )
+            if len(local) >= search_index.CHAT_MIN_RESULTS:
+                hotels = local
+                search_index.stats["chat_local"] += 1
+                print(f"Chat search answered from the local index ({len(local)} hotels)")
+        if hotels is None:
+            search_index.stats["chat_upstream"] += 1
+            search_hash = generate_search_hash(city, price_range, rating, search_amenities)
+            hotel_cache.ensure_search(search_hash, city, price_range, rating, search_amenities)
+            hotels = hotel_cache.load_search_results(search_hash)
+
+        hotels_lite = []
+        if hotels:
+            for hotel in hotels[:4]:
+                hotels_lite.append(
+                    {
+                        "name": hotel["name"],
+                        "property_token": hotel["property_token"],
+                        "price_text": hotel["price_text"],
+                        "rating": hotel["rating"],
+                        "image": hotel["image"],
+                    }
+                )
 
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
+        reply_text = parsed.get("reply_text", f"Kết quả tìm kiếm tại {city}:")
+
+        entries.append(
+            {
+                "role": "ai",
+                "content": reply_text,
+                "type": "search_result",
+                "search_params": {
+                    "city": city,
+                    "price_range": parsed.get("price_range"),
+                    "amenities": parsed.get("amenities"),
+                },
+                "hotels": hotels_lite,
+            }
         )
+        return {"type": "search_result", "reply_text": reply_text, "hotels": hotels}, entries
 
-        json_str = response.text.strip()
-        json_str = re.sub(r"^```json|^```|```$", "", json_str, flags=re.MULTILINE).strip()
-
-        parsed = json.loads(json_str)
-
-        history.append({"role": "user", "content": user_msg})
-
-        if parsed.get("type") == "search":
-            city = parsed.get("city")
-
-            if not city:
-                for old_msg in reversed(history):
-                    if old_msg.get("search_params", {}).get("city"):
-                        city = old_msg["search_params"]["city"]
-                        break
-
-            if not city:
-                reply = "Bạn muốn tìm khách sạn ở thành phố nào nhỉ?"
-                history.append({"role": "ai", "content": reply, "type": "chat"})
-                session.modified = True
-                return jsonify({"type": "chat", "reply_text": reply})
-
-            price_range = parsed.get("price_range")
-            rating = parsed.get("rating")
-            amenities = parsed.get("amenities") or []
-
-            if user_prefs:
-                if not price_range:
-                    budget = user_prefs.get("budget")
-                    if budget == "low":
-                        price_range = "0-500000"
-                    elif budget == "mid":
-                        price_range = "1000000-2000000"
-                    elif budget == "high":
-                        price_range = "2000000+"
-
-                if not rating:
-                    vibe = user_prefs.get("vibe")
-                    if vibe == "luxury":
-                        rating = "4-5"
-
-                if len(amenities) == 0:
-                    vibe = user_prefs.get("vibe")
-                    companion = user_prefs.get("companion")
-
-                    if vibe == "healing":
-                        amenities.extend(["Pool"])
-                    elif vibe == "adventure":
-                        amenities.extend(["Fitness centre", "Pool"])
-                    elif vibe == "luxury":
-                        amenities.extend(["Pool", "Fitness centre"])
-
-                    if companion == "family":
-                        if "Child-friendly" not in amenities:
-                            amenities.append("Child-friendly")
-                        if "Pool" not in amenities:
-                            amenities.append("Pool")
-                    elif companion == "couple":
-                        if "Pool" not in amenities:
-                            amenities.append("Pool")
-
-            serp_api_key = os.getenv("SERPAPI_KEY")
-            search_api = HotelSearchAPI(serp_api_key)
-
-            hotels = search_api.search_hotels(
-                city,
-                price_range,
-                rating,
-                amenities if len(amenities) > 0 else None,
-            )
+    reply_text = parsed.get("reply_text")
+    entries.append({"role": "ai", "content": reply_text, "type": "chat"})
+    return {"type": "chat", "reply_text": reply_text}, entries
 
-            hotels_lite = []
-            if hotels:
-                for hotel in hotels[:4]:
-                    hotels_lite.append(
-                        {
-                            "name": hotel.get("name"),
-                            "property_token": hotel.get("property_token"),
-                            "rate_per_night": hotel.get("rate_per_night"),
-                            "overall_rating": hotel.get("overall_rating"),
-                            "images": [{"original_image": hotel["images"][0]["original_image"]}]
-                            if hotel.get("images")
-                            else [],
-                        }
-                    )
-
-            reply_text = parsed.get("reply_text", f"Kết quả tìm kiếm tại {city}:")
-
-            history.append(
-                {
-                    "role": "ai",
-                    "content": reply_text,
-                    "type": "search_result",
-                    "search_params": {
-                        "city": city,
-                        "price_range": parsed.get("price_range"),
-                        "amenities": parsed.get("amenities"),
-                    },
-                    "hotels": hotels_lite,
-                }
-            )
-            session.modified = True
-
-            return jsonify(
-                {
-                    "type": "search_result",
-                    "reply_text": reply_text,
-                    "hotels": hotels,
-                }
-            )
 
-        reply_text = parsed.get("reply_text")
-        history.append({"role": "ai", "content": reply_text, "type": "chat"})
-        session.modified = True
+@api_bp.route("/api/chat_search", methods=["POST"])
+def api_chat_search():
+    data = request.get_json()
+    user_msg = data.get("message", "").strip()
+    page_context = data.get("page_context", {})
 
-        return jsonify({"type": "chat", "reply_text": reply_text})
+    if not user_msg:
+        return jsonify({"error": "Empty message"}), 400
 
-    except Exception as exc: 
+    if "chat_history" not in session:
+        session["chat_history"] = []
+
+    history = session["chat_history"]
+    user_prefs = current_preferences()
+
+    try:
+        # Plain searches ("ks 4 sao ở Đà Nẵng có hồ bơi") skip the model.
+        parsed = intent_parser.match(user_msg)
+        if parsed is None:
+            prompt = _chat_search_prompt(user_msg, page_context, history, user_prefs)
+            parsed = _parse_model_reply(llm.generate("chat_search", prompt))
+        result, entries = _chat_search_answer(parsed, user_msg, history, user_prefs)
+    except Exception as exc:
         print(f"Chat Error: {exc}")
-        return jsonify(
-            {
-                "type": "chat",
-                "reply_text": "Xin lỗi, server đang bận xíu. Bạn thử lại sau nhé!",
-            }
+        return jsonify(CHAT_BUSY)
+
+    history.extend(entries)
+    session.modified = True
+    return jsonify(result)
+
+
+def _chat_turn_serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt="chat-turn")
+
+
+@api_bp.route("/api/chat_search/stream", methods=["POST"])
+def api_chat_search_stream():
+    """chat_search as Server-Sent Events.
+
+    "delta" events carry the reply text as the model writes it, then one
+    "result" event the body chat_search would return. The session cookie is
+    sent before the body, so the result also holds a signed "turn" that the
+    page posts to /api/save_chat_turn to add it to the history. The turn
+    names this session's nonce, set here while the cookie can still change.
+    """
+    data = request.get_json()
+    user_msg = data.get("message", "").strip()
+    page_context = data.get("page_context", {})
+
+    if not user_msg:
+        return jsonify({"error": "Empty message"}), 400
+
+    history = list(session.get("chat_history", []))
+    user_prefs = current_preferences()
+    nonce = session.setdefault("chat_turn_nonce", secrets.token_urlsafe(8))
+    local = intent_parser.match(user_msg)
+
+    def events():
+        try:
+            if local:
+                parsed = local
+                yield streaming.sse_event("delta", {"text": local["reply_text"]})
+            else:
+                prompt = _chat_search_prompt(user_msg, page_context, history, user_prefs)
+                # The model answers in JSON; only its reply_text is shown while streaming.
+                reply_text = streaming.JsonStringField("reply_text")
+                chunks = []
+                for chunk in llm.generate_stream("chat_search", prompt):
+                    chunks.append(chunk)
+                    delta = reply_text.feed(chunk)
+                    if delta:
+                        yield streaming.sse_event("delta", {"text": delta})
+                parsed = _parse_model_reply("".join(chunks))
+            result, entries = _chat_search_answer(parsed, user_msg, history, user_prefs)
+        except Exception as exc:
+            print(f"Chat Error: {exc}")
+            yield streaming.sse_event("result", CHAT_BUSY)
+            return
+        result["turn"] = _chat_turn_serializer().dumps(
+            {"session": nonce, "id": secrets.token_urlsafe(8), "entries": entries}
         )
+        yield streaming.sse_event("result", result)
+
+    return streaming.sse_response(events())
+
+
+@api_bp.route("/api/save_chat_turn", methods=["POST"])
+def save_chat_turn():
+    try:
+        turn = _chat_turn_serializer().loads(
+            (request.get_json(silent=True) or {}).get("turn") or "", max_age=CHAT_TURN_MAX_AGE
+        )
+    except BadSignature:
+        return jsonify({"error": "Invalid turn"}), 400
+    # Only into the session that streamed it, and only once. Used ids are
+    # kept on the server (an older cookie would not list them) until the
+    # turn's signature has expired.
+    if turn["session"] != session.get("chat_turn_nonce"):
+        return jsonify({"error": "Invalid turn"}), 400
+    db = database.get_db()
+    now = time.time()
+    db.execute("DELETE FROM saved_chat_turns WHERE saved_at < ?", (now - CHAT_TURN_MAX_AGE,))
+    first_use = db.execute(
+        "INSERT OR IGNORE INTO saved_chat_turns (turn_id, saved_at) VALUES (?, ?)", (turn["id"], now)
+    ).rowcount
+    db.commit()
+    if not first_use:
+        return jsonify({"error": "Invalid turn"}), 400
+    session.setdefault("chat_history", []).extend(turn["entries"])
+    session.modified = True
+    return jsonify({"status": "saved"})
 
 
 @api_bp.route("/api/update_preferences", methods=["POST"])
@@ -485,15 +569,7 @@ def update_preferences():
         return jsonify({"error": "Unauthorized"}), 401
 
     try:
-        data = request.get_json()
-        prefs_json = json.dumps(data)
-
-        db = database.get_db()
-        db.execute(
-            "UPDATE users SET preferences = ? WHERE id = ?",
-            (prefs_json, session["user_id"]),
-        )
-        db.commit()
+        save_preferences(request.get_json())
 
         return jsonify({"message": "Success"}), 200
 
@@ -510,48 +586,81 @@ def get_match_reason_api():
     data = request.get_json()
     property_token = data.get("property_token")
 
-    db = database.get_db()
-
-    recent = db.execute(
-        "SELECT match_reason FROM recently_viewed WHERE user_id=? AND property_token=?",
-        (session["user_id"], property_token),
-    ).fetchone()
-
-    if recent and recent["match_reason"]:
-        return jsonify({"match": recent["match_reason"]})
-
-    user = db.execute(
-        "SELECT preferences FROM users WHERE id=?", (session["user_id"],)
-    ).fetchone()
-
-    if not user or not user["preferences"]:
+    prefs = current_preferences()
+    if not prefs:
         return jsonify({"match": None})
-    prefs = json.loads(user["preferences"])
 
-    hotel_row = db.execute(
-        "SELECT data FROM hotel_cache WHERE token = ?", (property_token,)
-    ).fetchone()
-    
-    hotel_data = {}
-    if hotel_row:
-        hotel_data = json.loads(hotel_row["data"])
+    # The scorer reads these three fields only; skip decoding the payload.
+    hotel_data = hotel_cache.load_hotel_fields(property_token, ("amenity_text", "price", "rating"))
+    if hotel_data:
+        hotel_data = dict(hotel_data, property_token=property_token)
+        result = score_cache.get_scores(database.get_db(), prefs, [hotel_data])[0]
     else:
         hotel_data = {
             "amenities": data.get("amenities", []),
             "rate_per_night": {"lowest": "0"}, 
             "overall_rating": 0
         }
+        result = calculate_match_score(prefs, hotel_data)
 
-    result = calculate_match_score(prefs, hotel_data)
     match_string = f"{result['score']}|{result['reason']}"
+    return jsonify({"match": match_string})
 
-    db.execute(
-        "UPDATE recently_viewed SET match_reason = ? WHERE user_id=? AND property_token=?",
-        (match_string, session["user_id"], property_token),
+
+@api_bp.route("/api/reviews", methods=["GET"])
+def list_reviews():
+    property_token = request.args.get("property_token")
+    if not property_token:
+        return jsonify({"error": "Thiếu property_token"}), 400
+
+    db = database.get_db()
+    stats = reviews.get_stats(db, property_token)
+    try:
+        rows, next_cursor = reviews.page(
+            db,
+            property_token,
+            reviews.parse_rating(request.args.get("filter_rating")),
+            request.args.get("sort_review", "newest"),
+            request.args.get("after"),
+            stats=stats,
+        )
+    except ValueError:
+        return jsonify({"error": "Cursor không hợp lệ"}), 400
+    return jsonify({"reviews": [reviews.as_dict(row) for row in rows], "next": next_cursor, "stats": stats})
+
+
+@api_bp.route("/api/local_search", methods=["GET"])
+def local_search():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Thiếu từ khóa tìm kiếm (q)"}), 400
+    limit = min(request.args.get("limit", 20, type=int) or 20, 50)
+    hotels = search_index.search(database.get_db(), query, city=request.args.get("city"), limit=limit)
+    return jsonify({"query": query, "count": len(hotels), "hotels": hotels})
+
+
+@api_bp.route("/api/cache_stats", methods=["GET"])
+def cache_stats():
+    hits = result_filter.stats["hits"]
+    misses = result_filter.stats["misses"]
+    lookups = hits + misses
+    return jsonify(
+        {
+            "superset": {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else None,
+            },
+            "match_scores": dict(score_cache.stats),
+            "tiers": cache_store.tier_stats(),
+            "local_search": dict(search_index.stats),
+            "chat_intents": dict(intent_parser.stats),
+            "upstream_calls": dict(upstream_calls),
+            "llm": llm.summary(),
+            "llm_cache": llm_cache.summary(),
+            "prompt_context": prompt_context.summary(),
+        }
     )
-    db.commit()
-    
-    return jsonify({"match": match_string})
 
 
 @api_bp.route("/api/get_home_suggestion", methods=["GET"])
@@ -559,15 +668,10 @@ def get_home_suggestion_api():
     if "user_id" not in session:
         return jsonify({"suggestion": None, "is_logged_in": False})
 
-    db = database.get_db()
-    user = db.execute(
-        "SELECT preferences FROM users WHERE id=?", (session["user_id"],),
-    ).fetchone()
-
     suggestion = None
-    if user and user["preferences"]:
+    prefs = current_preferences()
+    if prefs:
         try:
-            prefs = json.loads(user["preferences"])
             recent_city = get_user_recent_city(session["user_id"])
             suggestion = generate_ai_suggestion(prefs, history_city=recent_city)
 
@@ -587,55 +691,25 @@ def generate_itinerary():
         address = data.get("address")
         force_refresh = data.get("force_refresh", False)
 
-        vibe = "adventure"
-        if "user_id" in session:
-            db = database.get_db()
-            user = db.execute(
-                "SELECT preferences FROM users WHERE id=?", (session["user_id"],)
-            ).fetchone()
-            if user and user["preferences"]:
-                prefs = json.loads(user["preferences"])
-                vibe = prefs.get("vibe", "adventure")
-
-        if not force_refresh:
-            db = database.get_db()
-            cached = db.execute(
-                """
-                SELECT itinerary_json 
-                FROM hotel_itineraries 
-                WHERE property_token=? 
-                  AND vibe=? 
-                  AND created_at > date('now', '-3 days')
-                """,
-                (token, vibe),
-            ).fetchone()
-
-            if cached:
-                print(f"🎯 Trip Genie: Hit Cache for {token} - {vibe}")
-                return jsonify(json.loads(cached["itinerary_json"]))
-
-        hotel_cache_row = db.execute(
-            "SELECT data FROM hotel_cache WHERE token = ?", (token,)
-        ).fetchone()
+        vibe = (current_preferences() or {}).get("vibe", "adventure")
 
-        real_places_context = ""
-        if hotel_cache_row:
-            hotel_data = json.loads(hotel_cache_row["data"])
-            nearby_list = hotel_data.get("nearby_places", [])
-
-            if nearby_list:
-                places_str = "\n".join(
-                    [
-                        f"- {place['name']} ({place.get('transportations', [{'duration': 'Gần'}])[0]['duration']})"
-                        for place in nearby_list[:15]
-                    ]
-                )
-                real_places_context = f"""
-                DANH SÁCH ĐỊA ĐIỂM CÓ THẬT XUNG QUANH KHÁCH SẠN (Ưu tiên tuyệt đối sử dụng các địa điểm này):
-                {places_str}
-                """
+        # Only the nearby places are needed: read them without decoding the payload.
+        hotel_fields = hotel_cache.load_hotel_fields(token, ("nearby",))
+        nearby_list = hotel_fields["nearby"] if hotel_fields else None
+        if nearby_list is None:
+            # Not cached, or cached before slim records listed nearby places.
+            hotel_cached = cache_store.get("hotel", token)
+            nearby_list = slim_hotel(hotel_cached.value["data"])["nearby"] if hotel_cached else []
 
-        print(f"🤖 Trip Genie: Calling AI for {token} - {vibe}")
+        real_places_context = ""
+        if nearby_list:
+            places_str = "\n".join(
+                [f"- {place['name']} ({place['duration'] or 'Gần'})" for place in nearby_list[:15]]
+            )
+            real_places_context = f"""
+            DANH SÁCH ĐỊA ĐIỂM CÓ THẬT XUNG QUANH KHÁCH SẠN (Ưu tiên tuyệt đối sử dụng các địa điểm này):
+            {places_str}
+            """
 
         vibe_desc = {
             "healing": "thư giãn, yên tĩnh, spa, thiên nhiên, không xô bồ",
@@ -674,22 +748,10 @@ def generate_itinerary():
         Lưu ý: Icon là class của FontAwesome (ví dụ: fa-coffee, fa-tree). Ngôn ngữ: Tiếng Việt.
         """
 
-        client = _get_gemini_client()
-
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
+        result_json = llm_cache.generate(
+            "itinerary", prompt, refresh=force_refresh, parse=lambda text: json.loads(clean_json_text(text)),
+            legacy=(token, vibe),
         )
-
-        json_str = clean_json_text(response.text)
-        result_json = json.loads(json_str)
-
-        db.execute(
-            "INSERT OR REPLACE INTO hotel_itineraries (property_token, vibe, itinerary_json) VALUES (?, ?, ?)",
-            (token, vibe, json_str),
-        )
-        db.commit()
-
         return jsonify(result_json)
 
     except Exception as exc:  
@@ -703,24 +765,17 @@ def mood_search():
         mood_text = request.form.get("mood_text", "")
         image_file = request.files.get("mood_image")
 
-        client = _get_gemini_client()
-
         inputs = []
 
         user_context = "User chưa đăng nhập (Khách vãng lai)."
-        if "user_id" in session:
-            db = database.get_db()
-            user = db.execute(
-                "SELECT preferences FROM users WHERE id=?", (session["user_id"],)
-            ).fetchone()
-            if user and user["preferences"]:
-                prefs = json.loads(user["preferences"])
-                vibe = prefs.get("vibe", "Unknown")
-                companion = prefs.get("companion", "Unknown")
-                user_context = (
-                    f"User Preference: Thích kiểu du lịch '{vibe}' (Healing/Adventure/Luxury), "
-                    f"thường đi cùng '{companion}'."
-                )
+        prefs = current_preferences()
+        if prefs:
+            vibe = prefs.get("vibe", "Unknown")
+            companion = prefs.get("companion", "Unknown")
+            user_context = (
+                f"User Preference: Thích kiểu du lịch '{vibe}' (Healing/Adventure/Luxury), "
+                f"thường đi cùng '{companion}'."
+            )
 
         system_prompt = f"""
         Bạn là chuyên gia tư vấn du lịch (Travel Therapist).
@@ -771,21 +826,13 @@ def mood_search():
         else:
             inputs.append("No image. Analyze user note & preference.")
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=inputs,
-        )
-
-        json_str = clean_json_text(response.text)
+        json_str = clean_json_text(llm.generate("mood_search", inputs))
         result = json.loads(json_str)
 
-        valid_cities = [
-            "Hà Nội", "TP. Hồ Chí Minh", "Đà Nẵng", "Nha Trang", "Đà Lạt",
-            "Sa Pa", "Huế", "Phú Quốc", "Vũng Tàu"
-        ]
-        ai_city = result.get("city", "").strip()
+        ai_city = canonicalize(result.get("city", ""))
+        result["city"] = ai_city
 
-        if ai_city not in valid_cities:
+        if not is_known(ai_city):
             expl = result.get("explanation", "").lower()
             if "biển" in expl:
                 result["city"] = "Nha Trang"
@@ -1,11 +1,7 @@
-import json
-import os
-import re
-from datetime import datetime, timedelta
-
 from flask import (
     Blueprint,
     flash,
+    make_response,
     redirect,
     render_template,
     request,
@@ -14,18 +10,28 @@ from flask import (
 )
 
 from .. import database
-from ..services.search_service import HotelSearchAPI
-from ..utils import analyze_vibe_from_amenities, get_ai_preferences, calculate_match_score, generate_search_hash
+from ..services import cache_policy, cache_store, hotel_cache, reviews, score_cache, view_writes
+from ..services.location import canonicalize
+from ..services.normalize import preview_from_slim, slim_hotel
+from ..services.user_context import current_preferences, remember_preferences
+from ..utils import analyze_vibe_from_amenities, get_ai_preferences, generate_search_hash
 
 hotel_bp = Blueprint("hotel", __name__)
 
+
+def _with_cache_status(response, status):
+    response = make_response(response)
+    response.headers["X-Cache-Status"] = status
+    return response
+
+
 @hotel_bp.route("/search_handler", methods=["POST"])
 def api_filter():
     if "user_id" not in session:
         flash("❌ Vui lòng đăng nhập!")
         return redirect(url_for("main.home"))
 
-    city = request.form.get("city")
+    city = canonicalize(request.form.get("city"))
     if not city:
         flash("Hãy chọn địa điểm")
         return redirect(url_for("main.home"))
@@ -35,98 +41,75 @@ def api_filter():
     ai_autofill_raw = request.form.get("ai_autofill", "off")
     allow_ai_autofill = str(ai_autofill_raw).lower() in ("on", "true", "1", "yes")
             
-    db = database.get_db()
-    user = None
-    if "user_id" in session:
-        user = db.execute(
-            "SELECT preferences FROM users WHERE id=?", (session["user_id"],)
-        ).fetchone()
-
-        if allow_ai_autofill and user and user["preferences"]:
-            try:
-                prefs = json.loads(user["preferences"])
-                vibe = prefs.get("vibe", "")
-                budget = prefs.get("budget", "")
-                companion = prefs.get("companion", "")
-
-                ai_suggestion = get_ai_preferences(vibe, companion, budget)
-                if not price:
-                    price = ai_suggestion["price_range"]
-                if not rating:
-                    rating = ai_suggestion["rating"]
-                if not amenities:
-                    amenities = ai_suggestion["amenities"]
+    prefs = current_preferences()
+    if allow_ai_autofill and prefs:
+        try:
+            vibe = prefs.get("vibe", "")
+            budget = prefs.get("budget", "")
+            companion = prefs.get("companion", "")
+
+            ai_suggestion = get_ai_preferences(vibe, companion, budget)
+            if not price:
+                price = ai_suggestion["price_range"]
+            if not rating:
+                rating = ai_suggestion["rating"]
+            if not amenities:
+                amenities = ai_suggestion["amenities"]
 
-            except Exception as exc: 
-                print(f"Auto-fill Error: {exc}")
+        except Exception as exc: 
+            print(f"Auto-fill Error: {exc}")
 
     search_hash = generate_search_hash(city, price, rating, amenities)
 
-    cached = db.execute(
-        "SELECT created_at FROM search_cache WHERE search_hash = ?", 
-        (search_hash,)
-    ).fetchone()
-    
-    need_fetch = True
-    if cached:
-        created_at = datetime.strptime(cached["created_at"], "%Y-%m-%d %H:%M:%S")
-        if datetime.now() - created_at < timedelta(hours=24):
-            need_fetch = False 
-
-    if need_fetch:
-        try:
-            serp_api_key = os.getenv("SERPAPI_KEY")
-            search_api = HotelSearchAPI(serp_api_key)
-            results = search_api.search_hotels(city, price, rating, amenities)
-            
-            if results:
-                db.execute(
-                    """INSERT OR REPLACE INTO search_cache 
-                       (search_hash, city, params_json, results_json, created_at) 
-                       VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)""",
-                    (
-                        search_hash, 
-                        city,
-                        json.dumps({"city": city, "price": price, "rating": rating, "amenities": amenities}),
-                        json.dumps(results, ensure_ascii=False)
-                    )
-                )
-                db.commit()
-        except Exception as e:
-            print(f"Error fetching new data: {e}")
-            flash("Có lỗi khi tìm kiếm, vui lòng thử lại.")
-            return redirect(url_for("main.home"))
+    try:
+        cache_status = hotel_cache.ensure_search(search_hash, city, price, rating, amenities)
+    except Exception as e:
+        print(f"Error fetching new data: {e}")
+        flash("Có lỗi khi tìm kiếm, vui lòng thử lại.")
+        return redirect(url_for("main.home"))
 
-    return redirect(url_for("hotel.display_results", search_hash=search_hash))
+    return _with_cache_status(
+        redirect(url_for("hotel.display_results", search_hash=search_hash)), cache_status
+    )
 
 @hotel_bp.route("/results/<search_hash>", methods=["GET"])
 def display_results(search_hash):
     db = database.get_db()
-    row = db.execute(
-        "SELECT results_json, params_json FROM search_cache WHERE search_hash = ?", 
-        (search_hash,)
-    ).fetchone()
+    cached = cache_store.get("search", search_hash)
 
-    if not row:
+    if not cached:
         flash("Kết quả tìm kiếm đã hết hạn hoặc không tồn tại.")
         return redirect(url_for("main.home"))
 
-    try:
-        hotels = json.loads(row["results_json"])
-        search_params = json.loads(row["params_json"]) 
-    except:
-        hotels = []
-        search_params = {}
-
-    user = None
-    if "user_id" in session:
-        user = db.execute("SELECT preferences FROM users WHERE id=?", (session["user_id"],)).fetchone()
+    # Copies: ranking below annotates and reorders the hotels.
+    hotels = [dict(h) for h in cached.value["slim"]]
+    search_params = cached.value["params"]
+
+    cache_status = cache_policy.classify("search_cache", cached.created_at)
+    refresh_args = (
+        search_hash,
+        search_params.get("city"),
+        search_params.get("price"),
+        search_params.get("rating"),
+        search_params.get("amenities"),
+    )
+    if cache_status == cache_policy.STALE:
+        cache_policy.schedule_refresh(
+            f"search:{search_hash}", lambda: hotel_cache.refresh_search(*refresh_args)
+        )
+    elif cache_status == cache_policy.EXPIRED:
+        try:
+            # Nothing found upstream writes no row: the expired one stays.
+            if hotel_cache.refresh_search(*refresh_args):
+                hotels = [dict(h) for h in hotel_cache.load_search_results(search_hash)]
+                cache_status = cache_policy.REFRESHED
+        except Exception as e:
+            print(f"Error refreshing expired results: {e}")
 
-    if hotels and user and user["preferences"]:
+    prefs = current_preferences()
+    if hotels and prefs:
         try:
-            prefs = json.loads(user["preferences"])
-            for hotel in hotels:
-                match_result = calculate_match_score(prefs, hotel)
+            for hotel, match_result in zip(hotels, score_cache.get_scores(db, prefs, hotels)):
                 hotel["match_score"] = match_result.get("score", 0)
             hotels.sort(key=lambda x: x.get("match_score", 0), reverse=True)
             
@@ -143,7 +126,7 @@ def display_results(search_hash):
         ).fetchall()
         favorite_tokens = [row["property_token"] for row in fav_rows]
 
-    return render_template(
+    return _with_cache_status(render_template(
         "hotel/hotel_results.html",
         hotels=hotels,
         favorite_tokens=favorite_tokens,
@@ -153,134 +136,85 @@ def display_results(search_hash):
             "rating_range": search_params.get("rating"),
             "amenities": search_params.get("amenities")
         }
-    )
+    ), cache_status)
 
 @hotel_bp.route("/hotel/<property_token>")
 def hotel_detail(property_token):
     if "user_id" not in session:
         return redirect(url_for("auth.login"))
     db = database.get_db()
-    cached_row = db.execute(
-        "SELECT data, created_at FROM hotel_cache WHERE token = ?", (property_token,)
-    ).fetchone()
+    cached = cache_store.get("hotel", property_token)
     hotel_data = None
-    use_cache = False
-
-    if cached_row:
-        stored_time = datetime.strptime(
-            cached_row["created_at"], "%Y-%m-%d %H:%M:%S"
-        )
-        if datetime.now() - stored_time < timedelta(days=5):
-            print(f"Cached DB: {property_token}")
-            hotel_data = json.loads(cached_row["data"])
-            use_cache = True
+    cache_status = cache_policy.classify(
+        "hotel_cache", cached.created_at if cached else None
+    )
 
-    if not use_cache:
+    if cache_status in (cache_policy.FRESH, cache_policy.STALE):
+        print(f"Cached DB ({cache_status}): {property_token}")
+        hotel_data = cached.value["data"]
+        if cache_status == cache_policy.STALE:
+            cache_policy.schedule_refresh(
+                f"hotel:{property_token}", lambda: hotel_cache.refresh_hotel(property_token)
+            )
+    else:
         print(f"Fetching fresh data from API: {property_token}")
         try:
-            serp_api_key = os.getenv("SERPAPI_KEY")
-            search_api = HotelSearchAPI(serp_api_key)
-            hotel_data = search_api.get_hotel_details(property_token)
-
-            if hotel_data:
-                hotel_data["property_token"] = property_token
-                json_string = json.dumps(hotel_data, ensure_ascii=False)
-                db.execute(
-                    "INSERT OR REPLACE INTO hotel_cache (token, data) VALUES (?, ?)",
-                    (property_token, json_string),
-                )
-                db.commit()
+            hotel_data = hotel_cache.refresh_hotel(property_token)
+            cache_status = cache_policy.REFRESHED
+            if not hotel_data and cached:
+                hotel_data = cached.value["data"]
+                cache_status = cache_policy.STALE
         except Exception as exc:
             print(f"Error fetching details: {exc}")
-            if cached_row:
-                hotel_data = json.loads(cached_row["data"])
+            if cached:
+                hotel_data = cached.value["data"]
             else:
                 return render_template(
                     "hotel/hotel_detail.html", error="Không thể tải dữ liệu khách sạn."
                 )
 
+    hotel_slim = None
     if hotel_data:
-        try:
-            preview_info = {
-                "name": hotel_data.get("name"),
-                "image": hotel_data.get("images")[0].get("original_image")
-                if hotel_data.get("images")
-                else "",
-                "price": hotel_data.get("rate_per_night", {}).get("lowest", "Liên hệ"),
-                "address": hotel_data.get("address"),
-            }
-            preview_json = json.dumps(preview_info, ensure_ascii=False)
-
-            check_exist = db.execute(
-                "SELECT 1 FROM recently_viewed WHERE user_id=? AND property_token=?",
-                (session["user_id"], property_token),
-            ).fetchone()
-
-            if check_exist:
-                db.execute(
-                    "UPDATE recently_viewed SET visited_at = CURRENT_TIMESTAMP, preview_data = ? WHERE user_id = ? AND property_token = ?",
-                    (preview_json, session["user_id"], property_token),
-                )
-            else:
-                db.execute(
-                    "INSERT INTO recently_viewed (user_id, property_token, preview_data, visited_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
-                    (session["user_id"], property_token, preview_json),
-                )
-            db.commit()
-        except Exception as exc: 
-            print(f"Lỗi lưu lịch sử: {exc}")
+        if cached and cache_status != cache_policy.REFRESHED:
+            hotel_slim = cached.value["slim"]
+        else:
+            hotel_slim = slim_hotel(hotel_data)
 
     if not hotel_data:
         return render_template("hotel/hotel_detail.html", error="Không tìm thấy khách sạn.")
 
     match_reason = None
-    if "user_id" in session:
-        user = db.execute(
-            "SELECT preferences FROM users WHERE id=?", (session["user_id"],)
-        ).fetchone()
-        recent_entry = db.execute(
-            "SELECT match_reason FROM recently_viewed WHERE user_id=? AND property_token=?",
-            (session["user_id"], property_token),
-        ).fetchone()
-
-        if recent_entry and recent_entry["match_reason"]:
-            match_reason = recent_entry["match_reason"]
+    prefs = current_preferences()
+    if prefs and hotel_slim:
+        try:
+            scored = dict(hotel_slim, property_token=property_token)
+            result = score_cache.get_scores(db, prefs, [scored])[0]
+            match_reason = f"{result['score']}|{result['reason']}"
+        except Exception as exc:
+            print(f"Match score error: {exc}")
 
+    # History and passive learning are written together once, below.
+    learned_prefs = None
     if "user_id" in session:
-        user_db = db.execute(
-            "SELECT preferences FROM users WHERE id=?", (session["user_id"],)
-        ).fetchone()
-        current_prefs = (
-            json.loads(user_db["preferences"]) if user_db and user_db["preferences"] else {}
-        )
+        # A copy: passive learning below edits it before saving.
+        current_prefs = dict(prefs or {})
 
         try:
-            price_str = hotel_data.get("rate_per_night", {}).get("lowest", "0")
-            price_num = int(re.sub(r"[^\d]", "", str(price_str)))
+            price_num = hotel_slim["price"] or 0
 
             if price_num > 1800000:
                 session["expensive_view_count"] = session.get("expensive_view_count", 0) + 1
                 if session["expensive_view_count"] >= 3:
                     if current_prefs.get("budget") != "high":
                         current_prefs["budget"] = "high"
-                        db.execute(
-                            "UPDATE users SET preferences = ? WHERE id = ?",
-                            (json.dumps(current_prefs), session["user_id"]),
-                        )
-                        db.commit()
+                        learned_prefs = current_prefs
                         print("✨ Passive Learning: Đã nâng cấp user lên HIGH budget.")
                         session["expensive_view_count"] = 0
         except Exception as exc:  
             print(f"Budget Learning Error: {exc}")
 
         try:
-            raw_amenities = []
-            if hotel_data.get("amenities"):
-                for amenity in hotel_data["amenities"]:
-                    val = amenity.get("name") if isinstance(amenity, dict) else amenity
-                    raw_amenities.append(val)
-
-            detected_vibe = analyze_vibe_from_amenities(raw_amenities)
+            detected_vibe = analyze_vibe_from_amenities(hotel_slim["amenity_names"])
             if detected_vibe:
                 if "vibe_tracker" not in session:
                     session["vibe_tracker"] = {}
@@ -292,11 +226,7 @@ def hotel_detail(property_token):
                 if current_score >= 4:
                     if current_prefs.get("vibe") != detected_vibe:
                         current_prefs["vibe"] = detected_vibe
-                        db.execute(
-                            "UPDATE users SET preferences = ? WHERE id = ?",
-                            (json.dumps(current_prefs), session["user_id"]),
-                        )
-                        db.commit()
+                        learned_prefs = current_prefs
                         print(
                             f"✨ Passive Learning: Đã đổi Vibe user sang {detected_vibe.upper()} dựa trên hành vi."
                         )
@@ -305,11 +235,20 @@ def hotel_detail(property_token):
         except Exception as exc:  
             print(f"Vibe Learning Error: {exc}")
 
+        try:
+            view_writes.record_view(
+                session["user_id"], property_token, preview_from_slim(hotel_slim), learned_prefs
+            )
+            if learned_prefs is not None:
+                remember_preferences(learned_prefs)
+        except Exception as exc: 
+            print(f"Lỗi lưu lịch sử: {exc}")
+
+    # The cached payload is shared with other requests; annotate a copy.
+    hotel_data = dict(hotel_data)
     dynamic_price = request.args.get("price")
     if dynamic_price:
-        if "rate_per_night" not in hotel_data:
-            hotel_data["rate_per_night"] = {}
-        hotel_data["rate_per_night"]["lowest"] = dynamic_price
+        hotel_data["rate_per_night"] = dict(hotel_data.get("rate_per_night") or {}, lowest=dynamic_price)
         hotel_data["is_dynamic_price"] = True
 
     check_in = request.args.get("check_in")
@@ -317,26 +256,15 @@ def hotel_detail(property_token):
     if check_in and check_out:
         hotel_data["search_context"] = {"check_in": check_in, "check_out": check_out}
 
-    filter_rating = request.args.get("filter_rating")
+    filter_rating = reviews.parse_rating(request.args.get("filter_rating"))
     sort_review = request.args.get("sort_review", "newest")
-
-    query = "SELECT * FROM user_reviews WHERE property_token = ?"
-    params = [property_token]
-
-    if filter_rating and filter_rating.isdigit():
-        query += " AND rating = ?"
-        params.append(int(filter_rating))
-
-    if sort_review == "oldest":
-        query += " ORDER BY created_at ASC"
-    elif sort_review == "highest":
-        query += " ORDER BY rating DESC, created_at DESC"
-    elif sort_review == "lowest":
-        query += " ORDER BY rating ASC, created_at DESC"
-    else:
-        query += " ORDER BY created_at DESC"
-
-    local_reviews = db.execute(query, tuple(params)).fetchall()
+    review_stats = reviews.get_stats(db, property_token)
+    try:
+        local_reviews, next_reviews = reviews.page(
+            db, property_token, filter_rating, sort_review, request.args.get("after"), stats=review_stats
+        )
+    except ValueError:
+        local_reviews, next_reviews = reviews.page(db, property_token, filter_rating, sort_review, stats=review_stats)
 
     is_favorite = False
     if "user_id" in session:
@@ -347,13 +275,15 @@ def hotel_detail(property_token):
         if fav_check:
             is_favorite = True
 
-    return render_template(
+    return _with_cache_status(render_template(
         "hotel/hotel_detail.html",
         match_reason=match_reason,
         hotel=hotel_data,
         local_reviews=local_reviews,
+        review_stats=review_stats,
+        next_reviews=next_reviews,
         is_favorite=is_favorite,
-    )
+    ), cache_status)
 
 
 @hotel_bp.route("/hotel/review", methods=["POST"])
@@ -370,16 +300,8 @@ def add_review():
     check_in = request.form.get("check_in")
     check_out = request.form.get("check_out")
 
-    if property_token and rating:
-        db = database.get_db()
-        db.execute(
-            "INSERT INTO user_reviews (property_token, username, rating, comment) VALUES (?, ?, ?, ?)",
-            (property_token, username, int(rating), comment),
-        )
-        db.execute(
-            "DELETE FROM review_summaries WHERE property_token = ?", (property_token,)
-        )
-        db.commit()
+    if property_token and reviews.parse_rating(rating):
+        reviews.add_review(database.get_db(), property_token, username, rating, comment)
         flash("✅ Cảm ơn bạn đã đánh giá!")
     else:
         flash("❌ Vui lòng chọn số sao.")
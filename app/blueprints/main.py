@@ -12,19 +12,17 @@ from flask import (
 )
 
 from .. import database
+from ..services import hotel_cache
+from ..services.normalize import preview_from_slim
+from ..services.user_context import current_user, invalidate as invalidate_user
 
 main_bp = Blueprint("main", __name__)
 
 
 @main_bp.route("/")
 def home():
-    user_data = None
-    if "user_id" in session:
-        db = database.get_db()
-        user_data = db.execute(
-            "SELECT * FROM users WHERE id = ?", (session["user_id"],)
-        ).fetchone()
-    return render_template("index.html", user=user_data, form_type="login", ai_suggestion=None)
+    # ``user`` comes from the inject_user context processor.
+    return render_template("index.html", form_type="login", ai_suggestion=None)
 
 
 @main_bp.route("/profile", methods=["GET", "POST"])
@@ -50,6 +48,7 @@ def profile():
                 (full_name, email, phone, address, session["user_id"]),
             )
             db.commit()
+            invalidate_user()
             flash("✅ Cập nhật hồ sơ thành công!")
         except Exception as exc: 
             print(exc)
@@ -57,10 +56,7 @@ def profile():
 
         return redirect(url_for("main.profile"))
 
-    user_info = db.execute(
-        "SELECT * FROM users WHERE id = ?", (session["user_id"],)
-    ).fetchone()
-    return render_template("auth/profile.html", user_info=user_info)
+    return render_template("auth/profile.html", user_info=current_user().row)
 
 
 @main_bp.route("/favorites", methods=["POST"])
@@ -70,12 +66,16 @@ def save_favorites():
 
     data = request.get_json()
     token = data.get("property_token")
-    preview_info = {
-        "name": data.get("name"),
-        "image": data.get("image"),
-        "price": data.get("price"),
-        "address": data.get("address"),
-    }
+    fields = hotel_cache.load_hotel_fields(token) if token else None
+    if fields:
+        preview_info = preview_from_slim(fields)
+    else:
+        preview_info = {
+            "name": data.get("name"),
+            "image": data.get("image"),
+            "price": data.get("price"),
+            "address": data.get("address"),
+        }
     preview_json = json.dumps(preview_info, ensure_ascii=False)
     user_id = session["user_id"]
 
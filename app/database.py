@@ -1,29 +1,104 @@
+import os
 import sqlite3
+import threading
 from pathlib import Path
 
 import click
-from flask import current_app, g
+from flask import current_app, g, request
 from flask.cli import with_appcontext
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DEFAULT_DB = BASE_DIR / "user_db.db"
 
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+SEARCH_INDEX_VERSION = 4  # migrations/0004_search_index.sql
+
+# Columns added to existing tables before versioned migrations existed;
+# init_db adds them to older databases.
+ADDED_COLUMNS = [
+    ("search_cache", "slim_json", "TEXT"),
+    ("hotel_cache", "slim", "TEXT"),
+]
+
+BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))  # seconds
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+# Count SQL statements per request (X-Query-Count header and a log line).
+COUNT_QUERIES = os.getenv("SQLITE_COUNT_QUERIES", "0").lower() in ("1", "true", "yes")
+
+# One connection per (thread, database file), reused across requests so the
+# page cache and the compiled statement cache survive between them.
+_local = threading.local()
+
+
+def connect(db_path):
+    """Open a connection with the pragmas every connection should carry."""
+    conn = sqlite3.connect(
+        db_path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=STATEMENT_CACHE,
+    )
+    conn.row_factory = sqlite3.Row
+    # Only takes effect on a new database file (or after VACUUM); lets
+    # cache maintenance hand freed pages back with incremental_vacuum.
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets readers proceed while a writer commits; NORMAL only fsyncs at
+    # checkpoints, which is durable across application crashes.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if COUNT_QUERIES:
+        conn.set_trace_callback(_count_statement)
+    return conn
+
+
+def _count_statement(_sql):
+    # Connections are per thread, so is the counter.
+    _local.queries = getattr(_local, "queries", 0) + 1
+
+
+def reset_query_count():
+    _local.queries = 0
+
+
+def query_count():
+    return getattr(_local, "queries", 0)
+
+
+def _thread_connection(db_path, role=None):
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.pid != os.getpid():
+        # Never share a connection inherited across fork().
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get((db_path, role))
+    if conn is None:
+        conn = conns[(db_path, role)] = connect(db_path)
+    return conn
+
 
 def get_db():
     if "db" not in g:
         db_path = current_app.config.get("DATABASE", str(DEFAULT_DB))
-        g.db = sqlite3.connect(
-            db_path,
-            detect_types=sqlite3.PARSE_DECLTYPES,
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = _thread_connection(db_path)
     return g.db
 
 
+def get_lease_db():
+    """A second per-thread connection, for writes that must commit on their
+    own (fetch leases) without touching the transaction get_db() has open."""
+    return _thread_connection(current_app.config.get("DATABASE", str(DEFAULT_DB)), "lease")
+
+
 def close_db(e=None):
+    """Hand the connection back to its thread, ending any transaction left open."""
     db = g.pop("db", None)
-    if db is not None:
-        db.close()
+    if db is not None and db.in_transaction:
+        db.rollback()
 
 
 def init_db():
@@ -31,7 +106,163 @@ def init_db():
     schema_path = Path(current_app.root_path) / "schema.sql"
     with open(schema_path, "r", encoding="utf8") as f:
         db.executescript(f.read())
+    _add_missing_columns(db)
     db.commit()
+    _fill_new_tables(db, upgrade_db(db))
+
+
+def _fill_new_tables(db, applied):
+    """Populate tables that migrations create but cannot fill in SQL alone."""
+    if SEARCH_INDEX_VERSION in applied:
+        # Existing cache rows and reviews predate the index.
+        from .services import search_index
+
+        print(f"Search index built: {search_index.rebuild(db)}")
+
+
+def _add_missing_columns(db):
+    for table, column, decl in ADDED_COLUMNS:
+        existing = {row["name"] for row in db.execute(f"PRAGMA table_info({table})")}
+        if column not in existing:
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def list_migrations():
+    """[(version, name, path)] for app/migrations/NNNN_name.sql, in order."""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        number, _, name = path.stem.partition("_")
+        migrations.append((int(number), name, path))
+    return migrations
+
+
+def schema_version(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _statements(script):
+    buffer = ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                yield buffer
+            buffer = ""
+    if buffer.strip() and not buffer.strip().startswith("--"):
+        yield buffer
+
+
+def upgrade_db(db, target=None):
+    """Apply pending migrations in order; returns the versions applied.
+
+    The applied version is kept in PRAGMA user_version. Each migration runs in
+    its own BEGIN IMMEDIATE transaction and re-checks the version inside it,
+    so workers starting together apply it exactly once.
+    """
+    applied = []
+    for version, name, path in list_migrations():
+        if target is not None and version > target:
+            break
+        if version <= schema_version(db):
+            continue
+        script = path.read_text(encoding="utf8")
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= schema_version(db):
+                db.rollback()
+                continue
+            for statement in _statements(script):
+                db.execute(statement)
+            db.execute(f"PRAGMA user_version = {version}")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        print(f"Applied migration {version:04d}_{name}")
+        applied.append(version)
+    return applied
+
+
+# Hot-path queries and the index each must be answered with (see `flask db-explain`).
+QUERY_PLAN_CHECKS = [
+    (
+        "hotel_detail reviews, newest (next page)",
+        "SELECT * FROM user_reviews WHERE property_token = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT 11",
+        "idx_user_reviews_token_created",
+    ),
+    (
+        "hotel_detail reviews, by star / lowest (next page)",
+        "SELECT * FROM user_reviews WHERE property_token = ? AND rating = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT 11",
+        "idx_user_reviews_token_rating_created",
+    ),
+    (
+        "hotel_detail reviews, highest (next page)",
+        "SELECT * FROM user_reviews WHERE property_token = ? AND (rating, created_at, id) < (?, ?, ?) "
+        "ORDER BY rating DESC, created_at DESC, id DESC LIMIT 11",
+        "idx_user_reviews_token_rating_created",
+    ),
+    (
+        "hotel_detail review stats",
+        "SELECT * FROM review_stats WHERE property_token = ?",
+        "sqlite_autoindex_review_stats_1",
+    ),
+    (
+        "find_cached (chat search, local first)",
+        "SELECT h.id, h.slim FROM local_hotels h WHERE h.city_key = ? AND h.indexed_at > ? ORDER BY h.rating DESC",
+        "idx_local_hotels_city_rating",
+    ),
+    (
+        "find_cached with a price range",
+        "SELECT h.id, h.slim FROM local_hotels h WHERE h.city_key = ? AND h.indexed_at > ? "
+        "AND h.price >= ? AND h.price <= ? ORDER BY h.rating DESC",
+        "idx_local_hotels_city_rating",
+    ),
+    (
+        "summarize_reviews",
+        "SELECT rating, comment FROM user_reviews WHERE property_token = ? AND comment IS NOT NULL "
+        "ORDER BY created_at DESC LIMIT 20",
+        "idx_user_reviews_token_created",
+    ),
+    (
+        "history",
+        "SELECT property_token, preview_data, visited_at FROM recently_viewed WHERE user_id = ? "
+        "ORDER BY visited_at DESC LIMIT 20",
+        "idx_recently_viewed_user_visited",
+    ),
+    (
+        "get_user_recent_city",
+        "SELECT preview_data FROM recently_viewed WHERE user_id = ? ORDER BY visited_at DESC LIMIT 10",
+        "idx_recently_viewed_user_visited",
+    ),
+    (
+        "load_favorites",
+        "SELECT property_token, preview_data FROM favorite_places WHERE user_id = ?",
+        "sqlite_autoindex_favorite_places_1",
+    ),
+    (
+        "superset candidates",
+        "SELECT search_hash, city, params_json, created_at FROM search_cache "
+        "WHERE date(created_at) = date('now') AND created_at > datetime('now', ?) ORDER BY created_at DESC",
+        "idx_search_cache_created",
+    ),
+]
+
+
+def explain_query_plans(db):
+    """[(label, expected_index, plan_lines, ok)] for QUERY_PLAN_CHECKS.
+
+    A check passes when the plan uses the expected index and needs no temp
+    B-tree for sorting.
+    """
+    results = []
+    for label, sql, index in QUERY_PLAN_CHECKS:
+        params = [None] * sql.count("?")
+        plan = [row["detail"] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        ok = any(index in line for line in plan) and not any("TEMP B-TREE" in line for line in plan)
+        results.append((label, index, plan, ok))
+    return results
 
 
 @click.command("init-db")
@@ -41,6 +272,182 @@ def init_db_command():
     click.echo("Đã khởi tạo database.")
 
 
+@click.command("db-upgrade")
+@click.option("--to", "target", type=int, default=None, help="Stop at this migration version.")
+@with_appcontext
+def db_upgrade_command(target):
+    """Apply pending schema migrations to the configured database."""
+    db = get_db()
+    before = schema_version(db)
+    applied = upgrade_db(db, target)
+    _fill_new_tables(db, applied)
+    latest = list_migrations()[-1][0] if list_migrations() else 0
+    click.echo(f"Schema version {before} -> {schema_version(db)} (latest {latest}), {len(applied)} applied.")
+
+
+@click.command("db-explain")
+@with_appcontext
+def db_explain_command():
+    """Check that hot-path queries use their indexes (EXPLAIN QUERY PLAN)."""
+    failed = 0
+    for label, index, plan, ok in explain_query_plans(get_db()):
+        click.echo(f"[{'OK' if ok else 'FAIL'}] {label}: expects {index}")
+        for line in plan:
+            click.echo(f"       {line}")
+        failed += not ok
+    if failed:
+        raise click.ClickException(f"{failed} query plan check(s) failed.")
+
+
+@click.command("search-reindex")
+@with_appcontext
+def search_reindex_command():
+    """Rebuild the local full-text index from the caches and reviews."""
+    from .services import search_index
+
+    counts = search_index.rebuild(get_db())
+    click.echo(
+        f"Indexed {counts['searches']} cached searches, {counts['hotels']} cached hotels "
+        f"and {counts['reviews']} review comments."
+    )
+
+
+@click.command("cache-reencode")
+@click.option("--codec", "codec_name", default=None, help="json, zlib or zstd (default: CACHE_CODEC).")
+@click.option("--batch-size", default=200, show_default=True)
+@click.option("--vacuum", is_flag=True, help="VACUUM afterwards to return freed pages to the OS.")
+@with_appcontext
+def reencode_cache_command(codec_name, batch_size, vacuum):
+    """Re-encode cached SerpAPI payloads with the current codec."""
+    from .services import codec
+
+    target = codec_name or codec.default_codec()
+    if target not in codec.ENCODERS:
+        raise click.BadParameter(f"codec '{target}' is not available")
+
+    db = get_db()
+    for table, key, column in (
+        ("search_cache", "search_hash", "results_json"),
+        ("hotel_cache", "token", "data"),
+    ):
+        converted = skipped = before = after = 0
+        last_key = ""
+        while True:
+            rows = db.execute(
+                f"SELECT {key} AS k, {column} AS v FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?",
+                (last_key, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                value = row["v"]
+                if value is None or codec.codec_of(value) == target:
+                    skipped += 1
+                    continue
+                encoded = codec.encode(codec.decode(value), target)
+                before += len(value.encode("utf-8") if isinstance(value, str) else value)
+                after += len(encoded)
+                db.execute(f"UPDATE {table} SET {column} = ? WHERE {key} = ?", (encoded, row["k"]))
+                converted += 1
+            db.commit()
+            last_key = rows[-1]["k"]
+
+        click.echo(
+            f"{table}: {converted} rows re-encoded to {target} "
+            f"({before / 1024:.1f} KiB -> {after / 1024:.1f} KiB), {skipped} unchanged."
+        )
+
+    if vacuum:
+        db.execute("VACUUM")
+        click.echo("VACUUM done.")
+
+
+SNAPSHOT_TABLES = ["search_cache", "hotel_cache", "llm_cache"]
+
+
+@click.command("cache-export")
+@click.argument("path", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option("--table", "tables", multiple=True, type=click.Choice(SNAPSHOT_TABLES), help="Default: all of them.")
+@click.option("--chunk-size", default=500, show_default=True)
+@with_appcontext
+def cache_export_command(path, tables, chunk_size):
+    """Write the caches to a gzip'd JSON-lines snapshot ("-" for stdout)."""
+    from .services import cache_snapshot
+
+    with click.open_file(path, "wb") as out:
+        counts = cache_snapshot.export_snapshot(get_db(), out, tables or SNAPSHOT_TABLES, chunk_size)
+    click.echo(", ".join(f"{table}: {count}" for table, count in counts.items()) + " rows exported.", err=True)
+
+
+@click.command("cache-import")
+@click.argument("path", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option("--replace", is_flag=True, help="Empty the snapshot's tables before loading it.")
+@click.option("--include-expired", is_flag=True, help="Also load rows past their max age.")
+@with_appcontext
+def cache_import_command(path, replace, include_expired):
+    """Load a snapshot written by cache-export, in one transaction."""
+    from .services import cache_snapshot
+
+    try:
+        with click.open_file(path, "rb") as src:
+            counts = cache_snapshot.import_snapshot(get_db(), src, replace, include_expired)
+    except (OSError, EOFError, ValueError, RuntimeError) as exc:
+        raise click.ClickException(f"Import failed, nothing was changed: {exc}")
+    for table, c in counts.items():
+        click.echo(f"{table}: {c['imported']} imported, {c['skipped']} skipped (expired or older).")
+
+
+@click.command("cache-maintain")
+@click.option("--policy", type=click.Choice(["lru", "lfu"]), default=None, help="Default: CACHE_EVICTION_POLICY.")
+@click.option("--dry-run", is_flag=True, help="Report what would be removed without deleting.")
+@click.option("--no-vacuum", is_flag=True, help="Skip returning free pages to the OS.")
+@click.option("--convert", is_flag=True, help="Switch an older database to incremental auto-vacuum (full VACUUM).")
+@with_appcontext
+def cache_maintain_command(policy, dry_run, no_vacuum, convert):
+    """Purge expired cache rows and enforce the per-table size budgets."""
+    from .services import cache_maintenance
+
+    db = get_db()
+    if convert and db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        db.execute("VACUUM")
+        click.echo("Database converted to incremental auto-vacuum.")
+
+    report = cache_maintenance.run_maintenance(db, policy=policy, dry_run=dry_run, vacuum=not no_vacuum)
+    for table, r in report["tables"].items():
+        click.echo(
+            f"{table}: {r['expired']} expired, {r['over_rows']} over row budget, "
+            f"{r['over_bytes']} over byte budget ({r['bytes_freed'] / 1024:.1f} KiB)"
+        )
+    click.echo(
+        f"{'Would remove' if dry_run else 'Removed'} {report['rows_removed']} rows "
+        f"({report['bytes_freed'] / 1024:.1f} KiB payload, {report['policy'].upper()}); "
+        f"{report['pages_freed']} pages returned, {report['free_pages']} still free; "
+        f"file {report['file_bytes_before'] / 1024:.0f} KiB -> {report['file_bytes_after'] / 1024:.0f} KiB."
+    )
+
+
+def _start_query_count():
+    reset_query_count()
+
+
+def _report_query_count(response):
+    count = query_count()
+    response.headers["X-Query-Count"] = str(count)
+    print(f"{request.method} {request.path}: {count} queries")
+    return response
+
+
 def init_app(app):
     app.teardown_appcontext(close_db)
+    if COUNT_QUERIES:
+        app.before_request(_start_query_count)
+        app.after_request(_report_query_count)
     app.cli.add_command(init_db_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_explain_command)
+    app.cli.add_command(search_reindex_command)
+    app.cli.add_command(reencode_cache_command)
+    app.cli.add_command(cache_maintain_command)
+    app.cli.add_command(cache_export_command)
+    app.cli.add_command(cache_import_command)
@@ -0,0 +1,14 @@
+-- Reviews on the hotel page and in summarize_reviews: filter by hotel
+-- (optionally by star rating) and sort by date or rating.
+CREATE INDEX IF NOT EXISTS idx_user_reviews_token_created
+    ON user_reviews (property_token, created_at);
+CREATE INDEX IF NOT EXISTS idx_user_reviews_token_rating_created
+    ON user_reviews (property_token, rating, created_at);
+
+-- History page and get_user_recent_city: a user's latest views first.
+CREATE INDEX IF NOT EXISTS idx_recently_viewed_user_visited
+    ON recently_viewed (user_id, visited_at);
+
+-- Superset lookups walk today's search_cache rows newest first.
+CREATE INDEX IF NOT EXISTS idx_search_cache_created
+    ON search_cache (created_at);
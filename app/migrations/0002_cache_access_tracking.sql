@@ -0,0 +1,16 @@
+-- Last read time and read count of cache rows, maintained by
+-- services/cache_maintenance.touch() and used for LRU / LFU eviction.
+ALTER TABLE search_cache ADD COLUMN last_accessed_at DATETIME;
+ALTER TABLE search_cache ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE hotel_cache ADD COLUMN last_accessed_at DATETIME;
+ALTER TABLE hotel_cache ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE review_summaries ADD COLUMN last_accessed_at DATETIME;
+ALTER TABLE review_summaries ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE hotel_itineraries ADD COLUMN last_accessed_at DATETIME;
+ALTER TABLE hotel_itineraries ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE match_scores ADD COLUMN last_accessed_at DATETIME;
+ALTER TABLE match_scores ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0;
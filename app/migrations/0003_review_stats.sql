@@ -0,0 +1,21 @@
+-- Per-hotel review aggregates, kept up to date by services/reviews.add_review()
+-- so the hotel page never has to read every review to show them.
+CREATE TABLE IF NOT EXISTS review_stats (
+    property_token TEXT PRIMARY KEY,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    stars_1 INTEGER NOT NULL DEFAULT 0,
+    stars_2 INTEGER NOT NULL DEFAULT 0,
+    stars_3 INTEGER NOT NULL DEFAULT 0,
+    stars_4 INTEGER NOT NULL DEFAULT 0,
+    stars_5 INTEGER NOT NULL DEFAULT 0,
+    last_review_at DATETIME
+);
+
+INSERT OR REPLACE INTO review_stats
+    (property_token, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5, last_review_at)
+SELECT property_token, COUNT(*), SUM(rating),
+       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5),
+       MAX(created_at)
+FROM user_reviews
+GROUP BY property_token;
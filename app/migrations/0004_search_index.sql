@@ -0,0 +1,28 @@
+-- Local full-text index over cached hotels and review comments, kept in sync
+-- by services/search_index.py on every cache and review insert.
+-- One row per hotel seen in search_cache / hotel_cache; the FTS rows share
+-- its id and hold the same text folded (lowercase, no diacritics, đ -> d).
+CREATE TABLE IF NOT EXISTS local_hotels (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    property_token TEXT UNIQUE NOT NULL,
+    city_key TEXT,
+    name TEXT,
+    address TEXT,
+    amenities TEXT,
+    nearby TEXT,
+    slim TEXT NOT NULL,
+    indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_local_hotels_city_indexed
+    ON local_hotels (city_key, indexed_at);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS hotel_fts USING fts5(
+    name, address, amenities, nearby,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- rowid = user_reviews.id
+CREATE VIRTUAL TABLE IF NOT EXISTS review_fts USING fts5(
+    comment,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
@@ -0,0 +1,41 @@
+-- Fields of the slim hotel record (services/normalize.slim_hotel) as virtual
+-- generated columns, so a query can read a handful of them without decoding
+-- the compressed payload in hotel_cache.data (see hotel_cache.load_hotel_fields).
+-- NULL on rows cached before slim records existed.
+ALTER TABLE hotel_cache ADD COLUMN name TEXT
+    GENERATED ALWAYS AS (json_extract(slim, '$.name')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN price INTEGER
+    GENERATED ALWAYS AS (json_extract(slim, '$.price')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN price_text TEXT
+    GENERATED ALWAYS AS (json_extract(slim, '$.price_text')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN rating REAL
+    GENERATED ALWAYS AS (json_extract(slim, '$.rating')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN hotel_class INTEGER
+    GENERATED ALWAYS AS (json_extract(slim, '$.hotel_class')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN amenity_text TEXT
+    GENERATED ALWAYS AS (json_extract(slim, '$.amenity_text')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN image TEXT
+    GENERATED ALWAYS AS (json_extract(slim, '$.image')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN address TEXT
+    GENERATED ALWAYS AS (json_extract(slim, '$.address')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN latitude REAL
+    GENERATED ALWAYS AS (json_extract(slim, '$.gps[0]')) VIRTUAL;
+ALTER TABLE hotel_cache ADD COLUMN longitude REAL
+    GENERATED ALWAYS AS (json_extract(slim, '$.gps[1]')) VIRTUAL;
+-- JSON text: [{"name": ..., "duration": ...}], NULL for older slim records.
+ALTER TABLE hotel_cache ADD COLUMN nearby TEXT
+    GENERATED ALWAYS AS (json_extract(slim, '$.nearby')) VIRTUAL;
+
+-- Local-first chat searches (search_index.find_cached) filter a city's hotels
+-- by price / class and walk them best rated first.
+ALTER TABLE local_hotels ADD COLUMN price INTEGER
+    GENERATED ALWAYS AS (json_extract(slim, '$.price')) VIRTUAL;
+ALTER TABLE local_hotels ADD COLUMN hotel_class INTEGER
+    GENERATED ALWAYS AS (json_extract(slim, '$.hotel_class')) VIRTUAL;
+ALTER TABLE local_hotels ADD COLUMN rating REAL
+    GENERATED ALWAYS AS (json_extract(slim, '$.rating')) VIRTUAL;
+-- Replaces (city_key, indexed_at): the planner would pick it and sort every
+-- row of the city instead of stopping after the first matches.
+DROP INDEX IF EXISTS idx_local_hotels_city_indexed;
+CREATE INDEX IF NOT EXISTS idx_local_hotels_city_rating
+    ON local_hotels (city_key, rating);
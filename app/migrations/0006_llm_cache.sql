@@ -0,0 +1,18 @@
+-- Gemini replies keyed by a hash of (task, model, normalized prompt inputs),
+-- see services/llm_cache.py. Replaces the per-feature review_summaries and
+-- hotel_itineraries tables for new replies. Those are kept, read-only: their
+-- rows are keyed by hotel rather than by prompt, so llm_cache copies one over
+-- when it is next asked for (services/llm_cache.py LEGACY) and cache-maintain
+-- purges the rest past their TTL. A later migration drops the empty tables.
+CREATE TABLE IF NOT EXISTS llm_cache (
+    cache_key TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_accessed_at DATETIME,
+    hit_count INTEGER NOT NULL DEFAULT 0
+);
+-- cache-maintain purges replies past their max age.
+CREATE INDEX IF NOT EXISTS idx_llm_cache_created
+    ON llm_cache (created_at);
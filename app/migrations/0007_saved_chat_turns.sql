@@ -0,0 +1,11 @@
+-- Ids of chat turns already added to a chat history by /api/save_chat_turn.
+-- The history lives in the client's cookie, which can be sent again from an
+-- older copy, so a turn's single use is recorded here. Rows older than
+-- CHAT_TURN_MAX_AGE are deleted on the next save (the turn's signature has
+-- expired by then).
+CREATE TABLE IF NOT EXISTS saved_chat_turns (
+    turn_id TEXT PRIMARY KEY,
+    saved_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_saved_chat_turns_saved
+    ON saved_chat_turns (saved_at);
@@ -1,3 +1,4 @@
+-- Baseline schema. Later changes are versioned migrations in migrations/.
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     username TEXT UNIQUE NOT NULL,
@@ -24,15 +25,17 @@ CREATE TABLE IF NOT EXISTS search_cache (
     search_hash TEXT PRIMARY KEY,
     city TEXT,
     params_json TEXT,
-    results_json TEXT,      
+    results_json BLOB,      
     result_count INTEGER,   
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    slim_json TEXT
 );
 
 CREATE TABLE IF NOT EXISTS hotel_cache (
     token TEXT PRIMARY KEY,
-    data TEXT NOT NULL,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    data BLOB NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    slim TEXT
 );
 
 CREATE TABLE IF NOT EXISTS user_reviews (
@@ -70,3 +73,19 @@ CREATE TABLE IF NOT EXISTS hotel_itineraries (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (property_token, vibe)
 );
+
+CREATE TABLE IF NOT EXISTS fetch_leases (
+    lease_key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS match_scores (
+    prefs_fp TEXT NOT NULL,
+    property_token TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (prefs_fp, property_token, data_version)
+);
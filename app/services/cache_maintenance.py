@@ -0,0 +1,311 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from .. import database
+from . import cache_policy, codec
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _budget(table, purge_after, max_rows, max_bytes):
+    prefix = f"CACHE_{table.upper()}"
+    return {
+        "purge_after": _env_int(f"{prefix}_PURGE_AFTER", purge_after),  # seconds since written
+        "max_rows": _env_int(f"{prefix}_MAX_ROWS", max_rows),
+        "max_bytes": _env_int(f"{prefix}_MAX_BYTES", max_bytes),
+    }
+
+
+# table -> key columns, write-time column and an estimate of the row's payload size.
+CACHE_TABLES = {
+    "search_cache": {
+        "key": ("search_hash",),
+        "written": "created_at",
+        "size": "IFNULL(length(results_json), 0) + IFNULL(length(slim_json), 0) + IFNULL(length(params_json), 0)",
+    },
+    "hotel_cache": {
+        "key": ("token",),
+        "written": "created_at",
+        "size": "IFNULL(length(data), 0) + IFNULL(length(slim), 0)",
+    },
+    "llm_cache": {
+        "key": ("cache_key",),
+        "written": "created_at",
+        "size": "length(response) + 64",
+    },
+    # Read-only since 0006 moved Gemini replies to llm_cache: emptied as their
+    # rows pass the task's TTL.
+    "review_summaries": {
+        "key": ("property_token",),
+        "written": "updated_at",
+        "size": "IFNULL(length(summary_content), 0)",
+    },
+    "hotel_itineraries": {
+        "key": ("property_token", "vibe"),
+        "written": "created_at",
+        "size": "IFNULL(length(itinerary_json), 0)",
+    },
+    "match_scores": {
+        "key": ("prefs_fp", "property_token", "data_version"),
+        "written": "created_at",
+        "size": "length(reason) + 64",
+    },
+}
+
+EVICTION_POLICY = os.getenv("CACHE_EVICTION_POLICY", "lru").lower()
+MAINTENANCE_INTERVAL = _env_int("CACHE_MAINTENANCE_INTERVAL", 0)  # seconds; 0 disables
+TOUCH_FLUSH_SIZE = 200
+TOUCH_FLUSH_INTERVAL = 30
+
+
+def load_budgets():
+    """Per-table retention: rows older than purge_after are dropped, then the
+    least recently (or frequently) used rows until max_rows / max_bytes fit."""
+    policies = cache_policy.load_policies()
+    day = 24 * 3600
+    return {
+        "search_cache": _budget(
+            "search_cache", int(policies["search_cache"]["max_age"].total_seconds()), 5000, 200 * 2**20
+        ),
+        "hotel_cache": _budget(
+            "hotel_cache", int(policies["hotel_cache"]["max_age"].total_seconds()), 20000, 500 * 2**20
+        ),
+        # Replies are regenerated once past their task's TTL anyway.
+        "llm_cache": _budget(
+            "llm_cache", int(policies["llm_cache"]["max_age"].total_seconds()), 50000, 100 * 2**20
+        ),
+        "review_summaries": _budget(
+            "review_summaries", int(policies["llm_cache"]["tasks"]["review_summary"].total_seconds()), 20000, 50 * 2**20
+        ),
+        "hotel_itineraries": _budget(
+            "hotel_itineraries", int(policies["llm_cache"]["tasks"]["itinerary"].total_seconds()), 20000, 100 * 2**20
+        ),
+        "match_scores": _budget("match_scores", 30 * day, 200000, 100 * 2**20),
+    }
+
+
+_touches = {}
+_touch_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def touch(table, *key):
+    """Record a read of a cache row; access times are written in batches."""
+    now = time.time()
+    with _touch_lock:
+        hits, _ = _touches.get((table, key), (0, None))
+        _touches[(table, key)] = (hits + 1, now)
+        due = len(_touches) >= TOUCH_FLUSH_SIZE or time.monotonic() - _last_flush > TOUCH_FLUSH_INTERVAL
+    if due:
+        db = database.get_db()
+        # Never commit a transaction the caller still has open.
+        if not db.in_transaction:
+            flush_touches(db)
+
+
+def flush_touches(db):
+    global _last_flush
+    with _touch_lock:
+        pending = list(_touches.items())
+        _touches.clear()
+        _last_flush = time.monotonic()
+
+    by_table = {}
+    for (table, key), (hits, accessed_at) in pending:
+        accessed_at = datetime.utcfromtimestamp(accessed_at).strftime("%Y-%m-%d %H:%M:%S")
+        by_table.setdefault(table, []).append((accessed_at, hits) + key)
+    for table, rows in by_table.items():
+        where = " AND ".join(f"{col} = ?" for col in CACHE_TABLES[table]["key"])
+        db.executemany(
+            f"UPDATE {table} SET last_accessed_at = ?, hit_count = hit_count + ? WHERE {where}",
+            rows,
+        )
+    db.commit()
+    return len(pending)
+
+
+def _usage_order(spec, policy, direction):
+    """ORDER BY putting the least used rows first (ASC) or last (DESC)."""
+    last_used = f"COALESCE(last_accessed_at, {spec['written']}) {direction}"
+    if policy == "lfu":
+        return f"hit_count {direction}, {last_used}"
+    return last_used
+
+
+# What an evicted row of a table feeding the local search index held: its
+# hotels are dropped from the index once no cache row holds them any more.
+INDEXED_HOTELS = {
+    "search_cache": "slim_json, CASE WHEN slim_json IS NULL THEN results_json END AS results_json",
+    "hotel_cache": "token",
+}
+
+
+def _delete(db, table, size, where, params, evicted):
+    """Delete the matching rows, adding their keys (and indexed hotels) to
+    ``evicted``; returns their count and payload bytes."""
+    columns = list(CACHE_TABLES[table]["key"])
+    extra = INDEXED_HOTELS.get(table)
+    if extra and extra not in columns:
+        columns.append(extra)
+    rows = db.execute(f"SELECT {size} AS _bytes, {', '.join(columns)} FROM {table} WHERE {where}", params).fetchall()
+    if rows:
+        db.execute(f"DELETE FROM {table} WHERE {where}", params)
+        evicted.extend(rows)
+    return len(rows), sum(row["_bytes"] for row in rows)
+
+
+def _hotel_tokens(table, row):
+    if table == "hotel_cache":
+        return {row["token"]}
+    hotels = json.loads(row["slim_json"]) if row["slim_json"] else codec.decode(row["results_json"]) or []
+    return {hotel.get("property_token") for hotel in hotels} - {None}
+
+
+def _unindex(db, evicted):
+    """Drop indexed hotels that no remaining search or hotel row holds."""
+    from . import search_index
+
+    tokens = set()
+    for table in INDEXED_HOTELS:
+        for row in evicted.get(table, ()):
+            tokens |= _hotel_tokens(table, row)
+    if tokens:
+        placeholders = ", ".join("?" * len(tokens))
+        tokens -= {row["token"] for row in db.execute(
+            f"SELECT token FROM hotel_cache WHERE token IN ({placeholders})", list(tokens)
+        )}
+    if tokens:
+        for row in db.execute(f"SELECT {INDEXED_HOTELS['search_cache']} FROM search_cache"):
+            tokens -= _hotel_tokens("search_cache", row)
+            if not tokens:
+                break
+    return search_index.drop_hotels(db, tokens)
+
+
+def _evict_table(db, table, budget, policy, evicted):
+    spec = CACHE_TABLES[table]
+    size = spec["size"]
+    report = {}
+
+    report["expired"], freed_expired = _delete(
+        db, table, size, f"{spec['written']} < datetime('now', ?)", (f"-{budget['purge_after']} seconds",), evicted
+    )
+
+    excess = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - budget["max_rows"]
+    report["over_rows"], freed_rows = _delete(
+        db, table, size,
+        f"rowid IN (SELECT rowid FROM {table} ORDER BY {_usage_order(spec, policy, 'ASC')} LIMIT ?)",
+        (max(excess, 0),), evicted,
+    )
+
+    # Keep the most used rows while their running size fits max_bytes.
+    report["over_bytes"], freed_bytes = _delete(
+        db, table, size,
+        f"""rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, SUM({size}) OVER (
+                    ORDER BY {_usage_order(spec, policy, 'DESC')} ROWS UNBOUNDED PRECEDING
+                ) AS kept
+                FROM {table}
+            ) WHERE kept > ?
+        )""",
+        (budget["max_bytes"],), evicted,
+    )
+    report["bytes_freed"] = freed_expired + freed_rows + freed_bytes
+    return report
+
+
+def _file_bytes(db):
+    page_size = db.execute("PRAGMA page_size").fetchone()[0]
+    return db.execute("PRAGMA page_count").fetchone()[0] * page_size, page_size
+
+
+def run_maintenance(db, policy=None, dry_run=False, vacuum=True, budgets=None):
+    """Purge expired rows, enforce the budgets and give free pages back.
+
+    Evicted rows also leave the LRU / KV tiers, and their hotels the local
+    search index unless another cache row still holds them. Returns a report:
+    per-table row counts and payload bytes removed, plus the database size
+    before and after.
+    """
+    policy = (policy or EVICTION_POLICY).lower()
+    budgets = budgets or load_budgets()
+    flush_touches(db)
+    size_before, page_size = _file_bytes(db)
+
+    tables, evicted = {}, {}
+    for table, budget in budgets.items():
+        tables[table] = _evict_table(db, table, budget, policy, evicted.setdefault(table, []))
+    unindexed = _unindex(db, evicted)
+    # A dry run performs the same deletes and rolls them back.
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+        from . import cache_store
+
+        for namespace, spec in cache_store.NAMESPACES.items():
+            rows = evicted.get(spec["table"])
+            if rows:
+                cache_store.forget(namespace, [tuple(row[col] for col in spec["key"]) for row in rows])
+
+    pages_freed = 0
+    if vacuum and not dry_run:
+        free_pages = db.execute("PRAGMA freelist_count").fetchone()[0]
+        if db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+            # execute() steps a PRAGMA only once, freeing a single page;
+            # executescript runs it to completion.
+            db.executescript("PRAGMA incremental_vacuum;")
+            pages_freed = free_pages - db.execute("PRAGMA freelist_count").fetchone()[0]
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    size_after, _ = _file_bytes(db)
+    return {
+        "policy": policy,
+        "dry_run": dry_run,
+        "tables": tables,
+        "rows_removed": sum(r["expired"] + r["over_rows"] + r["over_bytes"] for r in tables.values()),
+        "unindexed_hotels": unindexed,
+        "bytes_freed": sum(r["bytes_freed"] for r in tables.values()),
+        "pages_freed": pages_freed,
+        "free_pages": db.execute("PRAGMA freelist_count").fetchone()[0],
+        "page_size": page_size,
+        "file_bytes_before": size_before,
+        "file_bytes_after": size_after,
+    }
+
+
+def start_background_maintenance(app, interval=MAINTENANCE_INTERVAL):
+    """Run run_maintenance every ``interval`` seconds in a daemon thread.
+
+    Every worker process starts one; a pass is skipped when another process
+    already ran one within the interval (singleflight.claim).
+    """
+    if interval <= 0:
+        return None
+    from .singleflight import claim
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    if not claim("cache-maintenance", interval):
+                        continue
+                    report = run_maintenance(database.get_db())
+                    if report:
+                        print(
+                            f"Cache maintenance: {report['rows_removed']} rows, "
+                            f"{report['bytes_freed'] / 1024:.0f} KiB payload, {report['pages_freed']} pages freed."
+                        )
+            except Exception as exc:
+                print(f"Cache maintenance error: {exc}")
+
+    thread = threading.Thread(target=loop, name="cache-maintenance", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,103 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+MISS = "miss"
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+REFRESHED = "refreshed"
+
+
+def _seconds(name, default):
+    return timedelta(seconds=int(os.getenv(name, default)))
+
+
+def load_policies():
+    """TTL (fresh) and max-age (stale-but-servable) per cache table."""
+    tasks = {
+        "review_summary": _seconds("REVIEW_SUMMARY_TTL", 24 * 3600),
+        "itinerary": _seconds("ITINERARY_CACHE_TTL", 3 * 24 * 3600),
+        "compare": _seconds("LLM_CACHE_TTL_COMPARE", 7 * 24 * 3600),
+        "hotel_chat": _seconds("LLM_CACHE_TTL_HOTEL_CHAT", 24 * 3600),
+    }
+    return {
+        "search_cache": {
+            "ttl": _seconds("SEARCH_CACHE_TTL", 24 * 3600),
+            "max_age": _seconds("SEARCH_CACHE_MAX_AGE", 3 * 24 * 3600),
+        },
+        "hotel_cache": {
+            "ttl": _seconds("HOTEL_CACHE_TTL", 5 * 24 * 3600),
+            "max_age": _seconds("HOTEL_CACHE_MAX_AGE", 10 * 24 * 3600),
+        },
+        # Gemini replies (services/llm_cache.py), never refreshed in the
+        # background: served while younger than their task's TTL, regenerated
+        # on request afterwards. Tasks missing here are not cached.
+        "llm_cache": {
+            "ttl": max(tasks.values()),
+            "max_age": max(tasks.values()),
+            "tasks": tasks,
+        },
+    }
+
+
+def get_policy(table):
+    policies = current_app.config.get("CACHE_POLICIES") or load_policies()
+    return policies[table]
+
+
+def classify(table, created_at):
+    """Return FRESH, STALE, EXPIRED or MISS for a row's created_at value."""
+    if not created_at:
+        return MISS
+    if isinstance(created_at, str):
+        created_at = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S")
+    policy = get_policy(table)
+    # created_at comes from CURRENT_TIMESTAMP, which SQLite stores in UTC.
+    age = datetime.utcnow() - created_at
+    if age < policy["ttl"]:
+        return FRESH
+    if age < policy["max_age"]:
+        return STALE
+    return EXPIRED
+
+
+def fresh_modifier(table):
+    """SQLite datetime() modifier selecting rows still inside the TTL."""
+    return f"-{int(get_policy(table)['ttl'].total_seconds())} seconds"
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CACHE_REFRESH_WORKERS", "2")),
+    thread_name_prefix="cache-refresh",
+)
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def schedule_refresh(key, refresh):
+    """Run ``refresh()`` in the background inside an app context.
+
+    Returns False when a refresh for ``key`` is already queued in this process.
+    """
+    app = current_app._get_current_object()
+    with _pending_lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+
+    def run():
+        try:
+            with app.app_context():
+                refresh()
+        except Exception as exc:
+            print(f"Background refresh error ({key}): {exc}")
+        finally:
+            with _pending_lock:
+                _pending.discard(key)
+
+    _executor.submit(run)
+    return True
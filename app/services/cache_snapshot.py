@@ -0,0 +1,169 @@
+import base64
+import gzip
+import json
+from datetime import datetime
+
+from .. import database
+from . import cache_policy, codec, search_index
+from .cache_maintenance import CACHE_TABLES
+
+FORMAT = "ligmastay-cache-snapshot"
+VERSION = 1
+TABLES = ("search_cache", "hotel_cache", "llm_cache")
+# Access statistics belong to the node that gathered them; an imported row
+# starts as if just written.
+SKIPPED_COLUMNS = {"last_accessed_at", "hit_count"}
+CHUNK_SIZE = 500
+
+
+def _columns(db, table):
+    # table_info leaves out generated columns; SQLite recomputes them on insert.
+    return [row["name"] for row in db.execute(f"PRAGMA table_info({table})") if row["name"] not in SKIPPED_COLUMNS]
+
+
+def _pack(value):
+    # Payload blobs are kept as stored (already compressed), base64 in JSON.
+    if isinstance(value, bytes):
+        return {"b64": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def _unpack(value):
+    if isinstance(value, dict):
+        return base64.b64decode(value["b64"])
+    return value
+
+
+def _write_line(out, obj):
+    out.write(json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+
+
+def export_snapshot(db, out, tables=TABLES, chunk_size=CHUNK_SIZE):
+    """Stream the cache tables into ``out`` (a binary file); returns rows per table.
+
+    The snapshot is gzip'd JSON lines: a header, then chunks of
+    ``{"table", "columns", "rows"}`` read in rowid order from one consistent
+    read transaction.
+    """
+    counts = {}
+    # The blobs are compressed already; a high level costs time for little gain.
+    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz:
+        _write_line(gz, {
+            "format": FORMAT,
+            "version": VERSION,
+            "schema_version": database.schema_version(db),
+            "exported_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            "tables": list(tables),
+        })
+        db.execute("BEGIN")
+        try:
+            for table in tables:
+                columns = _columns(db, table)
+                counts[table] = 0
+                last_rowid = 0
+                while True:
+                    rows = db.execute(
+                        f"SELECT rowid AS _rowid, {', '.join(columns)} FROM {table} "
+                        "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                        (last_rowid, chunk_size),
+                    ).fetchall()
+                    if not rows:
+                        break
+                    _write_line(gz, {
+                        "table": table,
+                        "columns": columns,
+                        "rows": [[_pack(row[col]) for col in columns] for row in rows],
+                    })
+                    counts[table] += len(rows)
+                    last_rowid = rows[-1]["_rowid"]
+        finally:
+            db.rollback()
+    return counts
+
+
+def _upsert_sql(table, columns):
+    spec = CACHE_TABLES[table]
+    updates = ", ".join(f"{col} = excluded.{col}" for col in columns if col not in spec["key"])
+    # Keep whichever copy of a row was written last.
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT({', '.join(spec['key'])}) DO UPDATE SET {updates} "
+        f"WHERE excluded.{spec['written']} > {table}.{spec['written']}"
+    )
+
+
+def _index(db, table, row):
+    if table == "search_cache":
+        params = json.loads(row["params_json"]) if row.get("params_json") else {}
+        search_index.index_hotels(db, codec.decode(row["results_json"]), params.get("city"), row["created_at"])
+    elif table == "hotel_cache":
+        search_index.index_hotels(db, [codec.decode(row["data"])], indexed_at=row["created_at"])
+
+
+def import_snapshot(db, src, replace=False, include_expired=False):
+    """Load a snapshot from ``src`` (a binary file) in a single transaction.
+
+    Rows already past their table's max_age are skipped unless
+    ``include_expired``; a local row written later than the snapshot's copy
+    is kept. ``replace`` empties the tables first. Imported hotels are added
+    to the local search index (rebuilt from the caches after a ``replace``).
+    Returns {table: {"imported", "skipped"}}.
+    """
+    now = datetime.utcnow()
+    with gzip.GzipFile(fileobj=src, mode="rb") as gz:
+        header = json.loads(gz.readline() or "{}")
+        if header.get("format") != FORMAT or header.get("version") != VERSION:
+            raise ValueError("not a cache snapshot (or from an incompatible version)")
+        unknown = set(header["tables"]) - set(TABLES)
+        if unknown:
+            raise ValueError(f"unexpected tables in snapshot: {', '.join(sorted(unknown))}")
+        counts = {table: {"imported": 0, "skipped": 0} for table in header["tables"]}
+        # Emptied hotel caches leave index entries behind: re-index once at the end.
+        reindex = replace and bool({"search_cache", "hotel_cache"} & set(counts))
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                for table in header["tables"]:
+                    db.execute(f"DELETE FROM {table}")
+            for line in gz:
+                chunk = json.loads(line)
+                table = chunk["table"]
+                if table not in counts:
+                    raise ValueError(f"unexpected table in snapshot: {table}")
+                spec = CACHE_TABLES[table]
+                # Columns this schema does not have (a newer export) are dropped.
+                local = set(_columns(db, table))
+                columns = [col for col in chunk["columns"] if col in local]
+                if not set(spec["key"]) | {spec["written"]} <= set(columns):
+                    raise ValueError(f"snapshot rows of {table} lack key or timestamp columns")
+                cutoff = None
+                if not include_expired:
+                    max_age = cache_policy.get_policy(table)["max_age"]
+                    cutoff = (now - max_age).strftime("%Y-%m-%d %H:%M:%S")
+
+                rows = []
+                for values in chunk["rows"]:
+                    row = {col: _unpack(value) for col, value in zip(chunk["columns"], values) if col in local}
+                    if cutoff and (row[spec["written"]] or "") <= cutoff:
+                        counts[table]["skipped"] += 1
+                        continue
+                    rows.append(row)
+                sql = _upsert_sql(table, columns)
+                for row in rows:
+                    before = db.total_changes
+                    db.execute(sql, [row[col] for col in columns])
+                    # A local copy written later keeps its row, and its index entry.
+                    if db.total_changes == before:
+                        counts[table]["skipped"] += 1
+                        continue
+                    counts[table]["imported"] += 1
+                    if not reindex:
+                        _index(db, table, row)
+            if reindex:
+                search_index.reindex_hotels(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return counts
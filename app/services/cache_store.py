@@ -0,0 +1,377 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+from datetime import datetime
+
+from .. import database
+from . import cache_maintenance, cache_policy, codec, search_index
+from .normalize import slim_hotel, slim_hotels
+
+try:  # optional: pip install redis
+    import redis
+except ImportError:  # pragma: no cover - depends on the environment
+    redis = None
+
+LRU_SIZE = int(os.getenv("CACHE_LRU_SIZE", "512"))  # decoded entries per process
+LRU_MAX_AGE = float(os.getenv("CACHE_LRU_MAX_AGE", "60"))  # seconds before re-reading shared tiers
+KV_URL = os.getenv("CACHE_KV_URL", "")  # "", "memory" or redis://host:port/db
+
+CacheEntry = namedtuple("CacheEntry", "value created_at")
+
+# Hits and misses per tier, exposed via /api/cache_stats.
+stats = {"lru": Counter(), "kv": Counter(), "sqlite": Counter()}
+
+
+def _now():
+    # Same format and clock (UTC) as SQLite's CURRENT_TIMESTAMP.
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _age(created_at):
+    return (datetime.utcnow() - datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S")).total_seconds()
+
+
+class LRUTier:
+    """Bounded map of decoded entries, least recently used evicted first.
+
+    Each entry is served until ``max_age`` or the end of its TTL, whichever
+    comes first. Entries are shared objects: callers that modify a value
+    copy it first.
+    """
+
+    def __init__(self, max_entries, max_age):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, fresh_for):
+        # Other workers may rewrite the row, so it is re-read now and then.
+        fresh_for = min(fresh_for, self.max_age)
+        if self.max_entries <= 0 or fresh_for <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + fresh_for)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MemoryKV:
+    """In-process stand-in for an external key-value store."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            blob, expires_at = item
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            return blob
+
+    def set(self, key, blob, ttl):
+        with self._lock:
+            self._data[key] = (blob, time.monotonic() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisKV:
+    """Shared tier across worker processes and hosts."""
+
+    def __init__(self, url):
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, blob, ttl):
+        self._client.set(key, blob, ex=max(int(ttl), 1))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+def make_kv(url):
+    if not url:
+        return None
+    if url == "memory":
+        return MemoryKV()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if redis is None:
+            print("CACHE_KV_URL is set but the redis package is not installed; KV tier disabled.")
+            return None
+        return RedisKV(url)
+    print(f"Unknown CACHE_KV_URL '{url}'; KV tier disabled.")
+    return None
+
+
+_lru = LRUTier(LRU_SIZE, LRU_MAX_AGE)
+_kv = make_kv(KV_URL)
+
+
+def set_kv_backend(kv):
+    """Swap the KV tier (None disables it), e.g. for a MemoryKV in tests."""
+    global _kv
+    _kv = kv
+    _lru.clear()
+
+
+def _load_search(db, search_hash):
+    row = db.execute(
+        "SELECT slim_json, params_json, created_at FROM search_cache WHERE search_hash = ?", (search_hash,)
+    ).fetchone()
+    if not row:
+        return None
+    if row["slim_json"]:
+        slim = json.loads(row["slim_json"])
+    else:
+        # Rows written before slim records existed are normalized once.
+        raw = db.execute(
+            "SELECT results_json FROM search_cache WHERE search_hash = ?", (search_hash,)
+        ).fetchone()["results_json"]
+        slim = slim_hotels(codec.decode(raw))
+        db.execute(
+            "UPDATE search_cache SET slim_json = ? WHERE search_hash = ?",
+            (json.dumps(slim, ensure_ascii=False), search_hash),
+        )
+        db.commit()
+    params = json.loads(row["params_json"]) if row["params_json"] else {}
+    return {"slim": slim, "params": params}, row["created_at"]
+
+
+def _store_search(db, search_hash, value, created_at, results):
+    params = value["params"]
+    db.execute(
+        """INSERT OR REPLACE INTO search_cache
+           (search_hash, city, params_json, results_json, slim_json, result_count, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (
+            search_hash,
+            params.get("city"),
+            json.dumps(params),
+            codec.encode(results),
+            json.dumps(value["slim"], ensure_ascii=False),
+            len(results),
+            created_at,
+        ),
+    )
+    search_index.index_hotels(db, results, params.get("city"), created_at)
+
+
+def _load_hotel(db, token):
+    row = db.execute("SELECT data, slim, created_at FROM hotel_cache WHERE token = ?", (token,)).fetchone()
+    if not row:
+        return None
+    data = codec.decode(row["data"])
+    if row["slim"]:
+        slim = json.loads(row["slim"])
+    else:
+        slim = slim_hotel(data)
+        db.execute(
+            "UPDATE hotel_cache SET slim = ? WHERE token = ?", (json.dumps(slim, ensure_ascii=False), token)
+        )
+        db.commit()
+    return {"data": data, "slim": slim}, row["created_at"]
+
+
+def _store_hotel(db, token, value, created_at):
+    db.execute(
+        "INSERT OR REPLACE INTO hotel_cache (token, data, slim, created_at) VALUES (?, ?, ?, ?)",
+        (token, codec.encode(value["data"]), json.dumps(value["slim"], ensure_ascii=False), created_at),
+    )
+    search_index.index_hotels(db, [value["data"]], indexed_at=created_at)
+
+
+def _load_llm(db, cache_key):
+    row = db.execute("SELECT response, created_at FROM llm_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+    return (row["response"], row["created_at"]) if row else None
+
+
+def _store_llm(db, cache_key, value, created_at, task, model):
+    db.execute(
+        "INSERT OR REPLACE INTO llm_cache (cache_key, task, model, response, created_at) VALUES (?, ?, ?, ?, ?)",
+        (cache_key, task, model, value, created_at),
+    )
+
+
+# namespace -> backing table (as in cache_policy / cache_maintenance), key
+# columns and the functions reading and writing one decoded value.
+NAMESPACES = {
+    "search": {
+        "table": "search_cache", "key": ("search_hash",), "load": _load_search, "store": _store_search,
+    },
+    "hotel": {
+        "table": "hotel_cache", "key": ("token",), "load": _load_hotel, "store": _store_hotel,
+    },
+    "llm": {
+        "table": "llm_cache", "key": ("cache_key",), "load": _load_llm, "store": _store_llm,
+    },
+}
+
+
+def _key(namespace, key):
+    key = key if isinstance(key, tuple) else (key,)
+    if len(key) != len(NAMESPACES[namespace]["key"]):
+        raise ValueError(f"{namespace} keys are {NAMESPACES[namespace]['key']}")
+    return key
+
+
+def _kv_key(namespace, key):
+    return "ligmastay:" + ":".join((namespace,) + key)
+
+
+def _remaining(namespace, entry, limit):
+    """Seconds until ``entry`` passes the policy's ``ttl`` or ``max_age``."""
+    policy = cache_policy.get_policy(NAMESPACES[namespace]["table"])
+    return policy[limit].total_seconds() - _age(entry.created_at)
+
+
+def get(namespace, key):
+    """Decoded cache entry as a CacheEntry(value, created_at), or None.
+
+    Looks in the process LRU, then the KV backend, then SQLite, filling the
+    faster tiers on the way back.
+    """
+    spec = NAMESPACES[namespace]
+    key = _key(namespace, key)
+    lru_key = (namespace,) + key
+
+    entry = _lru.get(lru_key)
+    if entry is not None:
+        stats["lru"]["hits"] += 1
+        cache_maintenance.touch(spec["table"], *key)
+        return entry
+    stats["lru"]["misses"] += 1
+
+    kv = _kv
+    if kv is not None:
+        try:
+            blob = kv.get(_kv_key(namespace, key))
+        except Exception as exc:
+            print(f"KV cache error: {exc}")
+            blob = None
+        if blob is not None:
+            entry = CacheEntry(*codec.decode(blob))
+            fresh_for = _remaining(namespace, entry, "ttl")
+            if fresh_for > 0:
+                stats["kv"]["hits"] += 1
+                _lru.set(lru_key, entry, fresh_for)
+                cache_maintenance.touch(spec["table"], *key)
+                return entry
+        stats["kv"]["misses"] += 1
+
+    loaded = spec["load"](database.get_db(), *key)
+    if loaded is None:
+        stats["sqlite"]["misses"] += 1
+        return None
+    stats["sqlite"]["hits"] += 1
+    entry = CacheEntry(*loaded)
+    _fill(namespace, key, entry)
+    cache_maintenance.touch(spec["table"], *key)
+    return entry
+
+
+def _fill(namespace, key, entry):
+    # Only fresh entries are served from the faster tiers; past the TTL they
+    # are re-read from SQLite, since another worker may have refreshed them.
+    _lru.set((namespace,) + key, entry, _remaining(namespace, entry, "ttl"))
+    kv = _kv
+    expires_in = _remaining(namespace, entry, "max_age")
+    if kv is not None and expires_in > 0:
+        try:
+            kv.set(_kv_key(namespace, key), codec.encode([entry.value, entry.created_at]), expires_in)
+        except Exception as exc:
+            print(f"KV cache error: {exc}")
+
+
+def set(namespace, key, value, created_at=None, **extra):
+    """Write ``value`` to SQLite and every faster tier.
+
+    ``extra`` goes to the table writer only (the full search results, which
+    the cached value leaves out; an LLM reply's task and model).
+    """
+    spec = NAMESPACES[namespace]
+    key = _key(namespace, key)
+    entry = CacheEntry(value, created_at or _now())
+    db = database.get_db()
+    spec["store"](db, *key, value, entry.created_at, **extra)
+    db.commit()
+    _fill(namespace, key, entry)
+    return entry
+
+
+def ttl(namespace, key):
+    """Seconds until the entry stops being fresh (negative once stale), or None."""
+    entry = get(namespace, key)
+    if entry is None:
+        return None
+    return _remaining(namespace, entry, "ttl")
+
+
+def forget(namespace, keys):
+    """Drop entries from the LRU and KV tiers only, e.g. rows cache
+    maintenance already deleted from SQLite."""
+    kv = _kv
+    for key in keys:
+        key = _key(namespace, key)
+        _lru.delete((namespace,) + key)
+        if kv is not None:
+            try:
+                kv.delete(_kv_key(namespace, key))
+            except Exception as exc:
+                print(f"KV cache error: {exc}")
+
+
+def invalidate(namespace, key):
+    """Drop the entry from every tier, SQLite included."""
+    spec = NAMESPACES[namespace]
+    key = _key(namespace, key)
+    forget(namespace, [key])
+    db = database.get_db()
+    where = " AND ".join(f"{col} = ?" for col in spec["key"])
+    db.execute(f"DELETE FROM {spec['table']} WHERE {where}", key)
+    db.commit()
+
+
+def tier_stats():
+    report = {}
+    for tier, counter in stats.items():
+        lookups = counter["hits"] + counter["misses"]
+        report[tier] = {
+            "hits": counter["hits"],
+            "misses": counter["misses"],
+            "hit_rate": round(counter["hits"] / lookups, 3) if lookups else None,
+        }
+    report["kv"]["backend"] = type(_kv).__name__ if _kv is not None else None
+    return report
@@ -0,0 +1,77 @@
+import json
+import os
+import zlib
+
+try:  # optional: pip install zstandard
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+# First byte of every encoded blob. Rows written before the codec layer are
+# plain JSON text (a str in Python) and are still decoded transparently.
+JSON_V1 = 0x00
+ZLIB_V1 = 0x01
+ZSTD_V1 = 0x02
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 6
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _encode_json(obj):
+    return bytes([JSON_V1]) + _dumps(obj)
+
+
+def _encode_zlib(obj):
+    return bytes([ZLIB_V1]) + zlib.compress(_dumps(obj), ZLIB_LEVEL)
+
+
+def _encode_zstd(obj):
+    return bytes([ZSTD_V1]) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(_dumps(obj))
+
+
+ENCODERS = {"json": _encode_json, "zlib": _encode_zlib}
+if zstandard is not None:
+    ENCODERS["zstd"] = _encode_zstd
+
+
+def default_codec():
+    name = os.getenv("CACHE_CODEC", "zlib").lower()
+    if name not in ENCODERS:
+        print(f"Unknown or unavailable CACHE_CODEC '{name}', using zlib.")
+        return "zlib"
+    return name
+
+
+def encode(obj, codec=None):
+    """Encode a cache payload as a version-tagged BLOB."""
+    return ENCODERS[codec or default_codec()](obj)
+
+
+def decode(value):
+    """Decode a cache column written by ``encode`` or as legacy JSON text."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+
+    value = bytes(value)
+    version, body = value[0], value[1:]
+    if version == ZLIB_V1:
+        return json.loads(zlib.decompress(body))
+    if version == ZSTD_V1:
+        if zstandard is None:
+            raise RuntimeError("zstd-encoded cache row but zstandard is not installed")
+        return json.loads(zstandard.ZstdDecompressor().decompress(body))
+    if version == JSON_V1:
+        return json.loads(body)
+    raise ValueError(f"Unknown cache codec version: {version}")
+
+
+def codec_of(value):
+    if isinstance(value, str):
+        return "legacy"
+    return {JSON_V1: "json", ZLIB_V1: "zlib", ZSTD_V1: "zstd"}.get(bytes(value)[0], "unknown")
@@ -0,0 +1,138 @@
+import json
+
+from .. import database
+from . import cache_maintenance, cache_policy, cache_store, codec, result_filter
+from .location import canonicalize
+from .normalize import slim_hotel, slim_hotels
+from .search_service import get_search_api
+from .singleflight import coalesce
+
+
+def fresh_search_exists(db, search_hash):
+    row = db.execute(
+        "SELECT 1 FROM search_cache WHERE search_hash = ? AND created_at > datetime('now', ?)",
+        (search_hash, cache_policy.fresh_modifier("search_cache")),
+    ).fetchone()
+    return True if row else None
+
+
+def load_fresh_hotel(db, property_token):
+    row = db.execute(
+        "SELECT data FROM hotel_cache WHERE token = ? AND created_at > datetime('now', ?)",
+        (property_token, cache_policy.fresh_modifier("hotel_cache")),
+    ).fetchone()
+    return codec.decode(row["data"]) if row else None
+
+
+def refresh_search(search_hash, city, price, rating, amenities):
+    db = database.get_db()
+    city = canonicalize(city)
+
+    def fetch_results():
+        local = result_filter.find_in_superset(
+            db, city, price, rating, amenities,
+            exclude_hash=search_hash,
+            fresh_modifier=cache_policy.fresh_modifier("search_cache"),
+        )
+        params = {"city": city, "price": price, "rating": rating, "amenities": amenities}
+        if local:
+            # Narrower query answered from a broader cached result: keep the
+            # source row's timestamp so the derived row expires with it.
+            results, slim, source = local
+            params["derived_from"] = source["search_hash"]
+            created_at = source["created_at"]
+            print(f"Answered {search_hash} from cached superset {source['search_hash']}")
+        else:
+            results = get_search_api().search_hotels(city, price, rating, amenities)
+            slim = slim_hotels(results)
+            created_at = None
+
+        if results:
+            cache_store.set(
+                "search", search_hash, {"slim": slim, "params": params},
+                created_at=created_at, results=results,
+            )
+        return results
+
+    return coalesce(
+        f"search:{search_hash}",
+        fetch_results,
+        reload=lambda: fresh_search_exists(db, search_hash),
+    )
+
+
+def refresh_hotel(property_token):
+    db = database.get_db()
+
+    def fetch_details():
+        data = get_search_api().get_hotel_details(property_token)
+        if data:
+            data["property_token"] = property_token
+            cache_store.set("hotel", property_token, {"data": data, "slim": slim_hotel(data)})
+        return data
+
+    return coalesce(
+        f"hotel:{property_token}",
+        fetch_details,
+        reload=lambda: load_fresh_hotel(db, property_token),
+    )
+
+
+def ensure_search(search_hash, city, price, rating, amenities):
+    """Make sure search_cache has a servable row for this search.
+
+    Returns the cache status: fresh, stale (background refresh queued) or
+    refreshed (fetched before returning).
+    """
+    cached = cache_store.get("search", search_hash)
+    status = cache_policy.classify("search_cache", cached.created_at if cached else None)
+
+    if status == cache_policy.STALE:
+        cache_policy.schedule_refresh(
+            f"search:{search_hash}",
+            lambda: refresh_search(search_hash, city, price, rating, amenities),
+        )
+    elif status != cache_policy.FRESH:
+        refresh_search(search_hash, city, price, rating, amenities)
+        status = cache_policy.REFRESHED
+    return status
+
+
+def load_search_results(search_hash):
+    entry = cache_store.get("search", search_hash)
+    return entry.value["slim"] if entry else []
+
+
+def load_hotel_slim(property_token):
+    entry = cache_store.get("hotel", property_token)
+    return entry.value["slim"] if entry else None
+
+
+# Generated columns of hotel_cache over its slim record (migrations/0005).
+HOTEL_FIELDS = (
+    "name", "price", "price_text", "rating", "hotel_class", "amenity_text",
+    "image", "address", "latitude", "longitude", "nearby",
+)
+PREVIEW_FIELDS = ("name", "image", "price_text", "address")
+
+
+def load_hotel_fields(property_token, fields=PREVIEW_FIELDS):
+    """A few fields of a cached hotel, without decoding its payload.
+
+    Returns a dict of ``fields`` (``nearby`` as a list), or None when the hotel
+    is not cached or was cached before slim records existed.
+    """
+    unknown = set(fields) - set(HOTEL_FIELDS)
+    if unknown:
+        raise ValueError(f"not a hotel_cache field: {', '.join(sorted(unknown))}")
+    row = database.get_db().execute(
+        f"SELECT slim IS NOT NULL AS has_slim, {', '.join(fields)} FROM hotel_cache WHERE token = ?",
+        (property_token,),
+    ).fetchone()
+    if not row or not row["has_slim"]:
+        return None
+    cache_maintenance.touch("hotel_cache", property_token)
+    values = {field: row[field] for field in fields}
+    if values.get("nearby") is not None:
+        values["nearby"] = json.loads(values["nearby"])
+    return values
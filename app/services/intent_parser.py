@@ -0,0 +1,255 @@
+import os
+import re
+import unicodedata
+from collections import Counter, namedtuple
+
+from .location import CITY_ALIASES, find_cities_in_text, fold
+from .search_service import PRICE_MAPPING
+
+# Share of a message's words the lexicon must account for before chat_search
+# answers it without Gemini; above 1 turns the fast path off.
+MIN_CONFIDENCE = float(os.getenv("CHAT_INTENT_MIN_CONFIDENCE", "0.75"))
+
+# Messages answered locally / handed to Gemini, exposed via /api/cache_stats.
+stats = Counter()
+
+Intent = namedtuple("Intent", "city price_range rating amenities confidence reason")
+
+# Search form amenity names (search_service.AMENITIES_MAPPING) -> what users type.
+AMENITY_PHRASES = {
+    "Pool": ["hồ bơi", "bể bơi", "hồ bơi vô cực", "pool", "swimming pool", "infinity pool"],
+    "Indoor pool": ["hồ bơi trong nhà", "bể bơi trong nhà", "indoor pool"],
+    "Outdoor pool": ["hồ bơi ngoài trời", "bể bơi ngoài trời", "outdoor pool"],
+    "Fitness center": ["gym", "phòng gym", "phòng tập", "phòng tập gym", "fitness", "fitness center", "fitness centre"],
+    "Spa": ["spa", "massage", "xông hơi"],
+    "Free Wi-Fi": ["wifi", "wi fi", "wifi miễn phí", "wi fi miễn phí", "free wifi", "free wi fi"],
+    "Free breakfast": ["ăn sáng", "bữa sáng", "buffet sáng", "kèm bữa sáng", "bữa sáng miễn phí", "ăn sáng miễn phí",
+                       "breakfast", "free breakfast"],
+    "Restaurant": ["nhà hàng", "restaurant"],
+    "Bar": ["bar", "quầy bar"],
+    "Parking": ["bãi đỗ xe", "chỗ đỗ xe", "đỗ xe", "chỗ đậu xe", "bãi đậu xe", "đậu xe", "parking"],
+    "Free parking": ["đỗ xe miễn phí", "đậu xe miễn phí", "gửi xe miễn phí", "bãi đỗ xe miễn phí", "chỗ đỗ xe miễn phí",
+                     "bãi đậu xe miễn phí", "chỗ đậu xe miễn phí", "free parking"],
+    "Beach access": ["gần biển", "sát biển", "bãi biển riêng", "ra biển", "beach", "beachfront"],
+    "Child-friendly": ["trẻ em", "trẻ nhỏ", "con nhỏ", "em bé", "kid friendly", "child friendly", "kids"],
+    "Pet-friendly": ["thú cưng", "pet", "pet friendly", "pets"],
+    "Room service": ["dịch vụ phòng", "room service"],
+    "Air-conditioned": ["điều hòa", "máy lạnh", "air conditioning", "air conditioned"],
+}
+
+# Phrases that stand for a rating / price bucket on their own.
+RATING_PHRASES = {"4-5": ["sang trọng", "cao cấp", "luxury"]}
+PRICE_PHRASES = {"0-500000": ["giá rẻ", "bình dân", "cheap", "budget"]}
+
+# Words that ask for a place to stay: a message needs one of these (or a
+# filter) to read as a search.
+SEARCH_WORDS = [
+    "khách sạn", "ks", "hotel", "hotels", "resort", "homestay", "nhà nghỉ", "villa", "căn hộ",
+    "phòng", "chỗ ở", "nơi ở", "lưu trú", "tìm", "kiếm", "tìm kiếm", "đặt", "đặt phòng",
+    "book", "booking", "find", "search", "show", "stay",
+]
+
+# Words that carry no search parameter.
+FILLER_WORDS = [
+    "ở", "tại", "có", "với", "và", "cho", "mình", "tôi", "tớ", "em", "anh", "chị", "bạn", "ơi",
+    "nhé", "nha", "ạ", "đi", "giúp", "giùm", "cần", "muốn", "nào", "một", "vài", "mấy", "các",
+    "những", "giá", "tầm giá", "mức giá", "khu", "khu vực", "thành phố", "tp", "loại", "kèm",
+    "luôn", "thì", "là", "được", "đang", "hãy", "xem", "list", "danh sách",
+    "in", "at", "with", "a", "an", "the", "for", "me", "i", "want", "need", "please", "some", "and",
+]
+
+# Words a deterministic parse cannot act on: negations, comparisons, advice
+# and references to earlier messages or the page.
+DEFER_WORDS = [
+    "không", "ko", "chẳng", "chả", "đừng", "trừ", "ngoại trừ", "hơn", "nhất", "so sánh", "nên",
+    "gợi ý", "tư vấn", "thế nào", "như thế nào", "bao nhiêu", "tại sao", "vì sao", "gì", "cái nào",
+    "cái này", "cái đó", "ở trên", "vừa rồi", "lúc nãy", "khoảng", "tầm", "hoặc", "hay", "đi đâu",
+    "chơi", "thời tiết", "lịch trình",
+    "no", "not", "without", "except", "or", "which", "why", "how", "what", "best", "cheapest",
+    "compare", "recommend", "suggest", "around", "about",
+]
+
+# Yes/no question ending ("... có hồ bơi không?"), not a negation.
+QUESTION_TAIL = re.compile(r"\b(?:khong|ko|hong|k)(?:\s+(?:a|vay|nhi|nhe|ha|ban))*$")
+
+_UNIT = r"(?P<{0}u>k|nghin|ngan|tr|trieu|m|million|cu|d|dong|vnd)?"
+_AMOUNT = r"(?P<{0}>\d+(?:[.,]\d+)*)\s*" + _UNIT + r"(?P<{0}r>\d)?\b"
+_FIRST, _SECOND = _AMOUNT.format("a"), _AMOUNT.format("b")
+PRICE_PATTERNS = [
+    ("range", re.compile(rf"\b(?:tu|from|between)?\s*{_FIRST}\s*(?:-|den|toi|to|and)\s*{_SECOND}")),
+    ("max", re.compile(rf"(?:\b(?:duoi|toi da|khong qua|under|below|less than|max|up to)|<)\s*{_FIRST}")),
+    ("max", re.compile(rf"\b{_FIRST}\s*(?:do lai|tro xuong|or less)")),
+    ("min", re.compile(rf"(?:\b(?:tren|tu|over|above|from|min)|>)\s*{_FIRST}(?:\s*(?:tro len|or more|\+))?")),
+    ("min", re.compile(rf"\b{_FIRST}\s*(?:tro len|or more|\+)")),
+]
+RATING_PATTERN = re.compile(
+    r"(?:\b(?:tu|from)\s+)?(?<![\d-])\b(?P<stars>[1-5])(?:\s*-\s*5)?\s*(?:sao|\*|stars|star)"
+    r"(?:\s*(?:tro len|\+|or more|up))?"
+)
+STAR_RATINGS = {2: "2-3", 3: "3-5", 4: "4-5", 5: "4-5"}
+_UNIT_VALUES = {"k": 1_000, "nghin": 1_000, "ngan": 1_000, "tr": 1_000_000, "trieu": 1_000_000,
+                "m": 1_000_000, "million": 1_000_000, "cu": 1_000_000, "d": 1, "dong": 1, "vnd": 1}
+
+
+def _plain(text):
+    """Lowercase without diacritics, keeping the punctuation of numbers (1.5tr, 500k-1tr, 4*)."""
+    text = str(text or "").replace("Đ", "D").replace("đ", "d")
+    text = "".join(ch for ch in unicodedata.normalize("NFD", text) if unicodedata.category(ch) != "Mn")
+    text = re.sub(r"[^a-z0-9.,*+<>-]+", " ", text.lower())
+    return re.sub(r"(?<!\d)[.,]|[.,](?!\d)", " ", text)
+
+
+def _words(plain):
+    return re.sub(r"[^a-z0-9]+", " ", plain).strip()
+
+
+def _lexicon():
+    phrases = {}
+    for name, words in AMENITY_PHRASES.items():
+        phrases.update((fold(w), ("amenity", name)) for w in words)
+    for value, words in RATING_PHRASES.items():
+        phrases.update((fold(w), ("rating", value)) for w in words)
+    for value, words in PRICE_PHRASES.items():
+        phrases.update((fold(w), ("price", value)) for w in words)
+    phrases.update((fold(w), ("search", None)) for w in SEARCH_WORDS)
+    phrases.update((fold(w), ("filler", None)) for w in FILLER_WORDS)
+    phrases.update((fold(w), ("defer", w)) for w in DEFER_WORDS)
+    # Longest first, so "hồ bơi ngoài trời" wins over "hồ bơi".
+    body = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+    return phrases, re.compile(rf"\b(?:{body})\b")
+
+
+_PHRASES, _PHRASE_PATTERN = _lexicon()
+
+
+def _city_patterns():
+    """Canonical city -> pattern for every spelling of it, to blank it out of a message."""
+    patterns = {}
+    for city, aliases in CITY_ALIASES.items():
+        spellings = {fold(a) for a in [city] + aliases}
+        spellings |= {a.replace(" ", "") for a in spellings}
+        body = "|".join(re.escape(a) for a in sorted(spellings, key=len, reverse=True))
+        patterns[city] = re.compile(rf"\b(?:{body})\b")
+    return patterns
+
+
+_CITY_PATTERNS = _city_patterns()
+
+
+def _amount(match, group, unit=None):
+    """VND amount of one number of a price phrase; None for a bare small number."""
+    digits, rest = match.group(group), match.group(group + "r")
+    if re.fullmatch(r"\d+[.,]\d{1,2}", digits):  # "1.5tr"; "500.000" is a plain number
+        value = float(digits.replace(",", "."))
+    else:
+        value = int(re.sub(r"\D", "", digits))
+    if rest:  # "1tr5" = 1.5 triệu
+        value += int(rest) / 10
+    unit = _UNIT_VALUES.get(match.group(group + "u")) or unit
+    if unit:
+        return int(value * unit)
+    return int(value) if value >= 10_000 else None
+
+
+def _price(text):
+    """(price bucket or None, text without the phrase, reason the price can't be used)."""
+    for kind, pattern in PRICE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        rest = text[:match.start()] + " " + text[match.end():]
+        if kind == "range":
+            high = _amount(match, "b")
+            # "1-2 triệu": the first number takes the second's unit.
+            low = _amount(match, "a", unit=_UNIT_VALUES.get(match.group("bu")))
+            if low is not None and high is not None and low > high:  # "500-1tr"
+                low = _amount(match, "a", unit=1_000)
+            key = f"{low}-{high}" if low is not None and high is not None else None
+        else:
+            amount = _amount(match, "a")
+            key = None if amount is None else (f"0-{amount}" if kind == "max" else f"{amount}+")
+        if key in PRICE_MAPPING:
+            return key, rest, None
+        return None, rest, "price"
+    return None, text, None
+
+
+def parse(text):
+    """Read city, price bucket, star rating and amenities from a chat message.
+
+    ``confidence`` is the share of the message's words the lexicon accounts
+    for; it is 0 (with the ``reason``) when the message names no single known
+    city, asks for nothing to stay in, or has words a rule-based parse cannot
+    act on (negations, comparisons, approximate prices...).
+    """
+    plain = _plain(text)
+    # fold() of the message, without stripping its diacritics again.
+    folded = _words(plain)
+    cities = find_cities_in_text(folded)
+    words = len(folded.split()) or 1
+
+    # Stars first, so "từ 4 sao" is not read as a price.
+    ratings = {STAR_RATINGS.get(int(m.group("stars"))) for m in RATING_PATTERN.finditer(plain)}
+    plain = RATING_PATTERN.sub(" ", plain)
+    price_range, plain, bad_price = _price(plain)
+    rest = QUESTION_TAIL.sub(" ", _words(plain))
+
+    # City names are matched on their own, then blanked out of the words.
+    for city in cities:
+        rest = _CITY_PATTERNS[city].sub(" ", rest)
+
+    amenities, deferred, searching = [], [], bool(price_range or ratings)
+    for match in _PHRASE_PATTERN.finditer(rest):
+        kind, value = _PHRASES[match.group()]
+        if kind == "amenity" and value not in amenities:
+            amenities.append(value)
+        elif kind == "rating":
+            ratings.add(value)
+        elif kind == "price" and not price_range:
+            price_range = value
+        elif kind == "defer":
+            deferred.append(value)
+        searching = searching or kind in ("amenity", "rating", "price", "search")
+    leftover = _PHRASE_PATTERN.sub(" ", rest).split()
+
+    if len(cities) != 1:
+        reason = "no city" if not cities else "several cities"
+    elif bad_price:
+        reason = "price outside the search buckets"
+    elif None in ratings or len(ratings) > 1:
+        reason = "rating"
+    elif deferred:
+        reason = f"needs the model: {deferred[0]}"
+    elif any(ch.isdigit() for w in leftover for ch in w):
+        reason = "unread number"
+    elif not searching:
+        reason = "not a search"
+    else:
+        reason = None
+    confidence = 0.0 if reason else round(1 - len(leftover) / words, 3)
+    return Intent(
+        city=next(iter(cities)) if len(cities) == 1 else None,
+        price_range=price_range,
+        rating=next(iter(ratings)) if len(ratings) == 1 else None,
+        amenities=amenities,
+        confidence=confidence,
+        reason=reason or (f"unknown words: {' '.join(leftover)}" if leftover else None),
+    )
+
+
+def match(text):
+    """The search chat_search's model would ask for, when ``text`` is clear
+    enough to skip it: a dict shaped like the model's JSON reply, else None."""
+    intent = parse(text)
+    if not intent.confidence or intent.confidence < MIN_CONFIDENCE:
+        stats["model"] += 1
+        return None
+    stats["local"] += 1
+    return {
+        "type": "search",
+        "city": intent.city,
+        "price_range": intent.price_range,
+        "rating": intent.rating,
+        "amenities": intent.amenities or None,
+        "reply_text": f"OK, mình tìm thấy vài nơi ở {intent.city} theo ý bạn...",
+    }
@@ -0,0 +1,100 @@
+import re
+from functools import lru_cache
+
+MATCH_CACHE_SIZE = 4096
+
+
+def _trie_pattern(keywords):
+    """Regex source for ``keywords`` factored into a prefix trie.
+
+    At any position the regex engine follows a single branch per character and
+    the greedy optional groups yield the longest keyword starting there, so one
+    compiled pattern scans the text once for the whole dictionary.
+    """
+    trie = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return "(?:" + build(trie) + ")"
+
+
+class KeywordMatcher:
+    """Keyword dictionary compiled once, matched as substrings or whole words.
+
+    ``find_all`` returns every keyword occurring in the text, overlapping and
+    nested ones included; results are cached per text, since the same amenity
+    strings and addresses are matched again on every page view.
+    """
+
+    def __init__(self, keywords, whole_words=False):
+        self.whole_words = whole_words
+        # Longest first: a hit implies every keyword nested in it, which is
+        # then not searched for separately.
+        self.keywords = tuple(sorted(dict.fromkeys(k for k in keywords if k), key=len, reverse=True))
+        body = _trie_pattern(self.keywords) if self.keywords else "(?!)"
+        self._pattern = re.compile(rf"\b{body}\b" if whole_words else body)
+        self._implied = {
+            kw: frozenset(k for k in self.keywords if self._occurs(k, kw)) for kw in self.keywords
+        }
+        self.find_all = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._find_all)
+        self.first = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._first)
+        self.spans = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._spans)
+
+    def _occurs(self, kw, text):
+        if self.whole_words:
+            return re.search(rf"\b{re.escape(kw)}\b", text) is not None
+        return kw in text
+
+    def _find_all(self, text):
+        """Frozenset of keywords that occur in ``text``."""
+        found = set()
+        if not text:
+            return frozenset()
+
+        if not self.whole_words:
+            # str.__contains__ runs in C and beat a one-pass regex scan for
+            # dictionaries of this size, so substring mode tests each keyword.
+            for kw in self.keywords:
+                if kw not in found and kw in text:
+                    found |= self._implied[kw]
+            return frozenset(found)
+
+        # Resume right after each match's start rather than its end, so a
+        # keyword beginning inside the previous match is still found.
+        pos = 0
+        search = self._pattern.search
+        while True:
+            match = search(text, pos)
+            if match is None:
+                return frozenset(found)
+            found |= self._implied[match.group()]
+            pos = match.start() + 1
+
+    def _spans(self, text):
+        """(start, keyword) for every position a keyword starts at, left to
+        right, with the longest keyword starting there."""
+        spans = []
+        pos = 0
+        search = self._pattern.search
+        while text:
+            match = search(text, pos)
+            if match is None:
+                break
+            spans.append((match.start(), match.group()))
+            pos = match.start() + 1
+        return tuple(spans)
+
+    def _first(self, text):
+        """Leftmost keyword in ``text`` (the longest one when several start there)."""
+        match = self._pattern.search(text or "")
+        return match.group() if match else None
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+import httpx
+from google import genai
+from google.genai import types
+
+from . import prompt_context
+
+# Default model per task; LLM_MODEL_<TASK> overrides one (e.g. LLM_MODEL_CHAT_SEARCH).
+DEFAULT_MODELS = {
+    "review_summary": "gemini-2.5-flash-lite",
+    "hotel_chat": "gemini-2.5-flash-lite",
+    "compare": "gemini-2.5-flash-lite",
+    "chat_search": "gemini-2.5-flash",
+    "itinerary": "gemini-2.5-flash",
+    "mood_search": "gemini-2.5-flash",
+}
+MODELS = {task: os.getenv(f"LLM_MODEL_{task.upper()}", model) for task, model in DEFAULT_MODELS.items()}
+
+# Seconds a call may wait for its reply (for streamed replies: for each
+# chunk); LLM_TIMEOUT_<TASK> overrides one.
+TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+TIMEOUTS = {task: float(os.getenv(f"LLM_TIMEOUT_{task.upper()}", TIMEOUT)) for task in DEFAULT_MODELS}
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+POOL_MAXSIZE = int(os.getenv("LLM_POOL_MAXSIZE", "10"))
+
+# Per-task call counters for this process, exposed via /api/cache_stats.
+stats = defaultdict(Counter)
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def _build_client():
+    # One keep-alive pool for every call of the process; the SDK would
+    # otherwise open a new one per Client.
+    http = httpx.Client(
+        limits=httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE),
+        timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=types.HttpOptions(httpx_client=http))
+
+
+def get_client():
+    """Return the process-wide Gemini client (rebuilt after a fork)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = _build_client()
+                _client_pid = pid
+    return _client
+
+
+def _config(timeout, config):
+    return types.GenerateContentConfig(**config, http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+
+
+def _estimate(contents):
+    """Estimated tokens of the text parts of ``contents`` (images are not counted)."""
+    if isinstance(contents, str):
+        return prompt_context.estimate_tokens(contents)
+    return sum(prompt_context.estimate_tokens(part) for part in contents if isinstance(part, str))
+
+
+def _record(task, model, started, contents, response=None, error=None, first_chunk_ms=None):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    estimated = _estimate(contents)
+    counter = stats[task]
+    counter["calls"] += 1
+    counter["latency_ms"] += round(elapsed_ms)
+    counter["estimated_prompt_tokens"] += estimated
+    if first_chunk_ms is not None:
+        counter["streams"] += 1
+        counter["first_chunk_ms"] += round(first_chunk_ms)
+    if error is not None:
+        counter["timeouts" if isinstance(error, TimeoutError) else "errors"] += 1
+        print(f"LLM {task} ({model}) failed after {elapsed_ms:.0f}ms: {error}")
+        return
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = (usage.prompt_token_count or 0) if usage else 0
+    output_tokens = (usage.candidates_token_count or 0) if usage else 0
+    counter["prompt_tokens"] += prompt_tokens
+    counter["output_tokens"] += output_tokens
+    print(f"LLM {task} ({model}): {elapsed_ms:.0f}ms, {prompt_tokens} (~{estimated} estimated) + {output_tokens} tokens")
+
+
+def generate(task, contents, **config):
+    """Run ``task``'s model on ``contents`` and return the reply text ("" if none).
+
+    ``config`` goes to GenerateContentConfig. Raises TimeoutError when no
+    reply came within the task's deadline; other SDK errors propagate.
+    """
+    model = MODELS[task]
+    timeout = TIMEOUTS[task]
+    started = time.perf_counter()
+    try:
+        response = get_client().models.generate_content(
+            model=model, contents=contents, config=_config(timeout, config)
+        )
+    except httpx.TimeoutException as exc:
+        error = TimeoutError(f"{task}: no reply from {model} within {timeout:g}s")
+        _record(task, model, started, contents, error=error)
+        raise error from exc
+    except Exception as exc:
+        _record(task, model, started, contents, error=exc)
+        raise
+    _record(task, model, started, contents, response)
+    return response.text or ""
+
+
+def generate_stream(task, contents, **config):
+    """Like generate, but yields the reply text chunk by chunk as Gemini writes it."""
+    model = MODELS[task]
+    timeout = TIMEOUTS[task]
+    started = time.perf_counter()
+    first_chunk_ms = None
+    response = None
+    try:
+        for response in get_client().models.generate_content_stream(
+            model=model, contents=contents, config=_config(timeout, config)
+        ):
+            if first_chunk_ms is None:
+                first_chunk_ms = (time.perf_counter() - started) * 1000
+            if response.text:
+                yield response.text
+    except httpx.TimeoutException as exc:
+        error = TimeoutError(f"{task}: no reply from {model} within {timeout:g}s")
+        _record(task, model, started, contents, error=error, first_chunk_ms=first_chunk_ms)
+        raise error from exc
+    except Exception as exc:
+        _record(task, model, started, contents, error=exc, first_chunk_ms=first_chunk_ms)
+        raise
+    # The last chunk carries the usage of the whole reply.
+    _record(task, model, started, contents, response, first_chunk_ms=first_chunk_ms or 0)
+
+
+def summary():
+    """Per-task calls, failures, average latency (and time to the first
+    chunk of streamed replies), token totals and average prompt size, as
+    counted by Gemini and as estimated locally."""
+    result = {}
+    for task, counter in stats.items():
+        calls = counter["calls"]
+        streams = counter["streams"]
+        result[task] = {
+            "model": MODELS[task],
+            "calls": calls,
+            "errors": counter["errors"],
+            "timeouts": counter["timeouts"],
+            "avg_latency_ms": round(counter["latency_ms"] / calls) if calls else None,
+            "avg_first_chunk_ms": round(counter["first_chunk_ms"] / streams) if streams else None,
+            "prompt_tokens": counter["prompt_tokens"],
+            "output_tokens": counter["output_tokens"],
+            "avg_prompt_tokens": round(counter["prompt_tokens"] / calls) if calls else None,
+            "avg_estimated_prompt_tokens": round(counter["estimated_prompt_tokens"] / calls) if calls else None,
+        }
+    return result
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from .. import database
+from . import cache_policy, cache_store, llm
+
+# Lookups per task (hits, misses, bypassed), exposed via /api/cache_stats.
+stats = defaultdict(Counter)
+
+# Per-feature tables replies were cached in before llm_cache (migration 0006).
+# They are no longer written: a row is read once, while younger than its
+# task's TTL, and copied into llm_cache; cache-maintain purges the rest.
+LEGACY = {
+    # Not once a review at least as new as the summary exists.
+    "review_summary": (
+        "SELECT summary_content, updated_at FROM review_summaries s"
+        " WHERE property_token = ? AND summary_content IS NOT NULL AND NOT EXISTS ("
+        "SELECT 1 FROM user_reviews r WHERE r.property_token = s.property_token AND r.created_at >= s.updated_at)"
+    ),
+    "itinerary": "SELECT itinerary_json, created_at FROM hotel_itineraries WHERE property_token = ? AND vibe = ?",
+}
+
+
+def normalize(value):
+    """Prompt inputs as key material: text NFC, casefolded, whitespace collapsed
+    and without surrounding punctuation ("Có hồ bơi không?" == "có hồ bơi không")."""
+    if isinstance(value, str):
+        return " ".join(unicodedata.normalize("NFC", value).casefold().split()).strip(" ?!.")
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+def make_key(task, inputs):
+    material = json.dumps([task, llm.MODELS[task], normalize(inputs)], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _age(created_at):
+    return datetime.utcnow() - datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S")
+
+
+def _legacy(task, cache_key, legacy, ttl):
+    """The reply cached under ``legacy`` in the task's pre-0006 table, moved
+    to llm_cache with its original write time, or None."""
+    row = database.get_db().execute(LEGACY[task], legacy).fetchone()
+    if not row or _age(row[1]) >= ttl:
+        return None
+    cache_store.set("llm", cache_key, row[0], created_at=row[1], task=task, model=llm.MODELS[task])
+    return row[0]
+
+
+def _lookup(task, contents, key, personalized, refresh, legacy=None):
+    """(cache key or None when the reply is not cached, cached text or None)."""
+    ttl = cache_policy.get_policy("llm_cache")["tasks"].get(task)
+    if personalized or not ttl:
+        stats[task]["bypassed"] += 1
+        return None, None
+    cache_key = make_key(task, contents if key is None else key)
+    if not refresh:
+        cached = cache_store.get("llm", cache_key)
+        if cached and _age(cached.created_at) < ttl:
+            stats[task]["hits"] += 1
+            return cache_key, cached.value
+        text = _legacy(task, cache_key, legacy, ttl) if legacy is not None else None
+        if text is not None:
+            stats[task]["hits"] += 1
+            return cache_key, text
+    stats[task]["misses"] += 1
+    return cache_key, None
+
+
+def _store(task, cache_key, text):
+    if cache_key and text:
+        cache_store.set("llm", cache_key, text, task=task, model=llm.MODELS[task])
+
+
+def generate(task, contents, key=None, personalized=False, refresh=False, parse=None, legacy=None):
+    """llm.generate behind the reply cache; returns the text, or ``parse(text)``.
+
+    Replies are keyed by the task, its model and ``key`` (the prompt's inputs,
+    ``contents`` by default), normalized, and served while younger than the
+    task's TTL. ``personalized`` prompts neither read nor fill the cache;
+    ``refresh`` only skips the read. Empty replies and replies ``parse``
+    rejects are not cached. ``legacy`` is the reply's key in the task's
+    LEGACY table, read on a miss.
+    """
+    cache_key, text = _lookup(task, contents, key, personalized, refresh, legacy)
+    if text is not None:
+        return parse(text) if parse else text
+    text = llm.generate(task, contents)
+    value = parse(text) if parse else text
+    _store(task, cache_key, text)
+    return value
+
+
+def generate_stream(task, contents, key=None, personalized=False):
+    """generate() for llm.generate_stream: yields the reply text in chunks.
+
+    A cached reply comes as one chunk; a new one is cached once complete.
+    """
+    cache_key, text = _lookup(task, contents, key, personalized, refresh=False)
+    if text is not None:
+        yield text
+        return
+    chunks = []
+    for chunk in llm.generate_stream(task, contents):
+        chunks.append(chunk)
+        yield chunk
+    _store(task, cache_key, "".join(chunks))
+
+
+def summary():
+    """Per-task hits, misses, bypassed lookups and hit rate."""
+    result = {}
+    for task, counter in stats.items():
+        lookups = counter["hits"] + counter["misses"]
+        result[task] = {
+            "hits": counter["hits"],
+            "misses": counter["misses"],
+            "bypassed": counter["bypassed"],
+            "hit_rate": round(counter["hits"] / lookups, 3) if lookups else None,
+        }
+    return result
@@ -0,0 +1,132 @@
+import difflib
+import re
+import unicodedata
+
+from .keyword_matcher import KeywordMatcher
+
+# Canonical destination name -> extra spellings seen in forms, chat and addresses.
+# The folded canonical name itself is always an alias.
+CITY_ALIASES = {
+    "Hà Nội": ["hanoi", "hn", "ha noi city", "thu do ha noi"],
+    "TP. Hồ Chí Minh": [
+        "ho chi minh",
+        "ho chi minh city",
+        "thanh pho ho chi minh",
+        "tp hcm",
+        "tphcm",
+        "hcm",
+        "hcmc",
+        "sai gon",
+        "saigon",
+        "sg",
+    ],
+    "Đà Nẵng": ["danang", "da nang city"],
+    "Đà Lạt": ["dalat", "da lat city"],
+    "Nha Trang": ["nhatrang"],
+    "Huế": ["hue city", "thua thien hue"],
+    "Sa Pa": ["sapa"],
+    "Phú Quốc": ["phuquoc", "phu quoc island", "dao phu quoc"],
+    "Vũng Tàu": ["vungtau"],
+    "Hội An": ["hoian"],
+    "Cần Thơ": ["cantho"],
+    "Quy Nhơn": ["quynhon", "qui nhon"],
+    "Hà Giang": ["hagiang"],
+    "Hạ Long": ["halong", "ha long bay", "vinh ha long"],
+    "Phan Thiết": ["phanthiet", "mui ne"],
+}
+
+FUZZY_CUTOFF = 0.85
+
+# Aliases that are also common street and ward names ("Nguyễn Huệ", "Phố Huế"):
+# in free text with tone marks they only count when spelled with their own.
+MARKED_ALIASES = {"hue": "huế"}
+
+
+def fold(text):
+    """Lowercase, strip Vietnamese diacritics and punctuation, collapse spaces."""
+    text = str(text or "").replace("Đ", "D").replace("đ", "d")
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    return text.strip()
+
+
+def _compact(text):
+    return text.replace(" ", "")
+
+
+def _build_alias_index():
+    index = {}
+    for canonical, aliases in CITY_ALIASES.items():
+        for alias in [canonical] + aliases:
+            index[fold(alias)] = canonical
+            index[_compact(fold(alias))] = canonical
+    return index
+
+
+_ALIAS_INDEX = _build_alias_index()
+_CITY_MATCHER = KeywordMatcher([a for a in _ALIAS_INDEX if len(a) > 2], whole_words=True)
+
+
+def canonicalize(city):
+    """Map any spelling of a destination to its canonical name.
+
+    Unknown places are returned trimmed, so callers can still search for them.
+    """
+    raw = str(city or "").strip()
+    if not raw:
+        return ""
+    key = fold(raw)
+    if key.startswith("tp "):
+        key = key[3:]
+    for candidate in (key, _compact(key)):
+        if candidate in _ALIAS_INDEX:
+            return _ALIAS_INDEX[candidate]
+
+    close = difflib.get_close_matches(_compact(key), list(_ALIAS_INDEX), n=1, cutoff=FUZZY_CUTOFF)
+    if close:
+        return _ALIAS_INDEX[close[0]]
+    return raw
+
+
+def cache_key(city):
+    """Stable key for a destination, shared by every spelling of it."""
+    return fold(canonicalize(city))
+
+
+def is_known(city):
+    return canonicalize(city) in CITY_ALIASES
+
+
+def _marked_as(text, folded, start, alias):
+    """Whether the alias found at ``start`` of the folded text carries the tone
+    marks MARKED_ALIASES asks for in the original ``text``."""
+    marked = MARKED_ALIASES.get(alias)
+    text = unicodedata.normalize("NFC", str(text or "")).lower()
+    if marked is None or text.isascii():
+        return True
+    words = [w for w in re.split(r"\W+", text) if w]
+    if len(words) != len(folded.split()):
+        # Words do not line up with the folded text: any marked spelling will do.
+        return re.search(rf"\b{marked}\b", text) is not None
+    return words[folded.count(" ", 0, start)] == marked
+
+
+def find_city_in_text(text):
+    """Return the known destination mentioned last in free text (e.g. an address).
+
+    Vietnamese addresses end with the province, so the last mention wins over
+    street and ward names before it ("141 Nguyễn Huệ, Quận 1, TP. Hồ Chí Minh").
+    """
+    folded = fold(text)
+    # Latest end first; of mentions ending together, the longest.
+    spans = sorted(_CITY_MATCHER.spans(folded), key=lambda span: (-(span[0] + len(span[1])), span[0]))
+    for start, alias in spans:
+        if _marked_as(text, folded, start, alias):
+            return _ALIAS_INDEX[alias]
+    return None
+
+
+def find_cities_in_text(text):
+    """Every known destination mentioned in free text, as canonical names."""
+    return {_ALIAS_INDEX[alias] for alias in _CITY_MATCHER.find_all(fold(text))}
@@ -0,0 +1,121 @@
+import re
+
+# Canonical amenity id -> lowercase terms SerpAPI uses in amenity names (hl=vi, some English).
+AMENITY_TERMS = {
+    "free_parking": ["đỗ xe miễn phí", "free parking"],
+    "parking": ["đỗ xe", "parking"],
+    "indoor_pool": ["bể bơi trong nhà", "indoor pool"],
+    "outdoor_pool": ["bể bơi ngoài trời", "outdoor pool"],
+    "pool": ["bể bơi", "hồ bơi", "pool"],
+    "fitness": ["trung tâm thể dục", "phòng tập", "fitness", "gym"],
+    "restaurant": ["nhà hàng", "restaurant"],
+    "free_breakfast": ["bữa sáng miễn phí", "free breakfast"],
+    "spa": ["spa"],
+    "beach_access": ["có biển", "bãi biển", "beach access"],
+    "child_friendly": ["phù hợp với trẻ em", "child-friendly", "kid-friendly"],
+    "bar": ["bar"],
+    "pet_friendly": ["vật nuôi", "thú cưng", "pet-friendly"],
+    "room_service": ["dịch vụ phòng", "room service"],
+    "free_wifi": ["wi-fi miễn phí", "free wi-fi"],
+    "air_conditioning": ["điều hòa", "air-conditioned", "air conditioning"],
+}
+
+# Search form amenity names (see search_service.AMENITIES_MAPPING) -> canonical id.
+FILTER_AMENITY_IDS = {
+    "Free parking": "free_parking",
+    "Parking": "parking",
+    "Indoor pool": "indoor_pool",
+    "Outdoor pool": "outdoor_pool",
+    "Pool": "pool",
+    "Fitness center": "fitness",
+    "Restaurant": "restaurant",
+    "Free breakfast": "free_breakfast",
+    "Spa": "spa",
+    "Beach access": "beach_access",
+    "Child-friendly": "child_friendly",
+    "Bar": "bar",
+    "Pet-friendly": "pet_friendly",
+    "Room service": "room_service",
+    "Free Wi-Fi": "free_wifi",
+    "Air-conditioned": "air_conditioning",
+}
+
+
+def parse_price(value):
+    """'1.234.567 ₫' -> 1234567; None when there is no number to read."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = re.sub(r"[^\d]", "", str(value))
+    return int(digits) if digits else None
+
+
+def amenity_names(raw_amenities):
+    names = []
+    for a in raw_amenities or []:
+        name = a.get("name", "") if isinstance(a, dict) else str(a)
+        if name:
+            names.append(name)
+    return names
+
+
+def amenity_ids(text):
+    return sorted(aid for aid, terms in AMENITY_TERMS.items() if any(t in text for t in terms))
+
+
+def _primary_image(hotel):
+    images = hotel.get("images") or []
+    if not images:
+        return None
+    first = images[0]
+    return first.get("original_image") or first.get("thumbnail")
+
+
+def _nearby(hotel):
+    places = []
+    for place in hotel.get("nearby_places") or []:
+        if isinstance(place, dict) and place.get("name"):
+            transport = place.get("transportations") or [{}]
+            places.append({"name": place["name"], "duration": transport[0].get("duration")})
+    return places
+
+
+def slim_hotel(hotel):
+    """Compact, typed projection of a SerpAPI property / detail payload."""
+    rate = hotel.get("rate_per_night") or {}
+    names = amenity_names(hotel.get("amenities"))
+    # Same text calculate_match_score used to rebuild on every request.
+    text = " ".join(n.lower() for n in names)
+    gps = hotel.get("gps_coordinates") or {}
+
+    return {
+        "property_token": hotel.get("property_token"),
+        "name": hotel.get("name"),
+        "price": parse_price(rate.get("lowest")),
+        "price_text": rate.get("lowest"),
+        "rating": float(hotel.get("overall_rating") or 0),
+        "reviews": int(hotel.get("reviews") or 0),
+        "hotel_class": int(hotel.get("extracted_hotel_class") or 0),
+        "amenities": amenity_ids(text),
+        "amenity_names": names,
+        "amenity_text": text,
+        "image": _primary_image(hotel),
+        "address": hotel.get("address"),
+        "gps": [gps["latitude"], gps["longitude"]] if "latitude" in gps and "longitude" in gps else None,
+        "nearby": _nearby(hotel),
+    }
+
+
+def slim_hotels(hotels):
+    return [slim_hotel(h) for h in hotels or []]
+
+
+def preview_from_slim(slim):
+    """The preview_data shape stored for history and favorites."""
+    return {
+        "name": slim.get("name"),
+        "image": slim.get("image") or "",
+        "price": slim.get("price_text") or "Liên hệ",
+        "address": slim.get("address"),
+    }
@@ -0,0 +1,217 @@
+import json
+import os
+import re
+from collections import Counter, defaultdict
+
+from .location import fold
+from .normalize import amenity_names
+
+# Tokens of hotel data a prompt may carry; LLM_CONTEXT_BUDGET_<TASK> overrides one.
+BUDGET = int(os.getenv("LLM_CONTEXT_BUDGET", "1200"))
+BUDGETS = {task: int(os.getenv(f"LLM_CONTEXT_BUDGET_{task.upper()}", BUDGET)) for task in ("hotel_chat", "chat_search")}
+LIST_LIMIT = int(os.getenv("LLM_CONTEXT_LIST_LIMIT", "10"))  # items kept per list
+TEXT_LIMIT = 400  # characters kept per text field
+
+# Contexts built per task (tokens, how many had to be cut to the budget),
+# exposed via /api/cache_stats.
+stats = defaultdict(Counter)
+
+# Detail fields every hotel_chat prompt gets, most important first.
+BASE_FIELDS = ("name", "hotel_class", "address", "overall_rating", "reviews", "rate_per_night")
+
+# Question topic -> (detail fields it needs, folded words that ask about it).
+TOPICS = {
+    "price": (
+        ("rate_per_night", "total_rate", "prices", "typical_price_range", "deal"),
+        ["gia", "bao nhieu", "tien", "re", "dat", "phi", "khuyen mai", "uu dai", "agoda", "booking", "traveloka",
+         "price", "cost", "cheap", "deal"],
+    ),
+    "location": (
+        ("address", "nearby_places", "location_rating"),
+        ["gan", "cach", "xa", "di bo", "di chuyen", "san bay", "bien", "trung tam", "vi tri", "dia chi",
+         "duong", "near", "distance", "airport", "beach", "location", "where"],
+    ),
+    "amenities": (
+        ("amenities", "amenities_detailed", "excluded_amenities"),
+        ["tien nghi", "tien ich", "ho boi", "be boi", "wifi", "gym", "spa", "bua sang", "an sang", "dieu hoa",
+         "do xe", "dau xe", "thu cung", "tre em", "nha hang", "bar", "pool", "breakfast", "parking", "amenity",
+         "amenities"],
+    ),
+    "reviews": (
+        ("overall_rating", "reviews", "location_rating", "ratings", "reviews_breakdown"),
+        ["danh gia", "review", "sach", "on ao", "yen tinh", "nhan vien", "phuc vu", "chat luong", "tot khong",
+         "rating", "clean", "quiet", "staff"],
+    ),
+    "policies": (
+        ("check_in_time", "check_out_time", "essential_info", "health_and_safety"),
+        ["check in", "check out", "nhan phong", "tra phong", "gio", "chinh sach", "huy", "hut thuoc", "policy",
+         "cancel", "smoking"],
+    ),
+    "about": (
+        ("description", "hotel_class", "type"),
+        ["gioi thieu", "mo ta", "phong cach", "nhu the nao", "the nao", "about", "describe"],
+    ),
+}
+TOPIC_PATTERNS = {
+    topic: re.compile(r"\b(?:" + "|".join(sorted(words, key=len, reverse=True)) + r")\b")
+    for topic, (_, words) in TOPICS.items()
+}
+# Keys that never help an answer (links, logos, images, raw numbers twinned with text).
+DROP_KEY = re.compile(r"^(?:link|logo|images?|thumbnail|original_image|serpapi_.*|property_token|extracted_.*)$")
+
+_TOKEN = re.compile(r"[^\W\d_]+|\d|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Rough count of Gemini tokens in ``text``, without a tokenizer.
+
+    Words cost one token per four characters (three when they carry
+    Vietnamese diacritics), each digit and punctuation mark one. Compare with
+    the model's own prompt_tokens under ``llm`` in /api/cache_stats.
+    """
+    tokens = 0
+    for piece in _TOKEN.findall(text or ""):
+        tokens += -(-len(piece) // (4 if piece.isascii() else 3))
+    return tokens
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _shorten(value, limit):
+    """``value`` with long lists cut to ``limit`` items, long texts to TEXT_LIMIT
+    characters and useless keys dropped."""
+    if isinstance(value, dict):
+        return {k: _shorten(v, limit) for k, v in value.items() if not DROP_KEY.match(k)}
+    if isinstance(value, list):
+        return [_shorten(v, limit) for v in value[:limit]]
+    if isinstance(value, str) and len(value) > TEXT_LIMIT:
+        return value[:TEXT_LIMIT] + "…"
+    return value
+
+
+def _question_words(question):
+    return {w for w in fold(question).split() if len(w) > 2}
+
+
+def _relevant_first(names, question_words):
+    """Names sharing a word with the question come first ("hồ bơi" -> "Bể bơi ngoài trời")."""
+    return sorted(names, key=lambda name: not (set(fold(name).split()) & question_words))
+
+
+def _dicts(value):
+    """The dict items of a list field; a client-sent fallback may hold anything."""
+    return [item for item in value if isinstance(item, dict)] if isinstance(value, list) else []
+
+
+def _project(field, value, limit, question_words):
+    """A detail field reduced to what a reply can use."""
+    if field in ("rate_per_night", "total_rate") and isinstance(value, dict):
+        return value.get("lowest")
+    if field == "prices":
+        return [
+            f"{p.get('source')}: {_project('rate_per_night', p.get('rate_per_night'), limit, question_words)}"
+            for p in _dicts(value)[:limit]
+        ]
+    if field == "nearby_places":
+        places = []
+        for place in _dicts(value)[:limit]:
+            transport = (_dicts(place.get("transportations")) or [{}])[0]
+            how = " ".join(filter(None, (transport.get("type"), transport.get("duration"))))
+            places.append(f"{place.get('name')} ({how})" if how else place.get("name"))
+        return places
+    if field == "amenities" and isinstance(value, list):
+        return _relevant_first(amenity_names(value), question_words)[:limit]
+    if field == "amenities_detailed" and isinstance(value, dict):
+        return {
+            str(group.get("title")): _relevant_first(
+                [str(a.get("title")) for a in _dicts(group.get("list")) if a.get("available", True)], question_words
+            )[:limit]
+            for group in _dicts(value.get("groups"))
+        }
+    if field == "reviews_breakdown":
+        return [f"{r.get('name')}: +{r.get('positive', 0)}/-{r.get('negative', 0)}" for r in _dicts(value)[:limit]]
+    if field == "ratings":
+        return {str(r.get("stars")): r.get("count") for r in _dicts(value)}
+    return _shorten(value, limit)
+
+
+def _fit(task, render, items):
+    """``render(items, limit)`` within the task's budget: lists are halved
+    first, then the last items left out. Returns the text and the items kept."""
+    budget = BUDGETS.get(task, BUDGET)
+    limit, trimmed = LIST_LIMIT, False
+    while True:
+        text = render(items, limit)
+        tokens = estimate_tokens(text)
+        if tokens <= budget or (limit <= 2 and len(items) <= 1):
+            break
+        trimmed = True
+        if limit > 2:
+            limit //= 2
+        else:
+            items = items[:-1]
+    counter = stats[task]
+    counter["contexts"] += 1
+    counter["tokens"] += tokens
+    counter["trimmed"] += trimmed
+    return text, items
+
+
+def hotel_context(hotel, question, task="hotel_chat"):
+    """Compact JSON of the hotel detail fields ``question`` needs, within the
+    task's token budget.
+
+    Fields come from the topics the question asks about (price, location,
+    amenities, reviews, policies, description), after the basics; a question
+    matching no topic gets them all.
+    """
+    folded = fold(question)
+    question_words = _question_words(question)
+    topics = [t for t, pattern in TOPIC_PATTERNS.items() if pattern.search(folded)] or list(TOPICS)
+    fields = list(BASE_FIELDS)
+    for topic in topics:
+        fields += [f for f in TOPICS[topic][0] if f not in fields]
+    fields = [f for f in fields if hotel.get(f) not in (None, "", [], {})]
+
+    def render(fields, limit):
+        return _dumps({f: _project(f, hotel[f], limit, question_words) for f in fields})
+
+    return _fit(task, render, fields)[0]
+
+
+def hotel_list_context(hotels, question, task="chat_search"):
+    """One line per hotel of a results page (name, price, rating, amenities),
+    within the task's token budget: amenities the question mentions are kept
+    first, then lists shrink and the last hotels are left out."""
+    question_words = _question_words(question)
+
+    def line(hotel, limit):
+        amenities = hotel.get("amenities") or []
+        if isinstance(amenities, str):
+            amenities = [a.strip() for a in amenities.split(",") if a.strip()]
+        amenities = _relevant_first(amenities, question_words)[:limit]
+        return (
+            f"- {hotel.get('name')}: Giá {hotel.get('price') or 'N/A'}; Đánh giá {hotel.get('rating') or 'N/A'}/5; "
+            f"Tiện nghi: {', '.join(amenities) or 'Không rõ'}"
+        )
+
+    text, shown = _fit(task, lambda shown, limit: "\n".join(line(h, limit) for h in shown), list(hotels))
+    if len(shown) < len(hotels):
+        text += f"\n(... và {len(hotels) - len(shown)} khách sạn khác)"
+    return text
+
+
+def summary():
+    """Per-task contexts built, their average size and how many were cut."""
+    result = {}
+    for task, counter in stats.items():
+        contexts = counter["contexts"]
+        result[task] = {
+            "budget": BUDGETS.get(task, BUDGET),
+            "contexts": contexts,
+            "avg_tokens": round(counter["tokens"] / contexts) if contexts else None,
+            "trimmed": counter["trimmed"],
+        }
+    return result
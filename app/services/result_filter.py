@@ -0,0 +1,107 @@
+import json
+from collections import Counter
+
+from . import cache_maintenance, codec
+from .location import cache_key
+from .normalize import FILTER_AMENITY_IDS, slim_hotels
+from .search_service import AMENITIES_MAPPING, PRICE_MAPPING, RATING_MAPPING
+
+# Local superset lookups for this process, exposed via /api/cache_stats.
+stats = Counter()
+
+def build_constraints(price, rating, amenities):
+    """Turn search form values into the constraints SerpAPI actually applies."""
+    price_bounds = None
+    if price in PRICE_MAPPING:
+        bounds = PRICE_MAPPING[price]
+        price_bounds = (bounds["min"], bounds["max"] if bounds["max"] else float("inf"))
+
+    classes = None
+    if rating in RATING_MAPPING:
+        classes = frozenset(int(c) for c in RATING_MAPPING[rating].split(","))
+
+    if isinstance(amenities, str):
+        amenities = [amenities]
+    # Names missing from AMENITIES_MAPPING are dropped by search_hotels, so they
+    # don't narrow the upstream result either.
+    wanted = frozenset(FILTER_AMENITY_IDS[a] for a in (amenities or []) if a in AMENITIES_MAPPING)
+
+    return {"price": price_bounds, "classes": classes, "amenities": wanted}
+
+
+def covers(broad, narrow):
+    """True when every hotel matching ``narrow`` would also match ``broad``."""
+    if broad["price"] is not None:
+        if narrow["price"] is None:
+            return False
+        if not (broad["price"][0] <= narrow["price"][0] and narrow["price"][1] <= broad["price"][1]):
+            return False
+
+    if broad["classes"] is not None:
+        if narrow["classes"] is None or not narrow["classes"] <= broad["classes"]:
+            return False
+
+    return broad["amenities"] <= narrow["amenities"]
+
+
+def matches(slim, constraints):
+    """Check a slim hotel record (see normalize.slim_hotel) against constraints."""
+    if constraints["price"] is not None:
+        if slim["price"] is None:
+            return False
+        low, high = constraints["price"]
+        if not low <= slim["price"] <= high:
+            return False
+
+    if constraints["classes"] is not None:
+        if slim["hotel_class"] not in constraints["classes"]:
+            return False
+
+    return constraints["amenities"] <= set(slim["amenities"])
+
+
+def find_in_superset(db, city, price, rating, amenities, exclude_hash=None, fresh_modifier="-86400 seconds"):
+    """Answer a search from a broader result cached today for the same city.
+
+    Returns ``(hotels, slim_hotels, source_row)`` or ``None`` when no cached
+    superset covers the query (or filtering it leaves nothing to show).
+    """
+    narrow = build_constraints(price, rating, amenities)
+    city_key = cache_key(city)
+
+    candidates = db.execute(
+        """
+        SELECT search_hash, city, params_json, created_at FROM search_cache
+        WHERE date(created_at) = date('now') AND created_at > datetime('now', ?)
+        ORDER BY created_at DESC
+        """,
+        (fresh_modifier,),
+    ).fetchall()
+
+    for cand in candidates:
+        if cand["search_hash"] == exclude_hash:
+            continue
+        if cache_key(cand["city"]) != city_key:
+            continue
+        try:
+            params = json.loads(cand["params_json"])
+        except (TypeError, ValueError):
+            continue
+        broad = build_constraints(params.get("price"), params.get("rating"), params.get("amenities"))
+        if not covers(broad, narrow):
+            continue
+
+        row = db.execute(
+            "SELECT results_json, slim_json FROM search_cache WHERE search_hash = ?",
+            (cand["search_hash"],),
+        ).fetchone()
+        raw = codec.decode(row["results_json"])
+        slim = json.loads(row["slim_json"]) if row["slim_json"] else slim_hotels(raw)
+        kept = [(h, s) for h, s in zip(raw, slim) if matches(s, narrow)]
+        if kept:
+            stats["hits"] += 1
+            cache_maintenance.touch("search_cache", cand["search_hash"])
+            return [h for h, _ in kept], [s for _, s in kept], cand
+
+    stats["misses"] += 1
+    return None
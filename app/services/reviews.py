@@ -0,0 +1,152 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from . import search_index
+
+PAGE_SIZE = int(os.getenv("REVIEWS_PAGE_SIZE", "10"))
+
+SORTS = ("newest", "oldest", "highest", "lowest")
+
+UPSERT_STATS = """
+    INSERT INTO review_stats (property_token, review_count, rating_sum, stars_{star}, last_review_at)
+    VALUES (?, 1, ?, 1, ?)
+    ON CONFLICT(property_token) DO UPDATE SET
+        review_count = review_count + 1,
+        rating_sum = rating_sum + excluded.rating_sum,
+        stars_{star} = stars_{star} + 1,
+        last_review_at = MAX(COALESCE(last_review_at, ''), excluded.last_review_at)
+"""
+
+
+def parse_rating(value):
+    """1-5 as an int, or None for anything else."""
+    try:
+        rating = int(value)
+    except (TypeError, ValueError):
+        return None
+    return rating if 1 <= rating <= 5 else None
+
+
+def add_review(db, property_token, username, rating, comment):
+    """Insert a review, fold it into review_stats and index its comment, in one transaction."""
+    rating = parse_rating(rating)
+    if rating is None:
+        raise ValueError("rating must be 1-5")
+    created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    with db:
+        cursor = db.execute(
+            "INSERT INTO user_reviews (property_token, username, rating, comment, created_at) VALUES (?, ?, ?, ?, ?)",
+            (property_token, username, rating, comment, created_at),
+        )
+        db.execute(UPSERT_STATS.format(star=rating), (property_token, rating, created_at))
+        search_index.index_review(db, cursor.lastrowid, comment)
+
+
+def get_stats(db, property_token):
+    row = db.execute("SELECT * FROM review_stats WHERE property_token = ?", (property_token,)).fetchone()
+    count = row["review_count"] if row else 0
+    return {
+        "count": count,
+        "average": round(row["rating_sum"] / count, 1) if count else None,
+        "histogram": {star: (row[f"stars_{star}"] if row else 0) for star in range(5, 0, -1)},
+        "last_review_at": row["last_review_at"] if row else None,
+    }
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def decode_cursor(cursor, key_len=2):
+    """[(rating,) created_at, id] from ``cursor``, each of its type, or ValueError."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("invalid cursor")
+    if not isinstance(values, list) or len(values) != key_len:
+        raise ValueError("invalid cursor")
+    if key_len == 3 and not (_is_int(values[0]) and 1 <= values[0] <= 5):
+        raise ValueError("invalid cursor")
+    if not (isinstance(values[-2], str) and _is_int(values[-1])):
+        raise ValueError("invalid cursor")
+    return values
+
+
+def _fetch(db, where, params, order, limit):
+    return db.execute(
+        f"SELECT * FROM user_reviews WHERE {where} ORDER BY {order} LIMIT ?", params + [limit]
+    ).fetchall()
+
+
+def page(db, property_token, rating=None, sort="newest", after=None, limit=None, stats=None):
+    """One page of reviews and the cursor of the next one (None on the last).
+
+    Keyset pagination: each page starts right after the (rating,) created_at,
+    id of the previous page's last row, so its cost does not depend on how
+    far the reader has scrolled. Raises ValueError for a malformed ``after``.
+    """
+    limit = limit or PAGE_SIZE
+    sort = sort if sort in SORTS else "newest"
+    if rating is not None and sort in ("highest", "lowest"):
+        sort = "newest"  # one star only: both orders are newest first
+    key_len = 3 if sort in ("highest", "lowest") else 2
+    cursor = decode_cursor(after, key_len) if after else None
+
+    if stats is not None and not (stats["histogram"][rating] if rating else stats["count"]):
+        return [], None
+
+    where, params = "property_token = ?", [property_token]
+    if rating is not None:
+        where += " AND rating = ?"
+        params.append(rating)
+
+    if sort == "lowest":
+        rows = _lowest_first(db, property_token, cursor, limit, stats)
+    else:
+        if sort == "oldest":
+            order, compare = "created_at ASC, id ASC", ">"
+        elif sort == "highest":
+            order, compare = "rating DESC, created_at DESC, id DESC", "<"
+        else:
+            order, compare = "created_at DESC, id DESC", "<"
+        columns = ("rating", "created_at", "id")[-key_len:]
+        if cursor is not None:
+            where += f" AND ({', '.join(columns)}) {compare} ({', '.join('?' * key_len)})"
+            params += cursor
+        rows = _fetch(db, where, params, order, limit + 1)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        key = [last["created_at"], last["id"]]
+        next_cursor = encode_cursor([last["rating"]] + key if key_len == 3 else key)
+    return rows, next_cursor
+
+
+def _lowest_first(db, property_token, cursor, limit, stats):
+    # Rating ascending but newest first within a rating: the directions differ,
+    # so walk the star groups one by one, each newest first on the index.
+    rows = []
+    start = cursor[0] if cursor else 1
+    for star in range(start, 6):
+        if stats is not None and not stats["histogram"][star]:
+            continue
+        where, params = "property_token = ? AND rating = ?", [property_token, star]
+        if cursor and star == cursor[0]:
+            where += " AND (created_at, id) < (?, ?)"
+            params += cursor[1:]
+        rows += _fetch(db, where, params, "created_at DESC, id DESC", limit + 1 - len(rows))
+        if len(rows) > limit:
+            break
+    return rows
+
+
+def as_dict(row):
+    return {key: row[key] for key in ("username", "rating", "comment", "created_at")}
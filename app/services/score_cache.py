@@ -0,0 +1,93 @@
+import hashlib
+import json
+from collections import Counter
+
+from ..utils import score_hotels
+from . import cache_maintenance
+
+# Bump when calculate_match_score / score_hotels change, so old rows stop matching.
+SCORE_RULES_VERSION = 1
+
+# The only preference fields the match score reads.
+SCORED_PREFS = ("vibe", "budget", "companion")
+
+# Lookups served from match_scores in this process, exposed via /api/cache_stats.
+stats = Counter()
+
+
+def _digest(value):
+    raw = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def prefs_fingerprint(prefs):
+    """Fingerprint of what the scorer reads from ``users.preferences``.
+
+    Any write that changes vibe, budget or companion yields a new fingerprint,
+    so scores cached for the old preferences are simply never read again.
+    """
+    scored = {k: prefs[k] for k in SCORED_PREFS if k in prefs}
+    return _digest([SCORE_RULES_VERSION, scored])
+
+
+def data_version(slim):
+    """Version of the hotel fields the scorer reads (see normalize.slim_hotel)."""
+    return _digest([slim.get("amenity_text"), slim.get("price"), slim.get("rating")])
+
+
+def get_scores(db, prefs, hotels):
+    """Match scores for slim hotel records, like ``score_hotels`` but memoized.
+
+    Rows are keyed by (preferences fingerprint, property_token, data version),
+    so one indexed lookup answers every hotel already scored for these
+    preferences; only the rest are scored and stored.
+    """
+    if not prefs or not hotels:
+        return score_hotels(prefs, hotels)
+
+    fp = prefs_fingerprint(prefs)
+    versions = [data_version(h) if h and h.get("property_token") else None for h in hotels]
+    tokens = [h["property_token"] for h, v in zip(hotels, versions) if v]
+
+    cached = {}
+    if tokens:
+        rows = db.execute(
+            """
+            SELECT property_token, data_version, score, reason FROM match_scores
+            WHERE prefs_fp = ? AND property_token IN (SELECT value FROM json_each(?))
+            """,
+            (fp, json.dumps(tokens)),
+        ).fetchall()
+        cached = {(r["property_token"], r["data_version"]): r for r in rows}
+
+    results = [None] * len(hotels)
+    missing = []
+    for i, (hotel, version) in enumerate(zip(hotels, versions)):
+        row = cached.get((hotel["property_token"], version)) if version else None
+        if row is not None:
+            results[i] = {"score": row["score"], "reason": row["reason"]}
+            cache_maintenance.touch("match_scores", fp, hotel["property_token"], version)
+        else:
+            missing.append(i)
+
+    stats["hits"] += len(hotels) - len(missing)
+    stats["misses"] += len(missing)
+    if not missing:
+        return results
+
+    new_rows = []
+    for i, result in zip(missing, score_hotels(prefs, [hotels[i] for i in missing])):
+        results[i] = result
+        if versions[i]:
+            new_rows.append((fp, hotels[i]["property_token"], versions[i], result["score"], result["reason"]))
+
+    if new_rows:
+        db.executemany(
+            """
+            INSERT OR REPLACE INTO match_scores (prefs_fp, property_token, data_version, score, reason)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            new_rows,
+        )
+        db.commit()
+    return results
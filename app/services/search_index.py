@@ -0,0 +1,258 @@
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+
+from . import codec, result_filter
+from .location import cache_key, find_city_in_text, fold
+from .normalize import amenity_names, slim_hotel
+
+# bm25 weights of the hotel_fts columns: name, address, amenities, nearby.
+BM25_WEIGHTS = "10.0, 3.0, 2.0, 1.0"
+# Best review matches looked at per hotel returned (most hotels have several).
+REVIEW_MATCHES_PER_HOTEL = 10
+# Indexed hotels older than this no longer answer chat searches (prices move).
+MAX_AGE = float(os.getenv("SEARCH_INDEX_MAX_AGE", "86400"))  # seconds
+# Chat searches are answered locally when at least this many cached hotels
+# match; 0 always asks SerpAPI.
+CHAT_MIN_RESULTS = int(os.getenv("CHAT_LOCAL_MIN_RESULTS", "4"))
+
+# Chat searches answered locally vs. sent upstream, exposed via /api/cache_stats.
+stats = Counter()
+
+UPSERT_HOTEL = """
+    INSERT INTO local_hotels (property_token, city_key, name, address, amenities, nearby, slim, indexed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(property_token) DO UPDATE SET
+        -- A city guessed from the address only fills in a missing one; the
+        -- city a search was made for always wins.
+        city_key = CASE WHEN ? THEN COALESCE(excluded.city_key, city_key) ELSE COALESCE(city_key, excluded.city_key) END,
+        name = COALESCE(excluded.name, name),
+        address = COALESCE(excluded.address, address),
+        amenities = COALESCE(excluded.amenities, amenities),
+        nearby = COALESCE(excluded.nearby, nearby),
+        slim = CASE WHEN excluded.indexed_at >= indexed_at THEN excluded.slim ELSE slim END,
+        indexed_at = MAX(indexed_at, excluded.indexed_at)
+"""
+
+
+def _now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _document(hotel):
+    nearby = [p.get("name") for p in hotel.get("nearby_places") or [] if isinstance(p, dict) and p.get("name")]
+    return (
+        hotel.get("name") or None,
+        hotel.get("address") or None,
+        ", ".join(amenity_names(hotel.get("amenities"))) or None,
+        ", ".join(nearby) or None,
+    )
+
+
+def index_hotels(db, hotels, city=None, indexed_at=None):
+    """Add or refresh SerpAPI property / detail payloads in the local index.
+
+    Runs in the caller's transaction. Text missing from a payload (search
+    results carry no address, details no city) keeps what was indexed before;
+    without ``city`` the hotel's city is read from its address, and only
+    kept when none was indexed yet.
+    """
+    indexed_at = indexed_at or _now()
+    for hotel in hotels or []:
+        token = hotel.get("property_token")
+        if not token:
+            continue
+        name, address, amenities, nearby = _document(hotel)
+        place = city or find_city_in_text(address or "")
+        db.execute(
+            UPSERT_HOTEL,
+            (
+                token,
+                cache_key(place) if place else None,
+                name,
+                address,
+                amenities,
+                nearby,
+                json.dumps(slim_hotel(hotel), ensure_ascii=False),
+                indexed_at,
+                bool(city),
+            ),
+        )
+        row = db.execute(
+            "SELECT id, name, address, amenities, nearby FROM local_hotels WHERE property_token = ?", (token,)
+        ).fetchone()
+        db.execute("DELETE FROM hotel_fts WHERE rowid = ?", (row["id"],))
+        db.execute(
+            "INSERT INTO hotel_fts (rowid, name, address, amenities, nearby) VALUES (?, ?, ?, ?, ?)",
+            (row["id"],) + tuple(fold(row[col]) for col in ("name", "address", "amenities", "nearby")),
+        )
+
+
+def drop_hotels(db, tokens):
+    """Remove hotels from the index, in the caller's transaction. Returns how many were indexed."""
+    removed = 0
+    for token in tokens:
+        row = db.execute("SELECT id FROM local_hotels WHERE property_token = ?", (token,)).fetchone()
+        if row:
+            db.execute("DELETE FROM hotel_fts WHERE rowid = ?", (row["id"],))
+            db.execute("DELETE FROM local_hotels WHERE id = ?", (row["id"],))
+            removed += 1
+    return removed
+
+
+def index_review(db, review_id, comment):
+    if comment and comment.strip():
+        db.execute("INSERT INTO review_fts (rowid, comment) VALUES (?, ?)", (review_id, fold(comment)))
+
+
+def match_query(text, any_term=False, prefix=False):
+    """FTS5 query for free text: every term (or any, ranked), folded like the index."""
+    terms = [f'"{term}"' for term in fold(text).split()]
+    if not terms:
+        return None
+    if prefix:
+        terms[-1] += "*"
+    return (" OR " if any_term else " ").join(terms)
+
+
+def _result(row, matched):
+    return dict(json.loads(row["slim"]), matched=matched, indexed_at=row["indexed_at"])
+
+
+def search(db, text, city=None, limit=20):
+    """Indexed hotels whose name, address, amenities, nearby places or reviews
+    contain every term of ``text`` (the last one as a prefix), best first.
+
+    Each result is a slim hotel record plus ``matched`` ("hotel" and/or
+    "reviews") and ``indexed_at``; its price is as of that time.
+    """
+    query = match_query(text, prefix=True)
+    if not query:
+        return []
+    city_filter, params = "", [query]
+    if city:
+        city_filter = " AND h.city_key = ?"
+        params.append(cache_key(city))
+
+    results = {}
+    for row in db.execute(
+        f"""
+        SELECT h.property_token, h.slim, h.indexed_at FROM hotel_fts
+        JOIN local_hotels h ON h.id = hotel_fts.rowid
+        WHERE hotel_fts MATCH ?{city_filter}
+        ORDER BY bm25(hotel_fts, {BM25_WEIGHTS}) LIMIT ?
+        """,
+        params + [limit],
+    ):
+        results[row["property_token"]] = _result(row, ["hotel"])
+
+    for row in db.execute(
+        f"""
+        SELECT property_token, slim, indexed_at, MIN(rank) AS best FROM (
+            SELECT h.property_token, h.slim, h.indexed_at, review_fts.rank FROM review_fts
+            JOIN user_reviews r ON r.id = review_fts.rowid
+            JOIN local_hotels h ON h.property_token = r.property_token
+            WHERE review_fts MATCH ?{city_filter}
+            ORDER BY review_fts.rank LIMIT ?
+        )
+        GROUP BY property_token ORDER BY best LIMIT ?
+        """,
+        params + [limit * REVIEW_MATCHES_PER_HOTEL, limit],
+    ):
+        if row["property_token"] in results:
+            results[row["property_token"]]["matched"].append("reviews")
+        else:
+            results[row["property_token"]] = _result(row, ["reviews"])
+
+    return list(results.values())[:limit]
+
+
+def _filter_sql(constraints):
+    """SQL for the price / class part of the constraints (generated columns)."""
+    sql, params = "", []
+    if constraints["price"] is not None:
+        low, high = constraints["price"]
+        sql += " AND h.price >= ?"
+        params.append(low)
+        if high != float("inf"):
+            sql += " AND h.price <= ?"
+            params.append(high)
+    if constraints["classes"] is not None:
+        sql += f" AND h.hotel_class IN ({', '.join('?' * len(constraints['classes']))})"
+        params += sorted(constraints["classes"])
+    return sql, params
+
+
+def find_cached(db, city, price, rating, amenities, text=None, limit=20):
+    """Recently indexed hotels in ``city`` passing the search filters.
+
+    Hotels matching any term of ``text`` come first (by relevance), then the
+    rest of the city by rating. Returns slim hotel records.
+    """
+    since = (datetime.utcnow() - timedelta(seconds=MAX_AGE)).strftime("%Y-%m-%d %H:%M:%S")
+    constraints = result_filter.build_constraints(price, rating, amenities)
+    filter_sql, filter_params = _filter_sql(constraints)
+    params = [cache_key(city), since] + filter_params
+    hotels, seen = [], set()
+
+    query = match_query(text, any_term=True) if text else None
+    if query:
+        for row in db.execute(
+            f"""
+            SELECT h.id, h.slim FROM hotel_fts
+            JOIN local_hotels h ON h.id = hotel_fts.rowid
+            WHERE hotel_fts MATCH ? AND h.city_key = ? AND h.indexed_at > ?{filter_sql}
+            ORDER BY bm25(hotel_fts, {BM25_WEIGHTS})
+            """,
+            [query] + params,
+        ):
+            seen.add(row["id"])
+            slim = json.loads(row["slim"])
+            if result_filter.matches(slim, constraints):
+                hotels.append(slim)
+                if len(hotels) == limit:
+                    return hotels
+
+    for row in db.execute(
+        f"""
+        SELECT h.id, h.slim FROM local_hotels h
+        WHERE h.city_key = ? AND h.indexed_at > ?{filter_sql}
+        ORDER BY h.rating DESC
+        """,
+        params,
+    ):
+        if row["id"] not in seen:
+            slim = json.loads(row["slim"])
+            if result_filter.matches(slim, constraints):
+                hotels.append(slim)
+                if len(hotels) == limit:
+                    break
+    return hotels
+
+
+def reindex_hotels(db):
+    """Re-create the hotel index from search_cache and hotel_cache, in the
+    caller's transaction. Returns {"searches", "hotels"} counts."""
+    counts = {"searches": 0, "hotels": 0}
+    for table in ("local_hotels", "hotel_fts"):
+        db.execute(f"DELETE FROM {table}")
+    for row in db.execute("SELECT params_json, results_json, created_at FROM search_cache ORDER BY created_at"):
+        params = json.loads(row["params_json"]) if row["params_json"] else {}
+        index_hotels(db, codec.decode(row["results_json"]), params.get("city"), row["created_at"])
+        counts["searches"] += 1
+    for row in db.execute("SELECT data, created_at FROM hotel_cache ORDER BY created_at"):
+        index_hotels(db, [codec.decode(row["data"])], indexed_at=row["created_at"])
+        counts["hotels"] += 1
+    return counts
+
+
+def rebuild(db):
+    """Re-create the index from search_cache, hotel_cache and user_reviews."""
+    with db:
+        counts = dict(reindex_hotels(db), reviews=0)
+        db.execute("DELETE FROM review_fts")
+        for row in db.execute("SELECT id, comment FROM user_reviews WHERE comment IS NOT NULL AND comment != ''"):
+            index_review(db, row["id"], row["comment"])
+            counts["reviews"] += 1
+    return counts
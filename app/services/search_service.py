@@ -1,58 +1,78 @@
 import os
+import threading
+from collections import Counter
 from datetime import date, timedelta
 
 import requests
 from dotenv import load_dotenv
+
+from .http_client import DEFAULT_TIMEOUT, get_session
+
 load_dotenv()
 
 output_directory = "fetched_data"
 
+# Upstream request counters for this process, exposed via /api/cache_stats.
+upstream_calls = Counter()
+
 def enlarge_thumbnail(thumbnail_url, width, height):
     if not thumbnail_url:
         return None
     base_url = thumbnail_url.split('=')[0]
     return f"{base_url}=w{width}-h{height}-k-no"
 
+PRICE_MAPPING = {
+    "0-500000": {"min": 1, "max": 500000},
+    "500000-1000000": {"min": 500000, "max": 1000000},
+    "1000000-2000000": {"min": 1000000, "max": 2000000},
+    "500000-2000000": {"min": 500000, "max": 2000000},
+    "2000000+": {"min": 2000000, "max": None},
+    # Chat-only buckets ("dưới 2 triệu", "trên 1 triệu").
+    "0-1000000": {"min": 1, "max": 1000000},
+    "0-2000000": {"min": 1, "max": 2000000},
+    "500000+": {"min": 500000, "max": None},
+    "1000000+": {"min": 1000000, "max": None},
+}
+
+RATING_MAPPING = {
+    "4-5": "4, 5", 
+    "3-5": "3, 4, 5",
+    "2-3": "2, 3"
+}
+
+AMENITIES_MAPPING = {
+    "Free parking": "1",
+    "Parking": "3",
+    "Indoor pool": "4",
+    "Outdoor pool": "5",
+    "Pool": "6",
+    "Fitness center": "7",
+    "Restaurant": "8",
+    "Free breakfast": "9",
+    "Spa": "10",
+    "Beach access": "11",
+    "Child-friendly": "12",
+    "Bar": "15",
+    "Pet-friendly": "19",
+    "Room service": "22",
+    "Free Wi-Fi": "35",
+    "Air-conditioned": "40",
+}
+
+
 class HotelSearchAPI:
-    def __init__(self, api_key):
+    def __init__(self, api_key, session=None, timeout=DEFAULT_TIMEOUT):
         self.api_key = api_key
         self.base_url = "https://serpapi.com/search"
         self.geo_api_key = os.getenv("GEOAPIFY_KEY")
+        self._session = session
+        self.timeout = timeout
 
-    def search_hotels(self, location, price_range=None, rating_range=None, amenities=None):
-        price_mapping = {
-            "0-500000": {"min": 1, "max": 500000},
-            "500000-1000000": {"min": 500000, "max": 1000000},
-            "1000000-2000000": {"min": 1000000, "max": 2000000},
-            "500000-2000000": {"min": 500000, "max": 2000000},
-            "2000000+": {"min": 2000000, "max": None}
-        }
-         
-        rating_mapping = {
-            "4-5": "4, 5", 
-            "3-5": "3, 4, 5",
-            "2-3": "2, 3"
-        }
+    @property
+    def session(self):
+        return self._session or get_session()
 
-        amenities_mapping = {
-            "Free parking": "1",
-            "Parking": "3",
-            "Indoor pool": "4",
-            "Outdoor pool": "5",
-            "Pool": "6",
-            "Fitness center": "7",
-            "Restaurant": "8",
-            "Free breakfast": "9",
-            "Spa": "10",
-            "Beach access": "11",
-            "Child-friendly": "12",
-            "Bar": "15",
-            "Pet-friendly": "19",
-            "Room service": "22",
-            "Free Wi-Fi": "35",
-            "Air-conditioned": "40",
-        }
-        
+    def search_hotels(self, location, price_range=None, rating_range=None, amenities=None):
         params = {
             "engine": "google_hotels",
             "q": f"hotels in {location}",
@@ -64,26 +84,27 @@ class HotelSearchAPI:
             "api_key": self.api_key,
         }
         
-        if price_range in price_mapping:
-            params["min_price"] = price_mapping[price_range]["min"]
-            if price_mapping[price_range]["max"]:
-                params["max_price"] = price_mapping[price_range]["max"]
+        if price_range in PRICE_MAPPING:
+            params["min_price"] = PRICE_MAPPING[price_range]["min"]
+            if PRICE_MAPPING[price_range]["max"]:
+                params["max_price"] = PRICE_MAPPING[price_range]["max"]
             
-        if rating_range in rating_mapping:
-            params["hotel_class"] = rating_mapping[rating_range]
+        if rating_range in RATING_MAPPING:
+            params["hotel_class"] = RATING_MAPPING[rating_range]
         
         if amenities:
             if isinstance(amenities, str):
                 amenities = [amenities]
             selected_ids = []
             for a in amenities:
-                if a in amenities_mapping:
-                    selected_ids.append(amenities_mapping[a])
+                if a in AMENITIES_MAPPING:
+                    selected_ids.append(AMENITIES_MAPPING[a])
             if selected_ids:
                 params['amenities'] = ",".join(selected_ids)
         try:
             print(f"Fetching hotel list for: {location}...")
-            response = requests.get(self.base_url, params=params)
+            upstream_calls["search"] += 1
+            response = self.session.get(self.base_url, params=params, timeout=self.timeout)
             response.raise_for_status()
             data = response.json()
             properties = data.get('properties')
@@ -113,7 +134,8 @@ class HotelSearchAPI:
         }
         try:
             print(f"Fetching details for token: {property_token}...")
-            response = requests.get(self.base_url, params=params, timeout=15)
+            upstream_calls["details"] += 1
+            response = self.session.get(self.base_url, params=params, timeout=self.timeout)
             response.raise_for_status()
             data = response.json()
             if data:
@@ -125,4 +147,18 @@ class HotelSearchAPI:
             return data
         except requests.exceptions.RequestException as e:
             print(f"Error fetching detail: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+_search_api = None
+_search_api_lock = threading.Lock()
+
+
+def get_search_api():
+    """Process-wide HotelSearchAPI sharing the pooled HTTP session."""
+    global _search_api
+    if _search_api is None:
+        with _search_api_lock:
+            if _search_api is None:
+                _search_api = HotelSearchAPI(os.getenv("SERPAPI_KEY"))
+    return _search_api
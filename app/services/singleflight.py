@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import threading
+import time
+
+from .. import database
+
+LEASE_TTL = float(os.getenv("FETCH_LEASE_TTL", "30"))
+WAIT_TIMEOUT = float(os.getenv("FETCH_WAIT_TIMEOUT", "30"))
+POLL_INTERVAL = 0.15
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def coalesce(key, fetch, reload=None, lease_ttl=LEASE_TTL, wait_timeout=WAIT_TIMEOUT):
+    """Run ``fetch`` at most once per ``key`` across threads and worker processes.
+
+    ``reload`` returns the fresh cached value (or None). The leader calls it
+    once more before fetching, and followers call it after the leader is done,
+    so everyone reads the same row the leader just wrote.
+    """
+    reload = reload or (lambda: None)
+
+    with _inflight_lock:
+        done = _inflight.get(key)
+        is_leader = done is None
+        if is_leader:
+            done = _inflight[key] = threading.Event()
+
+    if not is_leader:
+        done.wait(wait_timeout)
+        return reload()
+
+    try:
+        return _lead(key, fetch, reload, lease_ttl, wait_timeout)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        done.set()
+
+
+def claim(key, ttl):
+    """Take ``key`` for ``ttl`` seconds across worker processes, without
+    releasing it: True for the first caller of each period, e.g. to run a
+    periodic job in one process only."""
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    try:
+        return _acquire_lease(database.get_lease_db(), key, owner, ttl)
+    except sqlite3.Error as exc:
+        print(f"Lease error ({key}): {exc}")
+        return False
+
+
+def _lead(key, fetch, reload, lease_ttl, wait_timeout):
+    if database.get_db().in_transaction:
+        # The caller's uncommitted writes hold the write lock this thread's
+        # lease connection would wait on: coalesce within the process only.
+        print(f"Lease skipped ({key}): transaction open")
+        cached = reload()
+        return cached if cached is not None else fetch()
+    # Leases commit on their own connection, never the caller's transaction.
+    db = database.get_lease_db()
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    deadline = time.monotonic() + wait_timeout
+
+    while True:
+        try:
+            acquired = _acquire_lease(db, key, owner, lease_ttl)
+        except sqlite3.Error as exc:
+            print(f"Lease error ({key}): {exc}")
+            return fetch()
+
+        if acquired:
+            try:
+                cached = reload()
+                if cached is not None:
+                    return cached
+                return fetch()
+            finally:
+                _release_lease(db, key, owner)
+
+        # Another worker process is fetching this key: wait for its lease to go.
+        time.sleep(POLL_INTERVAL)
+        if not _lease_held(db, key) or time.monotonic() > deadline:
+            return reload()
+
+
+def _acquire_lease(db, key, owner, lease_ttl):
+    now = time.time()
+    cur = db.execute(
+        """
+        INSERT INTO fetch_leases (lease_key, owner, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(lease_key) DO UPDATE
+            SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE fetch_leases.expires_at < ?
+        """,
+        (key, owner, now + lease_ttl, now),
+    )
+    db.commit()
+    return cur.rowcount == 1
+
+
+def _release_lease(db, key, owner):
+    try:
+        db.execute(
+            "DELETE FROM fetch_leases WHERE lease_key = ? AND owner = ?", (key, owner)
+        )
+        db.commit()
+    except sqlite3.Error as exc:
+        print(f"Lease release error ({key}): {exc}")
+
+
+def _lease_held(db, key):
+    row = db.execute(
+        "SELECT 1 FROM fetch_leases WHERE lease_key = ? AND expires_at >= ?",
+        (key, time.time()),
+    ).fetchone()
+    return row is not None
@@ -0,0 +1,77 @@
+import json
+import re
+
+from flask import Response, stream_with_context
+
+
+def sse_event(event, data):
+    """One Server-Sent Events frame carrying ``data`` as JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    """Stream an iterable of frames, keeping the request context alive."""
+    # X-Accel-Buffering: nginx would otherwise hold the frames back.
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class JsonStringField:
+    """Decodes one string field of a JSON object while its text arrives in chunks.
+
+    feed() returns the part of the field's value readable so far, so a reply
+    the model writes as JSON can be shown before the object is complete.
+    """
+
+    ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, name):
+        self._opening = re.compile(r'"%s"\s*:\s*"' % re.escape(name))
+        self._buffer = ""
+        self._pos = None  # next undecoded character of the value
+        self.done = False
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        if self.done:
+            return ""
+        if self._pos is None:
+            match = self._opening.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        buffer, i, out = self._buffer, self._pos, []
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            # An escape split across chunks waits for the next one.
+            if i + 1 >= len(buffer):
+                break
+            if buffer[i + 1] != "u":
+                out.append(self.ESCAPES.get(buffer[i + 1], buffer[i + 1]))
+                i += 2
+                continue
+            if i + 6 > len(buffer):
+                break
+            code = int(buffer[i + 2:i + 6], 16)
+            if 0xD800 <= code < 0xDC00:  # high surrogate: needs its pair
+                if i + 12 > len(buffer):
+                    break
+                low = int(buffer[i + 8:i + 12], 16)
+                out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                i += 12
+                continue
+            out.append(chr(code))
+            i += 6
+        self._pos = i
+        return "".join(out)
@@ -0,0 +1,70 @@
+import json
+
+from flask import g, session
+
+from .. import database
+
+
+class UserContext:
+    """The signed-in user's row and parsed preferences for one request.
+
+    ``preferences`` is None when the user has not set any. The dict is shared
+    by everything in the request; copy it before changing it.
+    """
+
+    def __init__(self, row):
+        self.row = row
+        self.id = row["id"] if row else None
+        self.preferences = None
+        if row and row["preferences"]:
+            try:
+                self.preferences = json.loads(row["preferences"])
+            except ValueError as exc:
+                print(f"Invalid preferences for user {self.id}: {exc}")
+
+    def __bool__(self):
+        return self.row is not None
+
+    def template_user(self):
+        """The ``user`` dict templates expect (row columns + preferences_dict)."""
+        if not self.row:
+            return None
+        user = {k: self.row[k] for k in self.row.keys() if k != "password"}
+        user["preferences_dict"] = self.preferences or {}
+        return user
+
+
+def current_user():
+    """UserContext for the session's user, loaded at most once per request."""
+    if "user_context" not in g:
+        row = None
+        if "user_id" in session:
+            row = database.get_db().execute(
+                "SELECT * FROM users WHERE id = ?", (session["user_id"],)
+            ).fetchone()
+        g.user_context = UserContext(row)
+    return g.user_context
+
+
+def current_preferences():
+    return current_user().preferences
+
+
+def invalidate():
+    """Forget the loaded user; the next current_user() reads the row again."""
+    g.pop("user_context", None)
+
+
+def remember_preferences(prefs):
+    """Use ``prefs`` for the rest of the request; the caller writes them."""
+    current_user().preferences = prefs
+
+
+def save_preferences(prefs):
+    db = database.get_db()
+    db.execute(
+        "UPDATE users SET preferences = ? WHERE id = ?",
+        (json.dumps(prefs), session["user_id"]),
+    )
+    db.commit()
+    invalidate()
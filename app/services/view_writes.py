@@ -0,0 +1,107 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from .. import database
+
+# "sync": one transaction before the page renders. "deferred": queued and
+# written in batches by a background thread after the response is sent.
+MODE = os.getenv("VIEW_WRITES", "sync").lower()
+BATCH_SIZE = int(os.getenv("VIEW_WRITE_BATCH", "200"))
+FLUSH_INTERVAL = float(os.getenv("VIEW_WRITE_INTERVAL", "0.5"))  # seconds a batch may wait
+
+UPSERT_VIEW = """
+    INSERT INTO recently_viewed (user_id, property_token, preview_data, visited_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, property_token) DO UPDATE SET
+        visited_at = excluded.visited_at, preview_data = excluded.preview_data
+"""
+UPDATE_PREFERENCES = "UPDATE users SET preferences = ? WHERE id = ?"
+
+
+def apply(db, views, preferences):
+    """Write history rows and preference updates in a single transaction."""
+    with db:
+        if views:
+            db.executemany(UPSERT_VIEW, views)
+        if preferences:
+            db.executemany(UPDATE_PREFERENCES, preferences)
+
+
+def record_view(user_id, property_token, preview, preferences=None):
+    """Persist a hotel page view, plus the preferences passive learning changed.
+
+    The visit time is taken now, so a deferred write keeps the real order.
+    """
+    visited_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    views = [(user_id, property_token, json.dumps(preview, ensure_ascii=False), visited_at)]
+    prefs = [(json.dumps(preferences), user_id)] if preferences is not None else []
+
+    if MODE == "deferred":
+        _ensure_worker()
+        _queue.put((views, prefs))
+    else:
+        apply(database.get_db(), views, prefs)
+
+
+_queue = queue.Queue()
+_worker = None
+_worker_app = None
+_worker_lock = threading.Lock()
+
+
+def _ensure_worker():
+    global _worker, _worker_app
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker_app = current_app._get_current_object()
+            _worker = threading.Thread(target=_run, name="view-writes", daemon=True)
+            _worker.start()
+
+
+def _next_batch():
+    batch = [_queue.get()]
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(batch) < BATCH_SIZE:
+        try:
+            batch.append(_queue.get(timeout=max(deadline - time.monotonic(), 0)))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write(batch):
+    views = [row for item_views, _ in batch for row in item_views]
+    prefs = [row for _, item_prefs in batch for row in item_prefs]
+    try:
+        with _worker_app.app_context():
+            apply(database.get_db(), views, prefs)
+    except Exception as exc:
+        print(f"View write error ({len(views)} views dropped): {exc}")
+
+
+def _run():
+    while True:
+        _write(_next_batch())
+
+
+def flush_pending():
+    """Write whatever is still queued (at exit, or before reading it back)."""
+    batch = []
+    while True:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    if batch and _worker_app is not None:
+        _write(batch)
+    return len(batch)
+
+
+atexit.register(flush_pending)
@@ -50,6 +50,47 @@ function showToastNow(message, type, toastContainer) {
     toastEl.addEventListener('hidden.bs.toast', () => toastEl.remove());
 }
 
+// POST a JSON body to a Server-Sent Events endpoint and call onEvent(name, data)
+// for each event as it arrives (EventSource only does GET).
+window.postEventStream = async function(url, body, onEvent) {
+    const resp = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify(body)
+    });
+    if (!resp.ok || !resp.body) throw new Error(`HTTP ${resp.status}`);
+
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end;
+        while ((end = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            let event = 'message';
+            let data = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+};
+
+// A streamed chat_search reply reaches the session history through this call.
+window.saveChatTurn = function(turn) {
+    return fetch('/api/save_chat_turn', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ turn })
+    }).catch(e => console.error(e));
+};
+
 document.addEventListener('DOMContentLoaded', () => {
     restoreSearchState();
 
@@ -48,7 +48,8 @@
         }
     };
 
-    function renderMessage(msg) {
+    // existing: a message element to redraw (a reply still streaming in).
+    function renderMessage(msg, existing) {
         let html = '';
         
         if (msg.role !== 'user') {
@@ -66,13 +67,16 @@
             html += `<div>${bodyContent}</div>`;
         }
 
-        const div = document.createElement('div');
+        const div = existing || document.createElement('div');
         div.className = msg.role === 'user' ? 'msg-user' : 'msg-bot';
         div.innerHTML = html;
-        div.style.animation = "fadeIn 0.3s ease-out"; 
-        
-        content.appendChild(div);
+
+        if (!existing) {
+            div.style.animation = "fadeIn 0.3s ease-out"; 
+            content.appendChild(div);
+        }
         content.scrollTop = content.scrollHeight;
+        return div;
     }
 
     window.renderMessage = renderMessage;
@@ -175,7 +179,7 @@ function updateCompareBar() {
     
     let htmlContent = '';
     window.compareList.forEach((hotel, index) => {
-        let imgSrc = (hotel.images && hotel.images.length > 0) ? hotel.images[0].original_image : 'https://via.placeholder.com/80x50';
+        let imgSrc = hotel.image || 'https://via.placeholder.com/80x50';
         htmlContent += `
             <div class="text-center mx-3 fade-in">
                 <img src="${imgSrc}" style="width:70px; height:45px; object-fit:cover; border-radius:6px; border:1px solid #ccc; margin-bottom: 4px;">
@@ -217,15 +221,12 @@ function showCompareModal() {
     const renderCheck = (cond) => cond ? '<i class="fas fa-check text-success"></i>' : '<i class="fas fa-times text-muted opacity-25"></i>';
     
     const hasAmenity = (hotel, key) => {
-        if (!hotel || !hotel.amenities) return false;
-        return hotel.amenities.some(a => {
-            const name = (typeof a === 'string') ? a : (a.name || '');
-            return name.toLowerCase().includes(key.toLowerCase());
-        });
+        if (!hotel || !hotel.amenity_names) return false;
+        return hotel.amenity_names.some(name => name.toLowerCase().includes(key.toLowerCase()));
     };
 
-    const getImg = (h) => (h.images && h.images.length > 0) ? h.images[0].original_image : 'https://via.placeholder.com/400x300';
-    const getPrice = (h) => (h.rate_per_night && h.rate_per_night.lowest) ? h.rate_per_night.lowest : 'Liên hệ';
+    const getImg = (h) => h.image || 'https://via.placeholder.com/400x300';
+    const getPrice = (h) => h.price_text || 'Liên hệ';
 
     let html = `
         <thead>
@@ -252,24 +253,24 @@ function showCompareModal() {
             <tr>
                 <td>Đánh giá</td>
                 <td>
-                    <span class="badge bg-dark">${h1.overall_rating || 'N/A'}/5</span>
+                    <span class="badge bg-dark">${h1.rating || 'N/A'}/5</span>
                     <div class="small text-muted mt-1">${h1.reviews || 0} reviews</div>
                 </td>
                 <td>
-                    <span class="badge bg-dark">${h2.overall_rating || 'N/A'}/5</span>
+                    <span class="badge bg-dark">${h2.rating || 'N/A'}/5</span>
                     <div class="small text-muted mt-1">${h2.reviews || 0} reviews</div>
                 </td>
                 ${h3 ? `
                 <td>
-                    <span class="badge bg-dark">${h3.overall_rating || 'N/A'}/5</span>
+                    <span class="badge bg-dark">${h3.rating || 'N/A'}/5</span>
                     <div class="small text-muted mt-1">${h3.reviews || 0} reviews</div>
                 </td>` : ''}
             </tr>
             <tr>
                 <td>Hạng sao</td>
-                <td class="text-warning">${'<i class="fas fa-star"></i>'.repeat(h1.extracted_hotel_class || 0)}</td>
-                <td class="text-warning">${'<i class="fas fa-star"></i>'.repeat(h2.extracted_hotel_class || 0)}</td>
-                ${h3 ? `<td class="text-warning">${'<i class="fas fa-star"></i>'.repeat(h3.extracted_hotel_class || 0)}</td>` : ''}
+                <td class="text-warning">${'<i class="fas fa-star"></i>'.repeat(h1.hotel_class || 0)}</td>
+                <td class="text-warning">${'<i class="fas fa-star"></i>'.repeat(h2.hotel_class || 0)}</td>
+                ${h3 ? `<td class="text-warning">${'<i class="fas fa-star"></i>'.repeat(h3.hotel_class || 0)}</td>` : ''}
             </tr>
             <tr class="bg-light">
                 <td colspan="${h3 ? 4 : 3}" class="fw-bold text-start ps-3 text-uppercase small text-muted">Tiện nghi nổi bật</td>
@@ -63,7 +63,8 @@ const content = document.getElementById('chatContent');
 
 let isExpanded = false;
 
-function renderMessage(msg) {
+// existing: a message element to redraw (a reply still streaming in).
+function renderMessage(msg, existing) {
     let html = '';
     const content = document.getElementById('chatContent');
 
@@ -82,9 +83,10 @@ function renderMessage(msg) {
         bodyHtml += `<div>${marked.parse(introText)}</div>`;
         
         msg.hotels.slice(0, 4).forEach(h => {
-            let img = (h.images && h.images.length > 0) ? h.images[0].original_image : 'https://via.placeholder.com/90';
-            let price = (h.rate_per_night && h.rate_per_night.lowest) ? h.rate_per_night.lowest : 'Liên hệ';
-            let stars = h.overall_rating ? `<span class="text-warning ms-2" style="font-size:0.8rem"><i class="fas fa-star"></i> ${h.overall_rating}</span>` : '';
+            let img = h.image || ((h.images && h.images.length > 0) ? h.images[0].original_image : 'https://via.placeholder.com/90');
+            let price = h.price_text || ((h.rate_per_night && h.rate_per_night.lowest) ? h.rate_per_night.lowest : 'Liên hệ');
+            let rating = h.rating || h.overall_rating;
+            let stars = rating ? `<span class="text-warning ms-2" style="font-size:0.8rem"><i class="fas fa-star"></i> ${rating}</span>` : '';
             
             bodyHtml += `
                 <a href="/hotel/${h.property_token}" class="mini-hotel-card">
@@ -107,14 +109,16 @@ function renderMessage(msg) {
 
     html += bodyHtml;
 
-    const div = document.createElement('div');
+    const div = existing || document.createElement('div');
     div.className = msg.role === 'user' ? 'msg-user' : 'msg-bot';
-    
-    div.style.animation = "fadeIn 0.3s ease-out"; 
     div.innerHTML = html;
-    
-    content.appendChild(div);
+
+    if (!existing) {
+        div.style.animation = "fadeIn 0.3s ease-out"; 
+        content.appendChild(div);
+    }
     content.scrollTop = content.scrollHeight;
+    return div;
 }
 
 document.addEventListener('DOMContentLoaded', async () => {
@@ -259,27 +263,31 @@ async function handleChat() {
     input.value = '';
     showTyping();
 
+    // The reply is drawn as it streams in, then redrawn from the final result.
+    let bubble = null;
+    let replyText = '';
     try {
-        const resp = await fetch('/api/chat_search', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ message: text })
+        await postEventStream('/api/chat_search/stream', { message: text }, (event, data) => {
+            removeTyping();
+            if (event === 'delta') {
+                replyText += data.text;
+                bubble = renderMessage({ role: 'ai', content: replyText }, bubble);
+            } else if (event === 'result') {
+                const msgData = {
+                    role: 'ai',
+                    type: data.type,
+                    content: data.reply_text,
+                    hotels: data.hotels
+                };
+                bubble = renderMessage(msgData, bubble);
+                if (data.turn) saveChatTurn(data.turn);
+            }
         });
-        const data = await resp.json();
-        removeTyping();
-
-        const msgData = {
-            role: 'ai',
-            type: data.type,
-            content: data.reply_text,
-            hotels: data.hotels
-        };
-        renderMessage(msgData);
 
     } catch (e) {
         console.error(e);
         removeTyping();
-        renderMessage({ role: 'ai', content: "Mạng lỗi rồi, thử lại sau nha!" });
+        renderMessage({ role: 'ai', content: "Mạng lỗi rồi, thử lại sau nha!" }, bubble);
     }
 }
 
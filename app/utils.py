@@ -2,12 +2,15 @@ import json
 import re
 import hashlib
 from collections import Counter
+from functools import lru_cache
 from typing import Dict, List, Optional
 
 from . import database
+from .services.keyword_matcher import KeywordMatcher
+from .services.location import cache_key, find_city_in_text
 
 def generate_search_hash(city, price, rating, amenities):
-    c_clean = str(city).strip().lower() if city else ""
+    c_clean = cache_key(city) if city else ""
     p_clean = str(price).strip().lower() if price else ""
     r_clean = str(rating).strip().lower() if rating else ""
     
@@ -36,37 +39,13 @@ def get_user_recent_city(user_id: int) -> Optional[str]:
     if not rows:
         return None
 
-    city_mapping = {
-        "hà nội": "Hà Nội",
-        "hanoi": "Hà Nội",
-        "ha noi": "Hà Nội",
-        "đà nẵng": "Đà Nẵng",
-        "da nang": "Đà Nẵng",
-        "hồ chí minh": "TP. Hồ Chí Minh",
-        "ho chi minh": "TP. Hồ Chí Minh",
-        "sai gon": "TP. Hồ Chí Minh",
-        "đà lạt": "Đà Lạt",
-        "da lat": "Đà Lạt",
-        "nha trang": "Nha Trang",
-        "huế": "Huế",
-        "hue": "Huế",
-        "sa pa": "Sa Pa",
-        "sapa": "Sa Pa",
-        "phú quốc": "Phú Quốc",
-        "phu quoc": "Phú Quốc",
-        "vũng tàu": "Vũng Tàu",
-        "vung tau": "Vũng Tàu",
-    }
-
     cities_found: List[str] = []
     for row in rows:
         try:
             data = json.loads(row["preview_data"])
-            address = data.get("address", "").lower()
-            for key, val in city_mapping.items():
-                if key in address:
-                    cities_found.append(val)
-                    break
+            city = find_city_in_text(data.get("address", ""))
+            if city:
+                cities_found.append(city)
         except Exception:
             continue
 
@@ -77,45 +56,43 @@ def get_user_recent_city(user_id: int) -> Optional[str]:
     return most_common[0][0] if most_common else None
 
 
-def analyze_vibe_from_amenities(amenities_list: List[str]) -> Optional[str]:
-    vibe_keywords: Dict[str, List[str]] = {
-        "healing": [
-            "spa",
-            "massage",
-            "yoga",
-            "garden",
-            "meditation",
-            "sauna",
-            "steam room",
-            "hot tub",
-        ],
-        "adventure": [
-            "fitness",
-            "gym",
-            "hiking",
-            "diving",
-            "bike",
-            "canoe",
-            "windsurfing",
-        ],
-        "luxury": [
-            "butler",
-            "limousine",
-            "infinity pool",
-            "wine",
-            "champagne",
-            "club",
-        ],
-        "business": ["meeting", "conference", "business centre", "printer", "fax"],
-    }
+# English amenity keywords hinting at a travel vibe (passive vibe learning).
+VIBE_SIGNALS: Dict[str, List[str]] = {
+    "healing": [
+        "spa",
+        "massage",
+        "yoga",
+        "garden",
+        "meditation",
+        "sauna",
+        "steam room",
+        "hot tub",
+    ],
+    "adventure": [
+        "fitness",
+        "gym",
+        "hiking",
+        "diving",
+        "bike",
+        "canoe",
+        "windsurfing",
+    ],
+    "luxury": [
+        "butler",
+        "limousine",
+        "infinity pool",
+        "wine",
+        "champagne",
+        "club",
+    ],
+    "business": ["meeting", "conference", "business centre", "printer", "fax"],
+}
 
-    am_text = " ".join([str(a).lower() for a in amenities_list])
-    scores = {k: 0 for k in vibe_keywords}
 
-    for vibe, keywords in vibe_keywords.items():
-        for kw in keywords:
-            if kw in am_text:
-                scores[vibe] += 1
+def analyze_vibe_from_amenities(amenities_list: List[str]) -> Optional[str]:
+    am_text = " ".join([str(a).lower() for a in amenities_list])
+    found = VIBE_SIGNAL_MATCHER.find_all(am_text)
+    scores = {vibe: sum(1 for kw in keywords if kw in found) for vibe, keywords in VIBE_SIGNALS.items()}
 
     best_vibe = max(scores, key=scores.get)
     if scores[best_vibe] >= 2:
@@ -259,14 +236,50 @@ def get_ai_preferences(vibe, companion, budget):
     suggestion["amenities"] = list(set(suggestion["amenities"]))
     return suggestion
 
-def calculate_match_score(user_prefs: Dict, hotel_data: Dict) -> Dict:
-    if not user_prefs or not hotel_data:
-        return {"score": 0, "reason": "Chưa đủ dữ liệu để đánh giá."}
+# Keyword rules of the match score. Amenity text is lowercase SerpAPI (hl=vi)
+# amenity names; a keyword listed twice for a vibe counts twice.
+VIBE_KEYWORDS = {
+    "healing": ["spa", "bể bơi trong nhà", "bể bơi ngoài trời", "bể bơi", "có biển", "điều hòa nhiệt độ"],
+    "adventure": ["trung tâm thể dục", "bể bơi ngoài trời", "có biển", "bể bơi", "bể bơi trong nhà", "bể bơi ngoài trời"],
+    "luxury": ["spa", "bar", "dịch vụ phòng", "nhà hàng", "bể bơi", "bể bơi trong nhà", "bể bơi ngoài trời"],
+    "business": ["wi-fi miễn phí", "đỗ xe", "đỗ xe miễn phí", "điều hòa nhiệt độ", "nhà hàng"]
+}
+
+COMPANION_KEYWORDS = {
+    "family": ["phù hợp với trẻ em", "bữa sáng miễn phí", "bể bơi"],
+    "couple": ["spa", "bar", "dịch vụ phòng", "nhà hàng"],
+    "business": ["wi-fi miễn phí", "trung tâm thể dục", "đỗ xe miễn phí"],
+    "solo": ["wi-fi miễn phí", "bar"]
+}
+
+BUDGET_RANGES = {
+    "low": (0, 800000),
+    "mid": (800000, 2500000),
+    "high": (2500000, 99999999)
+}
+
+BREAKFAST_KEYWORD = "free breakfast"
+
+NO_MATCH_DATA = {"score": 0, "reason": "Chưa đủ dữ liệu để đánh giá."}
+
+# One bit per distinct scoring keyword, so a hotel's amenities reduce to an int.
+SCORE_KEYWORDS = list(dict.fromkeys(
+    [kw for kws in VIBE_KEYWORDS.values() for kw in kws]
+    + [kw for kws in COMPANION_KEYWORDS.values() for kw in kws]
+    + [BREAKFAST_KEYWORD]
+))
+SCORE_KEYWORD_BITS = {kw: 1 << i for i, kw in enumerate(SCORE_KEYWORDS)}
+
+SCORE_MATCHER = KeywordMatcher(SCORE_KEYWORDS)
+VIBE_SIGNAL_MATCHER = KeywordMatcher([kw for kws in VIBE_SIGNALS.values() for kw in kws])
+
+
+def _score_inputs(hotel_data: Dict):
+    """(amenity_text, price, rating) of a slim record or a raw SerpAPI payload."""
+    if "amenity_text" in hotel_data:
+        # Slim record from services.normalize: already parsed at fetch time.
+        return hotel_data["amenity_text"], hotel_data.get("price") or 0, hotel_data.get("rating") or 0.0
 
-    user_vibe = user_prefs.get("vibe", "adventure")
-    user_budget = user_prefs.get("budget", "mid")
-    user_companion = user_prefs.get("companion", "solo")
-    
     amenities = []
     raw_amenities = hotel_data.get("amenities", [])
     for a in raw_amenities:
@@ -277,46 +290,47 @@ def calculate_match_score(user_prefs: Dict, hotel_data: Dict) -> Dict:
     price_str = str(hotel_data.get("rate_per_night", {}).get("lowest", "0"))
     price = int(re.sub(r"[^\d]", "", price_str)) if price_str else 0
     rating = float(hotel_data.get("overall_rating", 0) or 0)
+    return amenities_text, price, rating
+
+
+def _final_reason(score: int, reasons: List[str]) -> str:
+    if score >= 80:
+        main_point = reasons[0] if reasons else "Rất đáng trải nghiệm"
+        return f"Tuyệt vời ({score}%)! {main_point}."
+    if score >= 50:
+        main_point = reasons[0] if reasons else "Khá ổn"
+        return f"Phù hợp ({score}%). {main_point}."
+    return f"Chưa thực sự khớp ({score}%). {reasons[-1] if reasons else 'Thiếu tiện nghi mong muốn'}."
+
+
+def calculate_match_score(user_prefs: Dict, hotel_data: Dict) -> Dict:
+    if not user_prefs or not hotel_data:
+        return dict(NO_MATCH_DATA)
+
+    user_vibe = user_prefs.get("vibe", "adventure")
+    user_budget = user_prefs.get("budget", "mid")
+    user_companion = user_prefs.get("companion", "solo")
+
+    amenities_text, price, rating = _score_inputs(hotel_data)
 
     score = 0
     reasons = []
 
-    vibe_mapping = {
-        "healing": ["spa", "indoor pool", "outdoor pool", "pool", "beach access", "air conditioning"],
-        "adventure": ["fitness center", "outdoor pool", "beach access", "pool", "indoor pool", "outdoor pool"],
-        "luxury": ["spa", "bar", "room service", "restaurant", "pool", "indoor pool", "outdoor pool"],
-        "business": ["free wi-fi", "parking", "free parking", "air conditioning", "restaurant"]
-    }
+    found = SCORE_MATCHER.find_all(amenities_text)
 
-    vibe_mapping_vi = {
-        "healing": ["spa", "bể bơi trong nhà", "bể bơi ngoài trời", "bể bơi", "có biển", "điều hòa nhiệt độ"],
-        "adventure": ["trung tâm thể dục", "bể bơi ngoài trời", "có biển", "bể bơi", "bể bơi trong nhà", "bể bơi ngoài trời"],
-        "luxury": ["spa", "bar", "dịch vụ phòng", "nhà hàng", "bể bơi", "bể bơi trong nhà", "bể bơi ngoài trời"],
-        "business": ["wi-fi miễn phí", "đỗ xe", "đỗ xe miễn phí", "điều hòa nhiệt độ", "nhà hàng"]
-    }
-    
-    target_kws = vibe_mapping.get(user_vibe, [])
-    target_kws = vibe_mapping_vi.get(user_vibe, [])
-    found_kws = []
-    for kw in target_kws:
-        if kw in amenities_text:
-            found_kws.append(kw)
+    target_kws = VIBE_KEYWORDS.get(user_vibe, [])
+    found_kws = [kw for kw in target_kws if kw in found]
     
     if found_kws:
         score += min(len(found_kws) * 10, 40)
         kw_display = ", ".join([k.title() for k in found_kws[:2]])
         reasons.append(f"Có tiện nghi {kw_display} hợp gu {user_vibe.capitalize()}")
     else:
-        if "free breakfast" in amenities_text:
+        if BREAKFAST_KEYWORD in found:
             score += 5
             reasons.append("Có miễn phí bữa sáng")
 
-    budget_ranges = {
-        "low": (0, 800000),
-        "mid": (800000, 2500000),
-        "high": (2500000, 99999999)
-    }
-    min_b, max_b = budget_ranges.get(user_budget, (0, 99999999))
+    min_b, max_b = BUDGET_RANGES.get(user_budget, (0, 99999999))
     
     if min_b <= price <= max_b:
         score += 30
@@ -328,24 +342,8 @@ def calculate_match_score(user_prefs: Dict, hotel_data: Dict) -> Dict:
         score += 10 
         reasons.append("Giá tiết kiệm hơn dự kiến")
 
-    companion_mapping = {
-        "family": ["child-friendly", "free breakfast", "pool"],
-        "couple": ["spa", "bar", "room service", "restaurant"],
-        "business": ["free wi-fi", "fitness center", "free parking"],
-        "solo": ["free wi-fi", "bar"]
-    }
-    companion_mapping_vi = {
-        "family": ["phù hợp với trẻ em", "bữa sáng miễn phí", "bể bơi"],
-        "couple": ["spa", "bar", "dịch vụ phòng", "nhà hàng"],
-        "business": ["wi-fi miễn phí", "trung tâm thể dục", "đỗ xe miễn phí"],
-        "solo": ["wi-fi miễn phí", "bar"]
-    }
-    comp_kws = companion_mapping.get(user_companion, [])
-    comp_kws = companion_mapping_vi.get(user_companion, [])
-    found_comp = []
-    for kw in comp_kws:
-        if kw in amenities_text:
-            found_comp.append(kw)
+    comp_kws = COMPANION_KEYWORDS.get(user_companion, [])
+    found_comp = [kw for kw in comp_kws if kw in found]
     
     if found_comp:
         score += 20
@@ -358,17 +356,137 @@ def calculate_match_score(user_prefs: Dict, hotel_data: Dict) -> Dict:
     
     score = max(0, min(100, score))
 
-    final_reason = ""
-    if score >= 80:
-        main_point = reasons[0] if reasons else "Rất đáng trải nghiệm"
-        final_reason = f"Tuyệt vời ({score}%)! {main_point}."
-    elif score >= 50:
-        main_point = reasons[0] if reasons else "Khá ổn"
-        final_reason = f"Phù hợp ({score}%). {main_point}."
-    else:
-        final_reason = f"Chưa thực sự khớp ({score}%). {reasons[-1] if reasons else 'Thiếu tiện nghi mong muốn'}."
+    return {"score": score, "reason": _final_reason(score, reasons)}
+
+
+@lru_cache(maxsize=4096)
+def _keyword_mask(amenities_text: str) -> int:
+    mask = 0
+    for kw in SCORE_MATCHER.find_all(amenities_text):
+        mask |= SCORE_KEYWORD_BITS.get(kw, 0)
+    return mask
 
-    return {"score": score, "reason": final_reason}
+
+@lru_cache(maxsize=256)
+def _compile_score_rules(vibe, budget, companion) -> Dict:
+    """Resolve the preference tables once into keyword bit masks."""
+    vibe_bits = [(kw, SCORE_KEYWORD_BITS[kw]) for kw in VIBE_KEYWORDS.get(vibe, [])]
+    comp_mask = 0
+    for kw in COMPANION_KEYWORDS.get(companion, []):
+        comp_mask |= SCORE_KEYWORD_BITS[kw]
+    breakfast_bit = SCORE_KEYWORD_BITS[BREAKFAST_KEYWORD]
+    relevant = comp_mask | breakfast_bit
+    for _, bit in vibe_bits:
+        relevant |= bit
+
+    return {
+        "vibe": vibe,
+        "budget": budget,
+        "companion": companion,
+        "vibe_bits": vibe_bits,
+        "comp_mask": comp_mask,
+        "breakfast_bit": breakfast_bit,
+        "relevant": relevant,
+        # (relevant mask, budget case, rating points) -> (score, reason)
+        "outcomes": {},
+        "budget_range": BUDGET_RANGES.get(budget, (0, 99999999)),
+    }
+
+
+def _amenity_part(rules: Dict, mask: int):
+    """Points and reasons that depend only on which keywords a hotel has."""
+    found = [kw for kw, bit in rules["vibe_bits"] if mask & bit]
+    points = 0
+    vibe_reason = None
+    if found:
+        points += min(len(found) * 10, 40)
+        kw_display = ", ".join([k.title() for k in found[:2]])
+        vibe_reason = f"Có tiện nghi {kw_display} hợp gu {rules['vibe'].capitalize()}"
+    elif mask & rules["breakfast_bit"]:
+        points += 5
+        vibe_reason = "Có miễn phí bữa sáng"
+
+    comp_reason = None
+    if mask & rules["comp_mask"]:
+        points += 20
+        comp_reason = f"Tiện nghi phù hợp cho {rules['companion'].capitalize()}"
+    return points, vibe_reason, comp_reason
+
+
+def _budget_case(rules: Dict, prices: List[int]) -> List[int]:
+    min_b, max_b = rules["budget_range"]
+    budget = rules["budget"]
+    cases = []
+    for price in prices:
+        if min_b <= price <= max_b:
+            cases.append(0)
+        elif budget == "low" and price > max_b:
+            cases.append(1)
+        elif budget == "high" and price < 1000000:
+            cases.append(2)
+        else:
+            cases.append(3)
+    return cases
+
+
+_BUDGET_OUTCOMES = (
+    (30, "Giá phù hợp ngân sách"),
+    (-10, "Giá hơi cao so với ngân sách"),
+    (10, "Giá tiết kiệm hơn dự kiến"),
+    (0, None),
+)
+
+
+def score_hotels(user_prefs: Dict, hotels: List[Dict]) -> List[Dict]:
+    """Batch version of ``calculate_match_score``; same result for every hotel.
+
+    Hotels are split into price / rating / keyword-bitmask columns, each column
+    is computed in one pass (the bitmask is cached per amenity text), and the
+    score and reason are built once per distinct (bitmask, budget case, rating
+    band) per preference profile instead of once per hotel.
+    """
+    if not user_prefs:
+        return [dict(NO_MATCH_DATA) for _ in hotels]
+
+    rules = _compile_score_rules(
+        user_prefs.get("vibe", "adventure"),
+        user_prefs.get("budget", "mid"),
+        user_prefs.get("companion", "solo"),
+    )
+
+    results = [None] * len(hotels)
+    present, texts, prices, ratings = [], [], [], []
+    for i, hotel in enumerate(hotels):
+        if not hotel:
+            results[i] = dict(NO_MATCH_DATA)
+            continue
+        if "amenity_text" in hotel:
+            text, price, rating = hotel["amenity_text"], hotel.get("price") or 0, hotel.get("rating") or 0.0
+        else:
+            text, price, rating = _score_inputs(hotel)
+        present.append(i)
+        texts.append(text)
+        prices.append(price)
+        ratings.append(rating)
+
+    relevant = rules["relevant"]
+    masks = [_keyword_mask(text) & relevant for text in texts]
+    budget_cases = _budget_case(rules, prices)
+    rating_points = [10 if r >= 4.5 else 5 if r >= 4.0 else 0 for r in ratings]
+
+    outcomes = rules["outcomes"]
+    for i, mask, case, r_points in zip(present, masks, budget_cases, rating_points):
+        key = (mask, case, r_points)
+        outcome = outcomes.get(key)
+        if outcome is None:
+            points, vibe_reason, comp_reason = _amenity_part(rules, mask)
+            b_points, b_reason = _BUDGET_OUTCOMES[case]
+            reasons = [r for r in (vibe_reason, b_reason, comp_reason) if r]
+            score = max(0, min(100, points + b_points + r_points))
+            outcome = outcomes[key] = (score, _final_reason(score, reasons))
+        results[i] = {"score": outcome[0], "reason": outcome[1]}
+
+    return results
 
 
 def clean_json_text(text: str) -> str:
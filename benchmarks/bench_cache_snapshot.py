@@ -0,0 +1,65 @@
+"""Warming a fresh node from a cache snapshot.
+
+Usage: python benchmarks/bench_cache_snapshot.py [--searches 200] [--hotels 4000]
+
+Fills search_cache / hotel_cache of one database, times cache_snapshot's
+export to a file and its import into a freshly created database (which also
+rebuilds the local search index), and reports the snapshot size.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, database  # noqa: E402
+from app.services import cache_snapshot, cache_store  # noqa: E402
+from app.services.normalize import slim_hotel  # noqa: E402
+from bench_codec import fake_property  # noqa: E402
+
+CITIES = ["Đà Lạt", "Hà Nội", "Hội An", "Nha Trang", "Phú Quốc"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--hotels", type=int, default=4000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "snapshot.jsonl.gz")
+    rng = random.Random(5)
+
+    app = create_app()
+    app.config["DATABASE"] = os.path.join(tmp, "source.db")
+    with app.app_context():
+        database.init_db()
+        for i in range(args.searches):
+            city = CITIES[i % len(CITIES)]
+            hotels = [fake_property(rng, city, i * 20 + j) for j in range(20)]
+            value = {"params": {"city": city, "page": i}, "slim": [slim_hotel(h) for h in hotels]}
+            cache_store.set("search", f"q{i}", value, results=hotels)
+        for i in range(args.hotels):
+            hotel = fake_property(rng, CITIES[i % len(CITIES)], i)
+            cache_store.set("hotel", hotel["property_token"], {"data": hotel, "slim": slim_hotel(hotel)})
+
+        start = time.perf_counter()
+        with open(path, "wb") as out:
+            counts = cache_snapshot.export_snapshot(database.get_db(), out)
+        print(f"export  {time.perf_counter() - start:6.2f}s  {counts}")
+    print(f"snapshot {os.path.getsize(path) / 1e6:.1f} MB")
+
+    app.config["DATABASE"] = os.path.join(tmp, "fresh.db")
+    with app.app_context():
+        database.init_db()
+        start = time.perf_counter()
+        with open(path, "rb") as src:
+            counts = cache_snapshot.import_snapshot(database.get_db(), src)
+        print(f"import  {time.perf_counter() - start:6.2f}s  {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Hot hotel lookups: raw SELECT + decode per request vs. cache_store tiers.
+
+Usage: python benchmarks/bench_cache_tiers.py [--hotels 50] [--lookups 20000]
+
+"sqlite" is what hotel_detail / hotel_chat / generate_itinerary did on every
+request; "lru" serves decoded entries from the in-process tier; "kv" disables
+the LRU so every lookup goes through the (in-memory stand-in) KV tier.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, database  # noqa: E402
+from app.services import cache_store, codec  # noqa: E402
+from app.services.normalize import slim_hotel  # noqa: E402
+from bench_codec import fake_property  # noqa: E402
+
+
+def raw_lookup(token):
+    row = database.get_db().execute(
+        "SELECT data, slim, created_at FROM hotel_cache WHERE token = ?", (token,)
+    ).fetchone()
+    return codec.decode(row["data"])
+
+
+def tier_lookup(token):
+    return cache_store.get("hotel", token).value["data"]
+
+
+def timed(fn, tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        fn(token)
+    return (time.perf_counter() - start) / len(tokens) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=50)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config["DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    rng = random.Random(5)
+    with app.app_context():
+        database.init_db()
+        tokens = []
+        for i in range(args.hotels):
+            hotel = fake_property(rng, "Đà Lạt", i)
+            tokens.append(hotel["property_token"])
+            cache_store.set("hotel", hotel["property_token"], {"data": hotel, "slim": slim_hotel(hotel)})
+        # Skewed like real traffic: a few hotels get most of the views.
+        lookups = rng.choices(tokens, weights=[1 / (i + 1) for i in range(len(tokens))], k=args.lookups)
+
+        print(f"{args.hotels} hotels, {args.lookups} lookups (per lookup)")
+        print(f"sqlite  {timed(raw_lookup, lookups):8.1f}us")
+        cache_store._lru.clear()
+        print(f"lru     {timed(tier_lookup, lookups):8.1f}us")
+        cache_store.set_kv_backend(cache_store.MemoryKV())
+        cache_store._lru.max_entries = 0
+        print(f"kv      {timed(tier_lookup, lookups):8.1f}us")
+        print(cache_store.tier_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Time to the first words of a chat reply: blocking vs streamed endpoints.
+
+Usage: python benchmarks/bench_chat_stream.py [--chunks 20] [--delay 0.05] [--rounds 5]
+
+Points the Gemini SDK at a local server that writes each reply in --chunks
+pieces, --delay seconds apart (roughly how Gemini paces a long answer), and
+times /api/hotel_chat and /api/chat_search against their /stream variants:
+time to the first reply text and to the complete reply.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, database  # noqa: E402
+
+REPLY = "Khách sạn có hồ bơi ngoài trời, mở cửa từ 6h đến 22h, miễn phí cho khách lưu trú. " * 3
+
+
+def fake_gemini(chunks, delay):
+    """A local stand-in for generateContent / streamGenerateContent."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompt = body["contents"][0]["parts"][0]["text"]
+            text = json.dumps({"type": "chat", "reply_text": REPLY}) if "JSON" in prompt else REPLY
+            size = -(-len(text) // chunks)
+            pieces = [text[i:i + size] for i in range(0, len(text), size)]
+
+            def frame(piece):
+                return {"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}}]}
+
+            if ":streamGenerateContent" not in self.path:
+                time.sleep(delay * len(pieces))
+                out = json.dumps(frame(text)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for piece in pieces:
+                time.sleep(delay)
+                data = f"data: {json.dumps(frame(piece))}\r\n\r\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(client, url, body, streamed):
+    """(seconds to the first reply text, seconds to the whole reply)."""
+    start = time.perf_counter()
+    response = client.post(url, json=body, buffered=False)
+    first = None
+    for data in response.response:
+        if first is None and (not streamed or b"event: delta" in data):
+            first = time.perf_counter() - start
+    response.close()
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    server = fake_gemini(args.chunks, args.delay)
+    os.environ["GOOGLE_GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    # Read when the first call builds the client.
+    os.environ["GEMINI_API_KEY"] = "bench"
+
+    app = create_app()
+    app.config["DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    with app.app_context():
+        database.init_db()
+    client = app.test_client()
+
+    cases = [
+        ("hotel_chat", "/api/hotel_chat", "/api/hotel_chat/stream"),
+        ("chat_search", "/api/chat_search", "/api/chat_search/stream"),
+    ]
+    print(f"{args.chunks} chunks, {args.delay * 1000:.0f}ms apart")
+    for name, blocking, stream in cases:
+        for url, streamed in ((blocking, False), (stream, True)):
+            firsts, totals = [], []
+            for i in range(args.rounds):
+                # A new question each round: the reply cache must not answer.
+                body = {"message": f"Có hồ bơi không? #{time.time_ns()}-{i}", "hotel_fallback": {"name": "A"}}
+                first, total = timed(client, url, body, streamed)
+                firsts.append(first)
+                totals.append(total)
+            print(
+                f"{name:12} {url:26} first text {sum(firsts) / len(firsts) * 1000:6.0f}ms"
+                f"  complete {sum(totals) / len(totals) * 1000:6.0f}ms"
+            )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
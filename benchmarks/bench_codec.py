@@ -0,0 +1,134 @@
+"""Compare cache codecs on synthetic SerpAPI-shaped payloads.
+
+Usage: python benchmarks/bench_codec.py [--searches 60] [--hotels 20]
+
+For each codec this builds a throwaway SQLite file holding one search_cache row
+per (city, filter) search plus one hotel_cache row per hotel, then reports the
+database size, the time to SELECT every row and the time to decode them.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import codec  # noqa: E402
+
+CITIES = ["Đà Lạt", "Đà Nẵng", "Hà Nội", "TP. Hồ Chí Minh", "Nha Trang", "Phú Quốc", "Huế", "Sa Pa", "Vũng Tàu", "Hội An"]
+AMENITIES = [
+    "Wi-Fi miễn phí", "Bữa sáng miễn phí", "Đỗ xe miễn phí", "Bể bơi ngoài trời", "Bể bơi trong nhà",
+    "Điều hòa nhiệt độ", "Nhà hàng", "Quầy bar", "Spa", "Trung tâm thể dục", "Dịch vụ phòng",
+    "Phù hợp với trẻ em", "Có biển", "Dịch vụ đưa đón sân bay", "Giặt là",
+]
+WORDS = "khách sạn view biển phòng rộng sạch sẽ nhân viên thân thiện vị trí trung tâm gần chợ đêm yên tĩnh".split()
+
+
+def fake_property(rng, city, i):
+    price = rng.randrange(300_000, 6_000_000, 50_000)
+    return {
+        "type": "hotel",
+        "name": f"Khách sạn {rng.choice(WORDS).title()} {city} {i}",
+        "description": " ".join(rng.choices(WORDS, k=25)),
+        "link": f"https://example.com/hotel/{i}",
+        "property_token": f"Ch{rng.getrandbits(64):x}",
+        "gps_coordinates": {"latitude": 10 + rng.random() * 12, "longitude": 103 + rng.random() * 6},
+        "check_in_time": "14:00",
+        "check_out_time": "12:00",
+        "rate_per_night": {
+            "lowest": f"{price:,} ₫".replace(",", "."),
+            "extracted_lowest": price,
+            "before_taxes_fees": f"{int(price * 0.9):,} ₫".replace(",", "."),
+            "extracted_before_taxes_fees": int(price * 0.9),
+        },
+        "total_rate": {"lowest": f"{price:,} ₫".replace(",", "."), "extracted_lowest": price},
+        "prices": [
+            {"source": src, "logo": f"https://logo/{src}.png", "rate_per_night": {"lowest": f"{price + d:,} ₫", "extracted_lowest": price + d}}
+            for src, d in (("Agoda", 0), ("Booking.com", 40_000), ("Traveloka", 25_000), ("Trip.com", 60_000))
+        ],
+        "nearby_places": [
+            {"name": f"Địa điểm {k} {city}", "transportations": [{"type": "Đi bộ", "duration": f"{rng.randint(2, 20)} phút"}]}
+            for k in range(4)
+        ],
+        "hotel_class": f"Khách sạn {rng.randint(2, 5)} sao",
+        "extracted_hotel_class": rng.randint(2, 5),
+        "images": [
+            {"thumbnail": f"https://lh3.googleusercontent.com/p/{rng.getrandbits(96):x}=s287-w287-h192-n-k-no",
+             "original_image": f"https://lh3.googleusercontent.com/p/{rng.getrandbits(96):x}=w1920-h1280-k-no"}
+            for _ in range(8)
+        ],
+        "overall_rating": round(rng.uniform(3.0, 5.0), 1),
+        "reviews": rng.randint(10, 5000),
+        "location_rating": round(rng.uniform(2.0, 5.0), 1),
+        "amenities": rng.sample(AMENITIES, rng.randint(5, len(AMENITIES))),
+    }
+
+
+def build_rows(searches, hotels_per_search, seed=7):
+    rng = random.Random(seed)
+    search_rows, hotel_rows = [], []
+    for n in range(searches):
+        city = CITIES[n % len(CITIES)]
+        props = [fake_property(rng, city, i) for i in range(hotels_per_search)]
+        search_rows.append((f"hash{n}", props))
+        for p in props[:5]:
+            detail = dict(p, address=f"{rng.randint(1, 200)} Trần Phú, {city}", phone="+84 123 456 789")
+            hotel_rows.append((p["property_token"], detail))
+    return search_rows, hotel_rows
+
+
+def encode_legacy(obj):
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def run(codec_name, search_rows, hotel_rows):
+    encode = encode_legacy if codec_name == "legacy-text" else (lambda o: codec.encode(o, codec_name))
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE search_cache (search_hash TEXT PRIMARY KEY, results_json BLOB)")
+    db.execute("CREATE TABLE hotel_cache (token TEXT PRIMARY KEY, data BLOB NOT NULL)")
+
+    t0 = time.perf_counter()
+    db.executemany("INSERT INTO search_cache VALUES (?, ?)", [(k, encode(v)) for k, v in search_rows])
+    db.executemany("INSERT OR REPLACE INTO hotel_cache VALUES (?, ?)", [(k, encode(v)) for k, v in hotel_rows])
+    db.commit()
+    encode_ms = (time.perf_counter() - t0) * 1000
+    db.execute("VACUUM")
+    db.close()
+    size_kib = os.path.getsize(path) / 1024
+
+    db = sqlite3.connect(path)
+    t0 = time.perf_counter()
+    blobs = [r[0] for r in db.execute("SELECT results_json FROM search_cache")]
+    blobs += [r[0] for r in db.execute("SELECT data FROM hotel_cache")]
+    read_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for b in blobs:
+        codec.decode(b)
+    decode_ms = (time.perf_counter() - t0) * 1000
+    db.close()
+
+    return size_kib, encode_ms, read_ms, decode_ms, len(blobs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=60)
+    parser.add_argument("--hotels", type=int, default=20)
+    args = parser.parse_args()
+
+    search_rows, hotel_rows = build_rows(args.searches, args.hotels)
+    print(f"{args.searches} searches x {args.hotels} hotels, {len(hotel_rows)} detail rows\n")
+    print(f"{'codec':<12} {'db size':>10} {'encode':>10} {'read':>10} {'decode':>10} {'decode/row':>11}")
+    for name in ["legacy-text"] + list(codec.ENCODERS):
+        size, enc, read, dec, n = run(name, search_rows, hotel_rows)
+        print(f"{name:<12} {size:>8.0f}KiB {enc:>8.1f}ms {read:>8.1f}ms {dec:>8.1f}ms {dec / n * 1000:>9.0f}us")
+
+
+if __name__ == "__main__":
+    main()
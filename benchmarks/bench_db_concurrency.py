@@ -0,0 +1,141 @@
+"""Mixed readers and writers against search_cache and recently_viewed.
+
+Usage: python benchmarks/bench_db_concurrency.py [--readers 8] [--writers 2] [--seconds 5]
+
+"legacy" opens a fresh connection per operation with the default rollback
+journal, like get_db did per request; "tuned" reuses one connection per
+thread from database.connect (WAL, synchronous=NORMAL, cache/mmap, busy
+timeout, statement cache). Reports throughput, p50/p95 latency and lock errors.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import database  # noqa: E402
+from app.services import codec  # noqa: E402
+
+SCHEMA = (Path(database.__file__).parent / "schema.sql").read_text(encoding="utf8")
+SEARCHES = 200
+USERS = 50
+
+
+def setup(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    payload = codec.encode([{"name": f"Khách sạn {i}", "amenities": ["Wi-Fi miễn phí"] * 10} for i in range(20)])
+    conn.executemany(
+        "INSERT INTO search_cache (search_hash, city, params_json, results_json, result_count) VALUES (?, ?, ?, ?, 20)",
+        [(f"h{i}", "Đà Lạt", "{}", payload) for i in range(SEARCHES)],
+    )
+    conn.executemany(
+        "INSERT INTO users (id, username, password) VALUES (?, ?, 'x')", [(u, f"u{u}") for u in range(USERS)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy_connection(path):
+    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def read_op(conn, rng):
+    row = conn.execute(
+        "SELECT results_json, created_at FROM search_cache WHERE search_hash = ?", (f"h{rng.randrange(SEARCHES)}",)
+    ).fetchone()
+    codec.decode(row["results_json"])
+    conn.execute(
+        "SELECT preview_data FROM recently_viewed WHERE user_id = ? ORDER BY visited_at DESC LIMIT 10",
+        (rng.randrange(USERS),),
+    ).fetchall()
+
+
+def write_op(conn, rng):
+    if rng.random() < 0.8:
+        conn.execute(
+            """
+            INSERT INTO recently_viewed (user_id, property_token, preview_data, visited_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id, property_token) DO UPDATE SET
+                visited_at = CURRENT_TIMESTAMP, preview_data = excluded.preview_data
+            """,
+            (rng.randrange(USERS), f"tok{rng.randrange(500)}", json.dumps({"name": "Khách sạn"})),
+        )
+    else:
+        conn.execute(
+            "UPDATE search_cache SET created_at = CURRENT_TIMESTAMP WHERE search_hash = ?",
+            (f"h{rng.randrange(SEARCHES)}",),
+        )
+    conn.commit()
+
+
+def worker(mode, path, op, deadline, latencies, errors, seed):
+    rng = random.Random(seed)
+    conn = database.connect(path) if mode == "tuned" else None
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        c = conn or legacy_connection(path)
+        try:
+            op(c, rng)
+        except sqlite3.OperationalError:
+            errors.append(1)
+        finally:
+            if conn is None:
+                c.close()
+        latencies.append(time.perf_counter() - t0)
+    if conn is not None:
+        conn.close()
+
+
+def run(mode, readers, writers, seconds):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    setup(path)
+    deadline = time.perf_counter() + seconds
+    reads, writes, errors = [], [], []
+    threads = [
+        threading.Thread(target=worker, args=(mode, path, read_op, deadline, reads, errors, i))
+        for i in range(readers)
+    ] + [
+        threading.Thread(target=worker, args=(mode, path, write_op, deadline, writes, errors, 1000 + i))
+        for i in range(writers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    def pct(values, q):
+        return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else 0.0
+
+    print(
+        f"{mode:<7} reads {len(reads) / seconds:>8.0f}/s p50 {pct(reads, 50):6.2f}ms p95 {pct(reads, 95):6.2f}ms | "
+        f"writes {len(writes) / seconds:>6.0f}/s p50 {pct(writes, 50):6.2f}ms p95 {pct(writes, 95):6.2f}ms | "
+        f"lock errors {len(errors)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s each\n")
+    for mode in ("legacy", "tuned"):
+        run(mode, args.readers, args.writers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
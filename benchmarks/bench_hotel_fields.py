@@ -0,0 +1,58 @@
+"""Reading a few fields of a cached hotel: full payload vs. generated columns.
+
+Usage: python benchmarks/bench_hotel_fields.py [--hotels 500]
+
+"payload" is cache_store.get("hotel") with the in-process LRU empty (another
+worker, or after a restart): the compressed detail payload is read and
+decoded. "fields" is hotel_cache.load_hotel_fields, which only reads the
+generated columns over the slim record. Both include cache_maintenance.touch,
+which here flushes often since every read is of a different hotel.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, database  # noqa: E402
+from app.services import cache_store, hotel_cache  # noqa: E402
+from app.services.normalize import slim_hotel  # noqa: E402
+from bench_codec import fake_property  # noqa: E402
+
+SCORE_FIELDS = ("amenity_text", "price", "rating")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config["DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    rng = random.Random(3)
+    with app.app_context():
+        database.init_db()
+        tokens = []
+        for i in range(args.hotels):
+            hotel = fake_property(rng, "Đà Lạt", i)
+            cache_store.set("hotel", hotel["property_token"], {"data": hotel, "slim": slim_hotel(hotel)})
+            tokens.append(hotel["property_token"])
+
+        def run(label, fn):
+            cache_store._lru.clear()
+            start = time.perf_counter()
+            for token in tokens:
+                fn(token)
+            print(f"{label:<24} {(time.perf_counter() - start) / len(tokens) * 1e6:8.1f}us per hotel")
+
+        run("payload (LRU miss)", lambda t: cache_store.get("hotel", t).value["slim"])
+        run("fields: scoring", lambda t: hotel_cache.load_hotel_fields(t, SCORE_FIELDS))
+        run("fields: preview", lambda t: hotel_cache.load_hotel_fields(t))
+        run("fields: nearby", lambda t: hotel_cache.load_hotel_fields(t, ("nearby",)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Accuracy and latency of chat_search's local intent parser.
+
+Usage: python benchmarks/bench_intent_parser.py [--corpus benchmarks/chat_intents.jsonl] [--verbose]
+
+Each corpus line is a chat message with the search it should run ("expect":
+city, price_range, rating, amenities) or null when only the model can answer
+it (chat, comparisons, negations, prices no bucket fits). Reports how many
+searches skip Gemini, how many of those are exactly right, how many messages
+were wrongly answered locally, and the parse time per message.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import intent_parser  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_intents.jsonl")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as src:
+        corpus = [json.loads(line) for line in src if line.strip()]
+
+    searches = sum(1 for row in corpus if row["expect"])
+    local = correct = wrong_local = 0
+    for row in corpus:
+        found = intent_parser.match(row["text"])
+        if found is None:
+            outcome = "model"
+        else:
+            local += 1
+            got = {
+                "city": found["city"],
+                "price_range": found["price_range"],
+                "rating": found["rating"],
+                "amenities": sorted(found["amenities"] or []),
+            }
+            if row["expect"] is None:
+                wrong_local += 1
+                outcome = "WRONG (should go to the model)"
+            elif got == row["expect"]:
+                correct += 1
+                outcome = "local"
+            else:
+                outcome = f"WRONG {got}"
+        if args.verbose or outcome.startswith("WRONG"):
+            intent = intent_parser.parse(row["text"])
+            print(f"{outcome:8} {intent.confidence:5.2f}  {row['text']}  [{intent.reason}]")
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for row in corpus:
+            intent_parser.parse(row["text"])
+    per_message = (time.perf_counter() - start) / (args.rounds * len(corpus))
+
+    print(f"{len(corpus)} messages, {searches} searches, threshold {intent_parser.MIN_CONFIDENCE}")
+    print(f"answered locally   {local:4d}  ({local / searches:.0%} of searches skip Gemini)")
+    print(f"exactly right      {correct:4d}  ({correct / local:.1%} of local answers)" if local else "")
+    print(f"wrongly local      {wrong_local:4d}  (should have gone to the model)")
+    print(f"parse time         {per_message * 1e6:6.1f}µs per message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Keyword detection: previous nested `kw in text` loops vs. KeywordMatcher.
+
+Usage: python benchmarks/bench_keywords.py [--repeat 2000]
+
+Covers the three callers with long amenity lists (10 / 50 / 200 names) and
+full street addresses. "cold" clears the matcher caches before every call;
+"warm" is a repeat view of the same hotel or address.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import utils  # noqa: E402
+from app.services import location  # noqa: E402
+from bench_codec import AMENITIES  # noqa: E402
+
+EXTRA_AMENITIES = ["Massage", "Sauna", "Garden", "Wine bar", "Yoga", "Kids club", "Bike rental", "Meeting rooms"]
+ADDRESSES = [
+    "12 Trần Phú, Phường 3, Thành phố Đà Lạt, Lâm Đồng 66000, Việt Nam",
+    "Số 1 Lê Duẩn, Bến Nghé, Quận 1, Thành phố Hồ Chí Minh, Việt Nam",
+    "Tổ 5, Khu phố 2, Dương Đông, Phú Quốc, Kiên Giang, Việt Nam",
+    "Số 4 đường không tên, xã An Bình, huyện Cam Lộ, tỉnh Quảng Trị, Việt Nam",
+]
+
+LEGACY_ADDRESS_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(a) for a in location._ALIAS_INDEX if len(a) > 2), key=len, reverse=True)) + r")\b"
+)
+
+
+def legacy_vibe(amenities_list):
+    am_text = " ".join([str(a).lower() for a in amenities_list])
+    scores = {k: 0 for k in utils.VIBE_SIGNALS}
+    for vibe, keywords in utils.VIBE_SIGNALS.items():
+        for kw in keywords:
+            if kw in am_text:
+                scores[vibe] += 1
+    best_vibe = max(scores, key=scores.get)
+    return best_vibe if scores[best_vibe] >= 2 else None
+
+
+def legacy_score_keywords(amenities_text):
+    found = []
+    for kws in list(utils.VIBE_KEYWORDS.values()) + list(utils.COMPANION_KEYWORDS.values()):
+        found.extend(kw for kw in kws if kw in amenities_text)
+    return found
+
+
+def legacy_city(text):
+    match = LEGACY_ADDRESS_PATTERN.search(location.fold(text))
+    return location._ALIAS_INDEX[match.group(1)] if match else None
+
+
+def new_score_keywords(amenities_text):
+    return utils.SCORE_MATCHER.find_all(amenities_text)
+
+
+def clear_caches():
+    utils.SCORE_MATCHER.find_all.cache_clear()
+    utils.VIBE_SIGNAL_MATCHER.find_all.cache_clear()
+    location._CITY_MATCHER.spans.cache_clear()
+
+
+def per_call_us(fn, arg, repeat, cold=False):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if cold:
+            clear_caches()
+        fn(arg)
+    elapsed = time.perf_counter() - start
+    if cold:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            clear_caches()
+        elapsed -= time.perf_counter() - t0
+    return elapsed / repeat * 1e6
+
+
+def row(label, legacy, new, arg, repeat):
+    old = per_call_us(legacy, arg, repeat)
+    cold = per_call_us(new, arg, repeat, cold=True)
+    warm = per_call_us(new, arg, repeat)
+    print(f"{label:<28} {old:>9.1f}us {cold:>9.1f}us {warm:>9.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    print(f"{'case':<28} {'legacy':>11} {'cold':>11} {'warm':>11}")
+    for n in (10, 50, 200):
+        names = rng.choices(AMENITIES + EXTRA_AMENITIES, k=n)
+        text = " ".join(a.lower() for a in names)
+        assert utils.analyze_vibe_from_amenities(names) == legacy_vibe(names)
+        assert set(legacy_score_keywords(text)) == new_score_keywords(text)
+        row(f"vibe, {n} amenities", legacy_vibe, utils.analyze_vibe_from_amenities, names, args.repeat)
+        row(f"score keywords, {n} amenities", legacy_score_keywords, new_score_keywords, text, args.repeat)
+    for address in ADDRESSES:
+        assert location.find_city_in_text(address) == legacy_city(address)
+    row("city, 4 addresses", lambda a: [legacy_city(x) for x in a],
+        lambda a: [location.find_city_in_text(x) for x in a], ADDRESSES, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
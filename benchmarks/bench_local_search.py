@@ -0,0 +1,72 @@
+"""Local full-text search over cached hotels and reviews.
+
+Usage: python benchmarks/bench_local_search.py [--searches 200] [--reviews 20000]
+
+Fills the cache with --searches cached result pages (20 hotels each, spread
+over a few cities) through cache_store.set, which indexes them, plus
+--reviews review comments, then times search_index.search and the chat
+path's find_cached.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, database  # noqa: E402
+from app.services import cache_store, reviews, search_index  # noqa: E402
+from app.services.normalize import slim_hotels  # noqa: E402
+from bench_codec import WORDS, fake_property  # noqa: E402
+
+CITIES = ["Đà Lạt", "Hà Nội", "Đà Nẵng", "Nha Trang", "Phú Quốc"]
+QUERIES = ["be boi", "Khách sạn Đà Lạt", "spa", "dia diem 2 nha trang", "phong sach se", "view dep"]
+RUNS = 200
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        result = fn()
+    return (time.perf_counter() - start) / RUNS * 1e3, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--reviews", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config["DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    rng = random.Random(7)
+    with app.app_context():
+        database.init_db()
+        db = database.get_db()
+        tokens = []
+        start = time.perf_counter()
+        for n in range(args.searches):
+            city = CITIES[n % len(CITIES)]
+            hotels = [fake_property(rng, city, n * 20 + i) for i in range(20)]
+            tokens += [h["property_token"] for h in hotels]
+            params = {"city": city, "price": "", "rating": "", "amenities": []}
+            cache_store.set("search", f"bench{n}", {"slim": slim_hotels(hotels), "params": params}, results=hotels)
+        index_ms = (time.perf_counter() - start) / args.searches * 1e3
+        for _ in range(args.reviews):
+            comment = " ".join(rng.choices(WORDS, k=12)) + rng.choice([" phòng sạch sẽ", " view đẹp", ""])
+            reviews.add_review(db, rng.choice(tokens), "bench", rng.randint(1, 5), comment)
+        print(f"{len(tokens)} hotels, {args.reviews} reviews; {index_ms:.2f}ms per cached search page (incl. indexing)")
+
+        for query in QUERIES:
+            ms, count = timed(lambda: search_index.search(db, query))
+            print(f"search {query!r:<26} {ms:7.3f}ms  {count} hotels")
+        ms, count = timed(lambda: search_index.find_cached(
+            db, "Đà Lạt", "1000000-2000000", None, None, text="khách sạn có spa gần hồ"
+        ))
+        print(f"find_cached Đà Lạt 1-2tr        {ms:7.3f}ms  {count} hotels")
+
+
+if __name__ == "__main__":
+    main()
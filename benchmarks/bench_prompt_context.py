@@ -0,0 +1,91 @@
+"""Prompt size of hotel_chat and chat_search before and after prompt_context.
+
+Usage: python benchmarks/bench_prompt_context.py [--hotels 50] [--page 20]
+
+For SerpAPI-shaped hotel details (with the review breakdown, detailed
+amenities and policies a real detail carries) this compares the estimated
+tokens of the old hotel context (the whole detail, indented JSON) with the
+budgeted one for a set of typical questions, does the same for chat_search's
+list of hotels on a results page, and times the builder.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import prompt_context  # noqa: E402
+from bench_codec import AMENITIES, fake_property  # noqa: E402
+
+QUESTIONS = [
+    "Khách sạn có hồ bơi không?",
+    "Giá phòng trên Agoda bao nhiêu?",
+    "Từ đây ra biển mất bao lâu?",
+    "Mấy giờ nhận phòng?",
+    "Khách sạn có sạch sẽ, yên tĩnh không?",
+    "Cho mình hỏi về khách sạn này",
+]
+
+
+def full_detail(rng, i):
+    hotel = fake_property(rng, "Đà Nẵng", i)
+    hotel["address"] = f"{rng.randint(1, 200)} Võ Nguyên Giáp, Đà Nẵng"
+    hotel["amenities_detailed"] = {
+        "groups": [
+            {"title": title, "list": [{"title": a, "available": True} for a in rng.sample(AMENITIES, 6)]}
+            for title in ("Phòng", "Dịch vụ", "Ăn uống", "Giải trí")
+        ]
+    }
+    hotel["excluded_amenities"] = rng.sample(AMENITIES, 3)
+    hotel["ratings"] = [{"stars": s, "count": rng.randint(5, 900)} for s in range(5, 0, -1)]
+    hotel["reviews_breakdown"] = [
+        {"name": n, "description": n, "total_mentioned": 120, "positive": rng.randint(10, 90), "negative": rng.randint(0, 30)}
+        for n in ("Vị trí", "Phòng", "Dịch vụ", "Bể bơi", "Bữa sáng", "Tiếng ồn", "Giá cả")
+    ]
+    hotel["essential_info"] = ["Không hút thuốc", "Thú cưng không được phép", "Miễn phí hủy trước 24h"]
+    hotel["nearby_places"] *= 3
+    return hotel
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=50)
+    parser.add_argument("--page", type=int, default=20, help="hotels on the results page")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    hotels = [full_detail(rng, i) for i in range(args.hotels)]
+    estimate = prompt_context.estimate_tokens
+
+    print(f"hotel_chat, budget {prompt_context.BUDGETS['hotel_chat']} tokens")
+    before = sum(estimate(json.dumps(h, indent=2, ensure_ascii=False)) for h in hotels) / len(hotels)
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        after = sum(estimate(prompt_context.hotel_context(h, question)) for h in hotels) / len(hotels)
+        per_call = (time.perf_counter() - start) / len(hotels)
+        print(f"  {question:42} {before:6.0f} -> {after:5.0f} tokens  ({per_call * 1000:.2f}ms to build)")
+
+    page = [
+        {
+            "name": h["name"],
+            "price": h["rate_per_night"]["lowest"],
+            "rating": str(h["overall_rating"]),
+            "amenities": ", ".join(h["amenities"]),
+        }
+        for h in hotels[: args.page]
+    ]
+    old = "\n".join(
+        f"- {h['name']}:\n   + Giá: {h['price']}\n   + Đánh giá: {h['rating']}/5\n   + Tiện nghi: {h['amenities']}"
+        for h in page
+    )
+    new = prompt_context.hotel_list_context(page, "cái nào có hồ bơi?")
+    print(f"chat_search, {len(page)} hotels on the page, budget {prompt_context.BUDGETS['chat_search']} tokens")
+    print(f"  page context {estimate(old):6d} -> {estimate(new):5d} tokens")
+    print(json.dumps(prompt_context.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""SQL statements per request for the pages a signed-in user hits most.
+
+Usage: python benchmarks/bench_request_queries.py
+
+Runs the app against a temporary database with cached search results and
+hotel details (no upstream calls) and SQLITE_COUNT_QUERIES enabled, then
+prints the X-Query-Count of each request.
+"""
+import os
+import random
+import sys
+import tempfile
+
+os.environ["SQLITE_COUNT_QUERIES"] = "1"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, database  # noqa: E402
+from app.services import cache_store  # noqa: E402
+from app.services.normalize import slim_hotel, slim_hotels  # noqa: E402
+from app.utils import generate_search_hash  # noqa: E402
+from bench_codec import fake_property  # noqa: E402
+
+PREFS = {"vibe": "healing", "budget": "mid", "companion": "couple"}
+
+
+def main():
+    app = create_app()
+    app.config["DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    rng = random.Random(11)
+    hotels = [fake_property(rng, "Đà Lạt", i) for i in range(20)]
+    search_hash = generate_search_hash("Đà Lạt", "", "3-5", [])
+    with app.app_context():
+        database.init_db()
+        params = {"city": "Đà Lạt", "price": "", "rating": "3-5", "amenities": []}
+        cache_store.set("search", search_hash, {"slim": slim_hotels(hotels), "params": params}, results=hotels)
+        for hotel in hotels:
+            cache_store.set("hotel", hotel["property_token"], {"data": hotel, "slim": slim_hotel(hotel)})
+
+    client = app.test_client()
+    client.post("/register", data={"username": "bench", "password": "bench"})
+    client.post("/login", data={"username": "bench", "password": "bench"})
+    client.post("/api/update_preferences", json=PREFS)
+    token = hotels[0]["property_token"]
+
+    requests = [
+        ("GET", "/", None),
+        ("GET", "/profile", None),
+        ("POST", "/search_handler", {"data": {"city": "Đà Lạt", "rating": "3-5"}}),
+        ("GET", f"/results/{search_hash}", None),
+        ("GET", f"/results/{search_hash}", None),
+        ("GET", f"/hotel/{token}", None),
+        ("GET", f"/hotel/{token}", None),
+        ("POST", "/api/get_match_reason", {"json": {"property_token": token}}),
+        ("GET", "/api/get_home_suggestion", None),
+        ("GET", "/history", None),
+    ]
+    print(f"{'request':<40} {'queries':>7}")
+    total = 0
+    for method, path, kwargs in requests:
+        response = client.open(path, method=method, **(kwargs or {}))
+        count = int(response.headers.get("X-Query-Count", 0))
+        total += count
+        print(f"{method + ' ' + path[:34]:<40} {count:>7}")
+    print(f"{'total':<40} {total:>7}")
+
+
+if __name__ == "__main__":
+    main()
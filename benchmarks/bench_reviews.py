@@ -0,0 +1,75 @@
+"""Review section of the hotel page as the number of reviews grows.
+
+Usage: python benchmarks/bench_reviews.py [--sizes 100,1000,10000,50000]
+
+"legacy" is the previous unbounded SELECT of every review of the hotel;
+"page" is reviews.get_stats + reviews.page (first page, newest first) and
+"deep" the same for a page far down the list, reached through its cursor.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, database  # noqa: E402
+from app.services import reviews  # noqa: E402
+
+RUNS = 50
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        fn()
+    return (time.perf_counter() - start) / RUNS * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config["DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    rng = random.Random(5)
+    with app.app_context():
+        database.init_db()
+        db = database.get_db()
+        print(f"{'reviews':>8} {'legacy ms':>10} {'page ms':>8} {'deep ms':>8}")
+        for size in (int(s) for s in args.sizes.split(",")):
+            token = f"hotel{size}"
+            for _ in range(size):
+                reviews.add_review(db, token, "bench", rng.randint(1, 5), "Phòng sạch, nhân viên thân thiện. " * 3)
+            # Written within a few seconds; spread them out like real reviews.
+            db.execute(
+                "UPDATE user_reviews SET created_at = datetime('2024-01-01', '+' || id || ' minutes') "
+                "WHERE property_token = ?", (token,)
+            )
+            db.commit()
+
+            def legacy():
+                db.execute(
+                    "SELECT * FROM user_reviews WHERE property_token = ? ORDER BY created_at DESC", (token,)
+                ).fetchall()
+
+            def first_page():
+                reviews.page(db, token, stats=reviews.get_stats(db, token))
+
+            rows = db.execute(
+                "SELECT created_at, id FROM user_reviews WHERE property_token = ? "
+                "ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?", (token, size * 9 // 10)
+            ).fetchone()
+            cursor = reviews.encode_cursor([rows["created_at"], rows["id"]])
+
+            def deep_page():
+                reviews.page(db, token, after=cursor, stats=reviews.get_stats(db, token))
+
+            print(f"{size:>8} {timed(legacy):>10.2f} {timed(first_page):>8.3f} {timed(deep_page):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
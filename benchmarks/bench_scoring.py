@@ -0,0 +1,72 @@
+"""Per-hotel calculate_match_score loop vs. the batch score_hotels scorer.
+
+Usage: python benchmarks/bench_scoring.py [--repeat 20]
+
+Scores slim hotel records (what display_results ranks) for every vibe /
+budget / companion profile, checks both paths agree, and reports the
+median time per ranking at 20, 200 and 2,000 hotels. "cold" clears the
+compiled-rule and amenity-bitmask caches before every ranking, i.e. the first
+page view of a result set.
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.normalize import slim_hotels  # noqa: E402
+from app import utils  # noqa: E402
+from app.utils import calculate_match_score, score_hotels  # noqa: E402
+from bench_codec import CITIES, fake_property  # noqa: E402
+
+PROFILES = [
+    {"vibe": v, "budget": b, "companion": c}
+    for v, b, c in itertools.product(
+        ["healing", "adventure", "luxury", "business"],
+        ["low", "mid", "high"],
+        ["family", "couple", "business", "solo"],
+    )
+]
+
+
+def cold_score(prefs, hotels):
+    utils._keyword_mask.cache_clear()
+    utils.SCORE_MATCHER.find_all.cache_clear()
+    utils._compile_score_rules.cache_clear()
+    return score_hotels(prefs, hotels)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    print(f"{'hotels':>7} {'loop':>10} {'cold':>10} {'warm':>10} {'speedup':>8}")
+    for n in (20, 200, 2000):
+        hotels = slim_hotels(fake_property(rng, CITIES[i % len(CITIES)], i) for i in range(n))
+        for prefs in PROFILES:
+            assert score_hotels(prefs, hotels) == [calculate_match_score(prefs, h) for h in hotels]
+
+        loop_ms = timed(lambda: [[calculate_match_score(p, h) for h in hotels] for p in PROFILES], args.repeat)
+        cold_ms = timed(lambda: [cold_score(p, hotels) for p in PROFILES], args.repeat)
+        warm_ms = timed(lambda: [score_hotels(p, hotels) for p in PROFILES], args.repeat)
+        loop_ms, cold_ms, warm_ms = (t / len(PROFILES) for t in (loop_ms, cold_ms, warm_ms))
+        print(f"{n:>7} {loop_ms:>8.3f}ms {cold_ms:>8.3f}ms {warm_ms:>8.3f}ms {loop_ms / warm_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
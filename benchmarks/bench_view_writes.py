@@ -0,0 +1,93 @@
+"""Write path of a hotel page view: history row + occasional preference update.
+
+Usage: python benchmarks/bench_view_writes.py [--views 2000] [--synchronous NORMAL|FULL]
+
+"legacy" is the previous SELECT then UPDATE/INSERT with its own commit and
+a separate commit per preference write; "sync" is view_writes.apply (one
+upsert transaction); "deferred" only enqueues, the batches are written by the
+background thread, which competes with it for the GIL.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, database  # noqa: E402
+from app.services import view_writes  # noqa: E402
+
+USERS = 50
+PREVIEW = {"name": "Khách sạn Đà Lạt", "image": "", "price": "1.200.000 ₫", "address": "Đà Lạt"}
+
+
+def legacy_view(db, user_id, token, prefs):
+    preview_json = json.dumps(PREVIEW, ensure_ascii=False)
+    exists = db.execute(
+        "SELECT 1 FROM recently_viewed WHERE user_id=? AND property_token=?", (user_id, token)
+    ).fetchone()
+    if exists:
+        db.execute(
+            "UPDATE recently_viewed SET visited_at = CURRENT_TIMESTAMP, preview_data = ? WHERE user_id = ? AND property_token = ?",
+            (preview_json, user_id, token),
+        )
+    else:
+        db.execute(
+            "INSERT INTO recently_viewed (user_id, property_token, preview_data, visited_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+            (user_id, token, preview_json),
+        )
+    db.commit()
+    if prefs is not None:
+        db.execute("UPDATE users SET preferences = ? WHERE id = ?", (json.dumps(prefs), user_id))
+        db.commit()
+
+
+def workload(views, seed=1):
+    rng = random.Random(seed)
+    for _ in range(views):
+        prefs = {"budget": "high"} if rng.random() < 0.05 else None
+        yield rng.randrange(USERS), f"tok{rng.randrange(300)}", prefs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--views", type=int, default=2000)
+    parser.add_argument("--synchronous", default="NORMAL", choices=["NORMAL", "FULL"])
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config["DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    with app.app_context():
+        database.init_db()
+        db = database.get_db()
+        db.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, 'x')",
+                       [(u, f"u{u}") for u in range(USERS)])
+        db.commit()
+        db.execute(f"PRAGMA synchronous={args.synchronous}")
+
+        def run(label, fn):
+            start = time.perf_counter()
+            for user_id, token, prefs in workload(args.views):
+                fn(user_id, token, prefs)
+            per_view = (time.perf_counter() - start) / args.views * 1e6
+            print(f"{label:<9} {per_view:8.1f}us per view")
+
+        print(f"{args.views} views, synchronous={args.synchronous}")
+        run("legacy", lambda u, t, p: legacy_view(db, u, t, p))
+        run("sync", lambda u, t, p: view_writes.record_view(u, t, PREVIEW, p))
+
+        view_writes.MODE = "deferred"
+        run("deferred", lambda u, t, p: view_writes.record_view(u, t, PREVIEW, p))
+        while not view_writes._queue.empty():
+            time.sleep(0.01)
+        time.sleep(view_writes.FLUSH_INTERVAL + 0.1)
+        view_writes.flush_pending()
+        rows = db.execute("SELECT COUNT(*) FROM recently_viewed").fetchone()[0]
+        print(f"{rows} history rows after the deferred batches were written")
+
+
+if __name__ == "__main__":
+    main()
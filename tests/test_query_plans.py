@@ -0,0 +1,40 @@
+"""Hot-path queries keep their indexes (database.QUERY_PLAN_CHECKS).
+
+The same checks as `flask --app run db-explain`, run against a database
+built by init_db, so a migration or query change that loses an index fails
+here. Usage: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_package  # noqa: E402
+from app import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    # A bare app: create_app would also open the default database and start
+    # background maintenance.
+    app = Flask(app_package.__name__)
+    app.config["DATABASE"] = str(tmp_path / "plans.db")
+    with app.app_context():
+        database.init_db()
+        yield database.get_db()
+
+
+@pytest.mark.parametrize("label", [label for label, _, _ in database.QUERY_PLAN_CHECKS])
+def test_query_uses_its_index(db, label):
+    results = {result[0]: result for result in database.explain_query_plans(db)}
+    _, index, plan, ok = results[label]
+    assert ok, f"{label}: expected {index} without a temp B-tree, got {plan}"
+
+
+def test_lost_index_is_reported(db):
+    db.execute("DROP INDEX idx_user_reviews_token_created")
+    failed = [label for label, _, _, ok in database.explain_query_plans(db) if not ok]
+    assert "summarize_reviews" in failed